@@ -1,453 +1,393 @@
+import argparse
+import hashlib
+import json
 import os
-import time
-from PIL import ImageGrab, Image
-import applescript
-import signal
-
-WINDOW_WIDTH = 870
-WINDOW_HEIGHT = 460
-WINDOW_HEIGHT_SINGLE = 105
-
-DEFAULT_ITERM_COLORS = "Cockpit-Tokyo-Night"
-DEFAULT_PALETTE = "default"
-
-
-def scene_init():
-    return [
-
-        # ********************************************************************
-        # **** Init **********************************************************
-        # ********************************************************************
-
-        # ---- Open iTerm ----------------------------------------------------
-        *actions_iterm_open(),
-        *actions_colors(DEFAULT_ITERM_COLORS, DEFAULT_PALETTE),
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        # ---- Prepare -------------------------------------------------------
-        *actions_command_list([
-            "export DISABLE_AUTO_TITLE=true",
-            "export STARSHIP_COCKPIT_MEMORY_USAGE_ENABLED=false",
-            "export STARSHIP_COCKPIT_BATTERY_ENABLED=false",
-            "export STARSHIP_COCKPIT_BATTERY_THRESHOLD=100",
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED=false",
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ABC=ENG",
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_UKRAINIAN=UKR",
-        ]),
-        *actions_clear(),
-    ]
-
-def scene_demo():
-    return [
-
-        # ********************************************************************
-        # **** Demo **********************************************************
-        # ********************************************************************
-
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors(DEFAULT_ITERM_COLORS, DEFAULT_PALETTE),
-        # ---- Prepare -------------------------------------------------------
-        *actions_command_list([
-            f"cd {os.getcwd()}",
-            "git clone https://github.com/smithumble/starship-cockpit.git",
-            "mv starship-cockpit starship-cockpit-demo",
-            "cd starship-cockpit-demo",
-            "touch docker-compose.yml",
-            "export DOCKER_CONTEXT=dev",
-        ]),
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_clear(),
-        # ---- Run commands --------------------------------------------------
-        *actions_command_list([
-            "git reset --hard HEAD~1 -q",
-            "echo 'Hello, World!' > NEW_FILE.md",
-            "git add NEW_FILE.md",
-            "git commit -m 'Add NEW_FILE.md' -q",
-            "rm NEW_FILE.md",
-            "echo 'Hello, World!' > README.md",
-        ], command_delay=1, delay_before=1, delay_after=1),
-        *actions_command_list([
-            "sleep 2",
-        ], delay_after=3),
-        *actions_command_list([
-            "test",
-        ]),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/demo.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_clear(),
-    ]
-
-def scene_palettes():
-    return [
-
-        # ********************************************************************
-        # **** Palettes ******************************************************
-        # ********************************************************************
-
-        # ====================================================================
-        # ==== Tokyo Night ===================================================
-        # ====================================================================
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors("Tokyo-Night", "default"),
-        # ---- Prepare -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/palettes/default.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_clear(),
-
-        # ====================================================================
-        # ==== Gruvbox Dark ==================================================
-        # ====================================================================
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors("Cockpit-Gruvbox-Dark", "gruvbox_dark"),
-        # ---- Prepare -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/palettes/gruvbox_dark.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_clear(),
-
-        # ====================================================================
-        # ==== Gruvbox Light =================================================
-        # ====================================================================
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors("Cockpit-Gruvbox-Light", "gruvbox_light"),
-        # ---- Prepare -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/palettes/gruvbox_light.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_clear(),
-    ]
-
-def scene_configuration():
-    return [
-
-        # ********************************************************************
-        # **** Configuration *************************************************
-        # ********************************************************************
-
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors(DEFAULT_ITERM_COLORS, DEFAULT_PALETTE),
-        # ---- Prepare -------------------------------------------------------
-        *actions_command_list([
-            "git reset --hard HEAD~1 -q",
-            "git pull",
-            "cd ~",
-        ]),
-        *actions_clear(),
-
-        # ====================================================================
-        # ==== Battery =======================================================
-        # ====================================================================
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_MEMORY_USAGE_ENABLED=true",
-        ]),
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/configuration/memory_usage.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_MEMORY_USAGE_ENABLED=false",
-        ]),
-        *actions_clear(),
-
-        # ====================================================================
-        # ==== Battery =======================================================
-        # ====================================================================
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_BATTERY_ENABLED=true",
-            "export STARSHIP_COCKPIT_BATTERY_THRESHOLD=100",
-        ]),
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/configuration/battery.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_BATTERY_ENABLED=false",
-        ]),
-        *actions_clear(),
-
-        # ====================================================================
-        # ==== Keyboard Layout ===============================================
-        # ====================================================================
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED=true",
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ABC=ENG",
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_UKRAINIAN=UKR",
-        ]),
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT_SINGLE),
-        *actions_clear(),
-        # ---- Make screenshot -----------------------------------------------
-        *actions_screenshot("assets/images/configuration/keyboard_layout.png"),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_iterm_window_size(WINDOW_WIDTH, WINDOW_HEIGHT),
-        *actions_command_list([
-            "export STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED=false",
-        ]),
-        *actions_clear(),
-    ]
-
-def scene_cleanup():
-    return [
-
-        # ********************************************************************
-        # **** Cleanup *******************************************************
-        # ********************************************************************
-
-        # ---- Set color scheme ----------------------------------------------
-        *actions_colors(DEFAULT_ITERM_COLORS, DEFAULT_PALETTE),
-        # ---- Cleanup -------------------------------------------------------
-        *actions_command_list([
-            f"cd {os.getcwd()}",
-            "rm -rf starship-cockpit-demo",
-        ]),
-        # ---- Close iTerm ---------------------------------------------------
-        *actions_iterm_close(),
-    ]
-
-def actions_colors(iterm_colors_name, palette_name):
-    return [
-        {
-            "type": "command",
-            "command": r"echo -e '\033]50;SetProfile=" + iterm_colors_name + r"\007'",
-            "delay_after": 1/2,
-        },
-        {
-            "type": "set_palette",
-            "palette": palette_name,
-            "delay_after": 1,
-        },
-        {
-            "type": "command",
-            "command": r"echo -e '\033]0;Starship Cockpit Demo\007'",
-            "delay_after": 1/2,
-        },
-    ]
-
-def actions_clear():
-    return [
-        {
-            "type": "command",
-            "command": "clear",
-            "delay_after": 1/2,
-        }
-    ]
-
-def actions_iterm_window_size(width, height):
-    return [
-        {
-            "type": "set_iterm_window_size",
-            "width": width,
-            "height": height,
-            "delay_after": 1/2,
-        },
-    ]
-
-def actions_screenshot(filepath):
-    return [
-        {
-            "type": "screenshot",
-            "filepath": filepath,
-            "delay_before": 2,
-            "delay_after": 1/2,
-        },
-    ]
-
-def actions_iterm_open():
-    return [
-        {
-            "type": "open_iterm",
-            "delay_after": 5,
-        },
-    ]
-
-def actions_iterm_close():
-    return [
-        {
-            "type": "close_iterm",
-            "delay_after": 2,
-        },
-    ]
-
-def actions_command_list(commands, command_delay=1/2, delay_after=1/2, delay_before=0):
-    return [
-        {
-            "type": "command_list",
-            "commands": commands,
-            "command_delay": command_delay,
-            "delay_after": delay_after,
-            "delay_before": delay_before,
-        },
-    ]
-
-def run_applescript(script, action_name="Unknown action"):
+import platform
+import re
+import shlex
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import cache
+from postprocess import submit_screenshot
+from scenes import (
+    WINDOW_HEIGHT,
+    WINDOW_WIDTH,
+    CloseWindow,
+    CommandList,
+    OpenWindow,
+    Resize,
+    SceneError,
+    Screenshot,
+    SetColors,
+    SetPalette,
+    format_plan,
+    load_scenes,
+)
+
+STARSHIP_CONFIG = "starship.toml"
+
+# Every scene runs in its own session and makes its own screenshots, so scenes can run in any order and in parallel
+SCENES_PATH = "assets/scenes.toml"
+
+# Input hash of every generated scene, scenes whose inputs did not change are skipped
+MANIFEST_PATH = "assets/images/manifest.json"
+
+# Derived configs are shared by all runs of the user and named after their content, so each variant is written once.
+# They are kept in the user's cache directory: in a shared one, another user could plant the config a scene loads.
+CONFIG_OVERLAY_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "starship-cockpit", "configs"
+)
+
+# Environment of every scene session, the scenes enable what they show
+SESSION_ENV = {
+    "DISABLE_AUTO_TITLE": "true",
+    "STARSHIP_COCKPIT_MEMORY_USAGE_ENABLED": "false",
+    "STARSHIP_COCKPIT_BATTERY_ENABLED": "false",
+    "STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED": "false",
+    # The session directory is the home directory too, the global git config of the user is not there
+    "GIT_AUTHOR_NAME": "Starship Cockpit",
+    "GIT_AUTHOR_EMAIL": "cockpit@example.com",
+    "GIT_COMMITTER_NAME": "Starship Cockpit",
+    "GIT_COMMITTER_EMAIL": "cockpit@example.com",
+}
+
+# Segments that change with the clock or the machine, switched off in the config of the renders
+PINNED_SECTIONS = ["time", "os"]
+
+# Published as if cockpit-sampler were running, the custom commands show these values instead of the machine's
+PINNED_SAMPLES = {
+    "memory_usage": "8GiB/16GiB",
+    "battery": "73 \U000f0083 73%",
+    "keyboard_layout": "ABC",
+}
+PINNED_ENV = {"USER": "cockpit", "LOGNAME": "cockpit"}
+
+# Stand-in for the repository the demo clones, so scenes need no network and render the same on every run
+DEMO_REPO_COMMITS = [
+    ("README.md", "# Starship Cockpit\n\nA starship preset.\n", "Add README.md"),
+    ("starship.toml", "format = '$all'\n", "Add starship.toml"),
+]
+
+# Set on Ctrl+C to stop the running scenes
+interrupted = threading.Event()
+print_lock = threading.Lock()
+
+
+def log(name, message):
+    # Scenes run in parallel, keep their lines from interleaving
+    with print_lock:
+        print(f"[{name}] {message}")
+
+def use_starship_config(path):
+    """Render the scenes with another config, e.g. one without the segments that change between runs."""
+    global STARSHIP_CONFIG
+    STARSHIP_CONFIG = path
+    read_starship_config.cache_clear()
+    get_scenes.cache_clear()
+
+@cache
+def read_starship_config():
+    with open(STARSHIP_CONFIG, 'r') as file:
+        return file.read()
+
+def get_config_overlay(palette_name):
+    content = read_starship_config().splitlines(keepends=True)
+
+    for i, line in enumerate(content):
+        if line.startswith("palette = "):
+            content[i] = f"palette = '{palette_name}'\n"
+            break
+
+    return write_config_overlay("".join(content))
+
+def make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"{path} is not a directory private to this user, run `chmod 700 {path}` if it is yours")
+
+def read_file(path):
     try:
-        result = applescript.run(script)
-        if result.err:
-            print(f"AppleScript Error in {action_name}: {result.err}")
-            return None
-        return result
-    except Exception as e:
-        print(f"Failed to execute {action_name}: {e}")
+        with open(path, 'r') as file:
+            return file.read()
+    except OSError:
         return None
 
-def format_action_details(action):
-    return ' '.join(f'{k}="{v}"' for k, v in action.items())
+@cache
+def write_config_overlay(content):
+    digest = hashlib.sha256(content.encode()).hexdigest()[:16]
+    path = os.path.join(CONFIG_OVERLAY_DIR, f"starship-{digest}.toml")
+    make_private_dir(CONFIG_OVERLAY_DIR)
+    # An existing overlay is only reused while it still holds the content its name stands for
+    if read_file(path) != content:
+        # Write to a temporary file first, parallel scenes and other runs may read the same overlay
+        fd, temp_path = tempfile.mkstemp(dir=CONFIG_OVERLAY_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        os.replace(temp_path, path)
+    return path
+
+def pin_config(content):
+    for section in PINNED_SECTIONS:
+        content, count = re.subn(rf"^(\[{section}\]\n)disabled = false$", r"\1disabled = true", content, flags=re.M)
+        if not count:
+            raise ValueError(f"[{section}] does not start with `disabled = false`, it cannot be switched off")
+    return content
+
+def pin_samples(sampler_dir):
+    # The pid is the one of this process, so the values count as live for as long as the renders run
+    for name, value in PINNED_SAMPLES.items():
+        with open(os.path.join(sampler_dir, name), 'w') as file:
+            file.write(f"{os.getpid()} {value}\n")
+
+@contextmanager
+def pinned_renders():
+    """Pin the config and the samples for the renders, yields the environment of their sessions.
+
+    The README images and the regression check both render this way, so they only differ when the prompt does.
+    """
+    use_starship_config(write_config_overlay(pin_config(read_starship_config())))
+    with tempfile.TemporaryDirectory(prefix="starship-cockpit-samples-") as sampler_dir:
+        pin_samples(sampler_dir)
+        yield {**PINNED_ENV, "STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir}
+
+def make_demo_repo(path, env):
+    env = {**os.environ, **env}
+    os.makedirs(path)
+    subprocess.run(["git", "init", "-q", "-b", "main"], cwd=path, env=env, check=True)
+    for filename, content, message in DEMO_REPO_COMMITS:
+        with open(os.path.join(path, filename), 'w') as file:
+            file.write(content)
+        subprocess.run(["git", "add", filename], cwd=path, env=env, check=True)
+        subprocess.run(["git", "commit", "-q", "-m", message], cwd=path, env=env, check=True)
+
+class Session:
+    """Isolated terminal session for one scene: its own directory, config and environment."""
+
+    def __init__(self, name, backend, env=None):
+        self.name = name
+        # A directory of its own per run, it is the home directory of the session so the prompt shows it as ~
+        self.dir = tempfile.mkdtemp(prefix=f"starship-cockpit-{name}-")
+        self.env = {
+            **SESSION_ENV,
+            "HOME": self.dir,
+            "COCKPIT_DEMO_REPO": os.path.join(self.dir, ".demo-repo"),
+            "STARSHIP_CONFIG": os.path.abspath(STARSHIP_CONFIG),
+            **(env or {}),
+        }
+        make_demo_repo(self.env["COCKPIT_DEMO_REPO"], self.env)
+        # Screenshots still being post-processed
+        self.pending = []
+        self.terminal = create_terminal(backend, self.env, self.dir)
+
+    def close(self):
+        self.terminal.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def create_terminal(backend, env, cwd):
+    # Drivers are imported on demand, each one needs its own platform and packages
+    if backend == "iterm":
+        from iterm import ITermTerminal
+        return ITermTerminal(env, cwd)
+    if backend == "fake":
+        from terminal import FakeTerminal
+        return FakeTerminal(WINDOW_WIDTH, WINDOW_HEIGHT, env=env, cwd=cwd)
+    from headless import HeadlessTerminal
+    return HeadlessTerminal(WINDOW_WIDTH, WINDOW_HEIGHT, env=env, cwd=cwd)
+
+def run_open(terminal, session, action):
+    terminal.open()
+    terminal.wait_until_ready(action.delay_after)
+
+def run_close(terminal, session, action):
+    terminal.close()
+
+def run_resize(terminal, session, action):
+    terminal.resize(action.width, action.height)
+    terminal.wait_until_resized(action.width, action.height, action.delay_after)
+
+def run_set_colors(terminal, session, action):
+    terminal.set_color_scheme(action.colors)
+    terminal.wait_until_ready(action.delay_after)
+
+def run_set_palette(terminal, session, action):
+    # The shared starship.toml is never written, the session switches to a derived config instead
+    terminal.write(f"export STARSHIP_CONFIG={shlex.quote(get_config_overlay(action.palette))}")
+    terminal.wait_until_ready(action.delay_after)
+
+def run_command_list(terminal, session, action):
+    # One batch, the driver runs each command once the previous one is back at the prompt
+    terminal.write_many(action.commands, action.timeouts)
+    terminal.wait_until_ready(action.delay_after)
+
+def run_screenshot(terminal, session, action):
+    screenshot = terminal.capture()
+    if screenshot:
+        session.pending.append(submit_screenshot(screenshot, action.filepath))
+    if action.delay_after:
+        terminal.wait_until_ready(action.delay_after)
+
+ACTION_HANDLERS = {
+    OpenWindow: run_open,
+    CloseWindow: run_close,
+    Resize: run_resize,
+    SetColors: run_set_colors,
+    SetPalette: run_set_palette,
+    CommandList: run_command_list,
+    Screenshot: run_screenshot,
+}
+
+def process_actions(session, *actions):
+    # Delays are upper bounds: each wait returns as soon as the terminal reports it is ready
+    terminal = session.terminal
+    for action in actions:
+        if interrupted.is_set():
+            return
 
-def escape_command(command):
-    command = command.replace('\\', '\\\\')
-    return command
+        log(session.name, f"Running action: {action.describe()}")
 
-def process_actions(*actions):
-    for action in actions:
-        print(f"Running action: {format_action_details(action)}")
-        
-        delay_before = action.get("delay_before", 0)
-        delay_after = action.get("delay_after", 0)
-
-        time.sleep(delay_before)
-
-        if action["type"] == "open_iterm":
-            script = '''
-            tell application "iTerm2"
-                create window with default profile
-            end tell
-            '''
-            run_applescript(script, "open_iterm")
-
-        elif action["type"] == "set_iterm_window_size":
-            script = f"""
-            tell application "iTerm2"
-                tell current window
-                    set bounds to {{0, 0, {action["width"]}, {action["height"]}}}
-                end tell
-            end tell
-            """
-            run_applescript(script, "set_iterm_window_size")
-
-        elif action["type"] == "command":
-            escaped_command = escape_command(action['command'])
-            cmd_script = f"""
-            tell application "iTerm2"
-                tell current window
-                    tell current session
-                        write text "{escaped_command}"
-                    end tell
-                end tell
-            end tell
-            """
-            run_applescript(cmd_script, f"command: {action['command']}")
-
-        elif action["type"] == "command_list":
-            for cmd in action["commands"]:
-                escaped_command = escape_command(cmd)
-                cmd_script = f"""
-                tell application "iTerm2"
-                    tell current window
-                        tell current session
-                            write text "{escaped_command}"
-                        end tell
-                    end tell
-                end tell
-                """
-                run_applescript(cmd_script, f"command: {cmd}")
-                time.sleep(action.get("command_delay", 0.5))  # Optional delay between commands
-
-        elif action["type"] == "screenshot":
-            bounds_script = """
-            tell application "iTerm2"
-                get bounds of window 1
-            end tell
-            """
-            bounds = run_applescript(bounds_script, "get_bounds")
-            if bounds:
-                x, y, width, height = bounds.out.strip("{}").split(",")
-                x, y, width, height = map(int, [x, y, width, height])
-
-                # Capture screenshot
-                screenshot = ImageGrab.grab(bbox=(x, y, width, height))
-                
-                # Create a new image with transparency
-                rounded = Image.new('RGBA', screenshot.size, (0, 0, 0, 0))
-                
-                # Create mask with rounded corners
-                mask = Image.new('L', screenshot.size, 0)
-                radius = 10  # Corner radius
-                
-                # Draw rounded rectangle on mask
-                from PIL import ImageDraw
-                draw = ImageDraw.Draw(mask)
-                draw.rounded_rectangle([(0, 0), (screenshot.size[0]-1, screenshot.size[1]-1)], 
-                                     radius=radius, fill=255)
-                
-                # Convert screenshot to RGBA if it isn't already
-                screenshot = screenshot.convert('RGBA')
-                
-                # Paste using the mask
-                rounded.paste(screenshot, (0, 0), mask)
-                
-                # Save with transparency
-                rounded.save(action["filepath"], format='PNG')
-
-        elif action["type"] == "set_palette":
-            palette_name = action["palette"]
-            starship_config = "starship.toml"
-            
-            with open(starship_config, 'r') as file:
-                content = file.readlines()
-            
-            for i, line in enumerate(content):
-                if line.startswith("palette = "):
-                    content[i] = f"palette = '{palette_name}'\n"
-                    break
-            
-            with open(starship_config, 'w') as file:
-                file.writelines(content)
-
-        elif action["type"] == "close_iterm":
-            script = """
-            tell application "iTerm2"
-                close window 1
-            end tell
-            """
-            run_applescript(script, "close_iterm")
-
-        time.sleep(delay_after)
-
-def run_actions():
+        if action.delay_before:
+            terminal.wait_until_ready(action.delay_before)
+        ACTION_HANDLERS[type(action)](terminal, session, action)
+
+@cache
+def get_starship_version():
     try:
-        process_actions(
-            *scene_init(),
-            *scene_demo(),
-            *scene_palettes(),
-            *scene_configuration(),
-            *scene_cleanup()
-        )
-    except KeyboardInterrupt:
-        print("\n\nScript interrupted by user. Cleaning up...\n")
-        # Ignore ALL keyboard interrupts during cleanup
-        original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        result = subprocess.run(["starship", "--version"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    return result.stdout.splitlines()[0] if result.stdout else None
+
+def get_scene_key(actions, backend):
+    # Everything that ends up in the images: the actions (palette, window size, commands), the config and the renderer
+    inputs = {
+        "actions": [action.to_dict() for action in actions],
+        "config": read_starship_config(),
+        "samples": PINNED_SAMPLES,
+        "env": PINNED_ENV,
+        "starship": get_starship_version(),
+        "backend": backend,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+@cache
+def get_scenes(path=SCENES_PATH):
+    return load_scenes(path, STARSHIP_CONFIG)
+
+def get_scene_outputs(actions):
+    return [action.filepath for action in actions if isinstance(action, Screenshot)]
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r') as file:
+        return json.load(file)
+
+def save_manifest(manifest):
+    temp_path = f"{MANIFEST_PATH}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+        file.write("\n")
+    os.replace(temp_path, MANIFEST_PATH)
+
+def is_up_to_date(manifest, name, key, outputs):
+    entry = manifest.get(name)
+    return bool(entry) and entry["key"] == key and all(os.path.exists(path) for path in outputs)
+
+def run_scene(name, actions, backend, env=None):
+    session = Session(name, backend, env)
+    try:
+        process_actions(session, *actions)
+    finally:
+        session.close()
+        for future in session.pending:
+            future.result()
+
+def get_workers(backend, workers):
+    # iTerm2 drives the frontmost window, so its scenes have to run one at a time
+    return 1 if backend == "iterm" else workers
+
+def run_scenes(plans, backend, workers, force=False, env=None):
+    workers = get_workers(backend, workers)
+
+    manifest = load_manifest()
+    scenes = {}
+    for name, actions in plans.items():
+        key = get_scene_key(actions, backend)
+        outputs = get_scene_outputs(actions)
+        if not force and is_up_to_date(manifest, name, key, outputs):
+            log(name, "Up to date")
+            continue
+        scenes[name] = (actions, key, outputs)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_scene, name, actions, backend, env): name for name, (actions, _, _) in scenes.items()
+        }
         try:
-            process_actions(
-                *scene_cleanup(),
-            )
-        finally:
-            # Restore original interrupt handler
-            signal.signal(signal.SIGINT, original_handler)
+            for future in as_completed(futures):
+                name = futures[future]
+                future.result()
+                _, key, outputs = scenes[name]
+                # A failed capture leaves the image missing, keep the scene outdated then
+                if not interrupted.is_set() and all(os.path.exists(path) for path in outputs):
+                    manifest[name] = {"key": key, "outputs": outputs}
+                    save_manifest(manifest)
+                log(name, "Done")
+        except KeyboardInterrupt:
+            print("\n\nScript interrupted by user. Cleaning up...\n")
+            # Stop the running scenes after their current action, their sessions are closed on the way out
+            interrupted.set()
+            executor.shutdown(cancel_futures=True)
+
+def parse_args(scenes):
+    parser = argparse.ArgumentParser(description="Generate the README screenshots.")
+    parser.add_argument(
+        "--backend",
+        choices=["iterm", "headless"],
+        default="iterm" if platform.system() == "Darwin" else "headless",
+        help="iterm drives iTerm2 on macOS, headless renders a PTY session with pyte and PIL",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="scenes to run in parallel (the iterm backend always runs one at a time)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=list(scenes),
+        help="generate only this scene, can be repeated",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="print the compiled actions of the scenes and their longest duration, without running them",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=f"regenerate images even if {MANIFEST_PATH} says they are up to date",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    run_actions()
+    try:
+        scenes = get_scenes()
+    except SceneError as error:
+        sys.exit(f"{SCENES_PATH} is not valid:\n{error}")
+    args = parse_args(scenes)
+    scenes = {name: scenes[name] for name in args.only or scenes}
+    if args.plan:
+        print(format_plan(scenes, get_workers(args.backend, args.workers)))
+    else:
+        with pinned_renders() as env:
+            run_scenes(scenes, args.backend, args.workers, args.force, env)
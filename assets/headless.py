@@ -0,0 +1,341 @@
+import fcntl
+import os
+import re
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import termios
+import threading
+
+import pyte
+from PIL import Image, ImageDraw, ImageFont
+from terminal import Terminal
+
+FONT_SIZE = 14
+PADDING = 10
+TITLE_BAR_HEIGHT = 28
+SHELL = "bash"
+
+# Invisible OSC sequence appended to PS1 after starship renders it. It carries the bash command number (\#), so
+# prompts redrawn by readline, e.g. after a resize, are not mistaken for the prompt of the next command.
+PROMPT_SENTINEL_PATTERN = re.compile(rb"\033\]777;cockpit-prompt;(\d+)\007")
+RC_FILE = r"""eval "$(starship init bash)"
+cockpit_prompt_ready() {
+    case "$PS1" in
+        *"777;cockpit-prompt"*) ;;
+        *) PS1="$PS1\[\033]777;cockpit-prompt;\#\007\]" ;;
+    esac
+}
+PROMPT_COMMAND="${PROMPT_COMMAND:+$PROMPT_COMMAND
+}cockpit_prompt_ready"
+"""
+
+# Makes the pty on stdin the controlling terminal of the new session, then runs the shell. A preexec_fn would do the
+# same in the forked child, but that is not safe while other threads (the parallel scenes) are running.
+CTTY_HELPER = (
+    "import fcntl, os, sys, termios; fcntl.ioctl(0, termios.TIOCSCTTY, 0); os.execvp(sys.argv[1], sys.argv[1:])"
+)
+
+# Regular font first, the bold one is optional. Override with COCKPIT_FONT / COCKPIT_FONT_BOLD.
+FONT_CANDIDATES = [
+    "~/.local/share/fonts/JetBrainsMonoNerdFont-Regular.ttf",
+    "/usr/share/fonts/truetype/jetbrains-mono-nerd/JetBrainsMonoNerdFont-Regular.ttf",
+    "/usr/share/fonts/TTF/JetBrainsMonoNerdFont-Regular.ttf",
+    "~/Library/Fonts/JetBrainsMonoNerdFont-Regular.ttf",
+]
+
+ANSI_COLOR_NAMES = ["black", "red", "green", "brown", "blue", "magenta", "cyan", "white"]
+
+# The iTerm2 profiles used by the scenes: default foreground/background and the 16 ANSI colors
+COLOR_SCHEMES = {
+    "Tokyo-Night": {
+        "foreground": "#c0caf5",
+        "background": "#1a1b26",
+        "title_bar": "#16161e",
+        "ansi": [
+            "#15161e",
+            "#f7768e",
+            "#9ece6a",
+            "#e0af68",
+            "#7aa2f7",
+            "#bb9af7",
+            "#7dcfff",
+            "#a9b1d6",
+            "#414868",
+            "#f7768e",
+            "#9ece6a",
+            "#e0af68",
+            "#7aa2f7",
+            "#bb9af7",
+            "#7dcfff",
+            "#c0caf5",
+        ],
+    },
+    "Cockpit-Gruvbox-Dark": {
+        "foreground": "#ebdbb2",
+        "background": "#282828",
+        "title_bar": "#1d2021",
+        "ansi": [
+            "#282828",
+            "#cc241d",
+            "#98971a",
+            "#d79921",
+            "#458588",
+            "#b16286",
+            "#689d6a",
+            "#a89984",
+            "#928374",
+            "#fb4934",
+            "#b8bb26",
+            "#fabd2f",
+            "#83a598",
+            "#d3869b",
+            "#8ec07c",
+            "#ebdbb2",
+        ],
+    },
+    "Cockpit-Gruvbox-Light": {
+        "foreground": "#3c3836",
+        "background": "#fbf1c7",
+        "title_bar": "#ebdbb2",
+        "ansi": [
+            "#fbf1c7",
+            "#cc241d",
+            "#98971a",
+            "#d79921",
+            "#458588",
+            "#b16286",
+            "#689d6a",
+            "#7c6f64",
+            "#928374",
+            "#9d0006",
+            "#79740e",
+            "#b57614",
+            "#076678",
+            "#8f3f71",
+            "#427b58",
+            "#3c3836",
+        ],
+    },
+}
+COLOR_SCHEMES["Cockpit-Tokyo-Night"] = COLOR_SCHEMES["Tokyo-Night"]
+
+
+def find_font(env_name, candidates):
+    path = os.environ.get(env_name)
+    if path:
+        return path
+    for candidate in candidates:
+        candidate = os.path.expanduser(candidate)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def load_font(path, size):
+    if path:
+        return ImageFont.truetype(path, size)
+    print("Nerd Font not found, set COCKPIT_FONT to render prompt symbols")
+    return ImageFont.load_default()
+
+
+class HeadlessTerminal(Terminal):
+    """Terminal window emulated with a PTY and pyte, rendered to images with PIL.
+
+    Local driver for Linux and CI, process_actions runs the scenes on it without a display. Writes go straight to the
+    PTY, so the default write_many is already cheap.
+    """
+
+    def __init__(self, width, height, shell=SHELL, font_size=FONT_SIZE, env=None, cwd=None):
+        self.width = width
+        self.height = height
+        self.shell = shell
+        self.env = env
+        self.cwd = cwd
+        self.font = load_font(find_font("COCKPIT_FONT", FONT_CANDIDATES), font_size)
+        bold_path = find_font("COCKPIT_FONT_BOLD", [])
+        self.bold_font = load_font(bold_path, font_size) if bold_path else self.font
+        ascent, descent = self.font.getmetrics()
+        self.cell_width = round(self.font.getlength("M"))
+        self.cell_height = ascent + descent
+        self.color_scheme = COLOR_SCHEMES["Tokyo-Night"]
+        self.screen = None
+        self.stream = None
+        self.process = None
+        self.master_fd = None
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.first_prompt = None
+        self.last_prompt = None
+        self.commands = 0
+        self.process_exited = False
+        self.reader = None
+        self.rcfile = None
+
+    # ---- Session -----------------------------------------------------------
+
+    def open(self):
+        columns, rows = self.get_grid_size(self.width, self.height)
+        self.screen = pyte.Screen(columns, rows)
+        self.stream = pyte.ByteStream(self.screen)
+
+        self.first_prompt = self.last_prompt = None
+        self.commands = 0
+        self.process_exited = False
+
+        self.master_fd, slave_fd = os.openpty()
+        self.set_pty_size(slave_fd, columns, rows)
+
+        env = {**os.environ, **(self.env or {})}
+        env["TERM"] = "xterm-256color"
+        env.setdefault("STARSHIP_CONFIG", os.path.abspath("starship.toml"))
+        with tempfile.NamedTemporaryFile("w", suffix=".bashrc", delete=False) as rcfile:
+            rcfile.write(RC_FILE)
+            self.rcfile = rcfile.name
+
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", CTTY_HELPER, self.shell, "--noprofile", "--rcfile", self.rcfile, "-i"],
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            env=env,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        os.close(slave_fd)
+
+        self.reader = threading.Thread(target=self.read_output, args=(self.master_fd,), daemon=True)
+        self.reader.start()
+
+    def close(self):
+        if self.process:
+            # Interactive bash ignores SIGTERM and waiting in readline it does not always act on SIGHUP either, so
+            # leave the shell with exit first, then hang up like a closed terminal window, then kill it
+            try:
+                os.write(self.master_fd, b"exit\r")
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.process.send_signal(signal.SIGHUP)
+                try:
+                    self.process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+        if self.master_fd is not None:
+            os.close(self.master_fd)
+            self.master_fd = None
+        if self.rcfile:
+            os.remove(self.rcfile)
+            self.rcfile = None
+
+    def read_output(self, fd):
+        tail = b""
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except OSError:
+                data = b""
+            with self.ready:
+                if not data:
+                    self.process_exited = True
+                    self.ready.notify_all()
+                    return
+                self.stream.feed(data)
+                # Keep the end of the chunk in case a sentinel is split between two reads
+                chunk = tail + data
+                tail = chunk[-32:]
+                numbers = [int(number) for number in PROMPT_SENTINEL_PATTERN.findall(chunk)]
+                if numbers:
+                    if self.first_prompt is None:
+                        self.first_prompt = min(numbers)
+                    self.last_prompt = max(numbers + [self.last_prompt or 0])
+                    self.ready.notify_all()
+
+    def is_ready(self):
+        if self.process_exited:
+            return True
+        return self.last_prompt is not None and self.last_prompt - self.first_prompt >= self.commands
+
+    def wait_until_ready(self, timeout):
+        # Ready once the shell has drawn the prompt that follows the last command written
+        with self.ready:
+            return self.ready.wait_for(self.is_ready, timeout)
+
+    def wait_until_resized(self, width, height, timeout):
+        # The pyte screen and the PTY are resized synchronously
+        return True
+
+    # ---- Window ------------------------------------------------------------
+
+    def get_grid_size(self, width, height):
+        columns = (width - 2 * PADDING) // self.cell_width
+        rows = (height - TITLE_BAR_HEIGHT - 2 * PADDING) // self.cell_height
+        return max(columns, 1), max(rows, 1)
+
+    def set_pty_size(self, fd, columns, rows):
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, columns, 0, 0))
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        columns, rows = self.get_grid_size(width, height)
+        with self.lock:
+            self.screen.resize(rows, columns)
+        self.set_pty_size(self.master_fd, columns, rows)
+
+    def set_color_scheme(self, name):
+        self.color_scheme = COLOR_SCHEMES[name]
+
+    def write(self, command):
+        with self.ready:
+            self.commands += 1
+        os.write(self.master_fd, (command + "\r").encode())
+
+    # ---- Rendering ---------------------------------------------------------
+
+    def get_color(self, color, default):
+        if color == "default":
+            return default
+        name = color.removeprefix("bright")
+        if name in ANSI_COLOR_NAMES:
+            return self.color_scheme["ansi"][ANSI_COLOR_NAMES.index(name) + (8 if color.startswith("bright") else 0)]
+        return f"#{color}"
+
+    def capture(self):
+        scheme = self.color_scheme
+        image = Image.new("RGB", (self.width, self.height), scheme["background"])
+        draw = ImageDraw.Draw(image)
+
+        with self.lock:
+            title = self.screen.title
+            lines = [dict(self.screen.buffer[row]) for row in range(self.screen.lines)]
+
+        draw.rectangle([(0, 0), (self.width, TITLE_BAR_HEIGHT - 1)], fill=scheme["title_bar"])
+        if title:
+            title_width = self.font.getlength(title)
+            draw.text(
+                ((self.width - title_width) / 2, (TITLE_BAR_HEIGHT - self.cell_height) / 2),
+                title,
+                font=self.font,
+                fill=scheme["foreground"],
+            )
+
+        for row, line in enumerate(lines):
+            y = TITLE_BAR_HEIGHT + PADDING + row * self.cell_height
+            for column, char in sorted(line.items()):
+                x = PADDING + column * self.cell_width
+                foreground = self.get_color(char.fg, scheme["foreground"])
+                background = self.get_color(char.bg, scheme["background"])
+                if char.reverse:
+                    foreground, background = background, foreground
+                if background != scheme["background"]:
+                    draw.rectangle([(x, y), (x + self.cell_width - 1, y + self.cell_height - 1)], fill=background)
+                if char.data.strip():
+                    font = self.bold_font if char.bold else self.font
+                    draw.text((x, y), char.data, font=font, fill=foreground)
+        return image
@@ -0,0 +1,224 @@
+import atexit
+import json
+import shlex
+import subprocess
+import threading
+import time
+from functools import cache
+
+from PIL import ImageGrab
+from terminal import Terminal
+
+POLL_INTERVAL = 0.1
+
+# Last character of the cockpit prompt, see [character] in starship.toml
+PROMPT_SYMBOLS = ("\u276f", "\u276e")
+
+# JXA driver kept running for the whole run. It reads one JSON request per line ({"op": ..., "args": [...]}) and
+# answers each with one JSON line, so the iTerm2 scripting bridge is set up once instead of an AppleScript being
+# compiled and dispatched for every call.
+DRIVER_SCRIPT = """
+ObjC.import("Foundation");
+
+const iTerm = Application("iTerm2");
+const PROMPT_SYMBOLS = %(prompt_symbols)s;
+const POLL_INTERVAL = %(poll_interval)s;
+const stdin = $.NSFileHandle.fileHandleWithStandardInput;
+const stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+let buffer = "";
+
+function readLine() {
+    while (!buffer.includes("\\n")) {
+        const data = stdin.availableData;
+        if (data.length === 0) return null;
+        buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+    }
+    const index = buffer.indexOf("\\n");
+    const line = buffer.slice(0, index);
+    buffer = buffer.slice(index + 1);
+    return line;
+}
+
+function reply(message) {
+    stdout.writeData($(JSON.stringify(message) + "\\n").dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function session() {
+    return iTerm.currentWindow().currentSession();
+}
+
+function isAtPrompt() {
+    // Idle, with a prompt waiting for input on the last line
+    if (session().isProcessing()) return false;
+    const lines = session().contents().split("\\n").filter((line) => line.trim());
+    const last = lines.length ? lines[lines.length - 1].trimEnd() : "";
+    return PROMPT_SYMBOLS.some((symbol) => last.endsWith(symbol));
+}
+
+function waitForPrompt(timeout) {
+    const deadline = Date.now() + timeout * 1000;
+    while (Date.now() < deadline) {
+        if (isAtPrompt()) return true;
+        delay(POLL_INTERVAL);
+    }
+    return false;
+}
+
+const ops = {
+    open: () => (iTerm.createWindowWithDefaultProfile(), true),
+    close: () => (iTerm.windows[0].close(), true),
+    resize: (width, height) => ((iTerm.currentWindow().bounds = {x: 0, y: 0, width, height}), true),
+    bounds: () => {
+        const bounds = iTerm.windows[0].bounds();
+        return [bounds.x, bounds.y, bounds.x + bounds.width, bounds.y + bounds.height];
+    },
+    is_at_prompt: isAtPrompt,
+    write: (lines) => (lines.forEach((text) => session().write({text})), true),
+    // Each line once the previous one is back at the prompt, all in one round trip
+    run: (lines, timeouts) => {
+        lines.forEach((text, index) => {
+            session().write({text});
+            delay(POLL_INTERVAL);
+            waitForPrompt(timeouts[index]);
+        });
+        return true;
+    },
+};
+
+for (let line = readLine(); line !== null; line = readLine()) {
+    const request = JSON.parse(line);
+    try {
+        reply({result: ops[request.op](...request.args)});
+    } catch (error) {
+        reply({error: String(error)});
+    }
+}
+"""
+
+
+class AutomationChannel:
+    """Long-lived `osascript` process running DRIVER_SCRIPT, shared by every iTerm2 session of the run."""
+
+    def __init__(self):
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        script = DRIVER_SCRIPT % {
+            "prompt_symbols": json.dumps(PROMPT_SYMBOLS),
+            "poll_interval": POLL_INTERVAL,
+        }
+        self.process = subprocess.Popen(
+            ["osascript", "-l", "JavaScript", "-e", script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+
+    def call(self, op, *args):
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.start()
+            self.process.stdin.write(json.dumps({"op": op, "args": args}) + "\n")
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        if not line:
+            print(f"Failed to execute {op}: osascript exited")
+            return None
+        reply = json.loads(line)
+        if "error" in reply:
+            print(f"JXA Error in {op}: {reply['error']}")
+            return None
+        return reply["result"]
+
+    def close(self):
+        with self.lock:
+            if self.process is None:
+                return
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+
+@cache
+def get_channel():
+    channel = AutomationChannel()
+    atexit.register(channel.close)
+    return channel
+
+
+class ITermTerminal(Terminal):
+    """iTerm2 window driven through a persistent JXA channel and captured from the screen (macOS only).
+
+    The window runs the user's login shell, so the session environment and directory are set by typing them in.
+    """
+
+    def __init__(self, env=None, cwd=None):
+        self.env = env or {}
+        self.cwd = cwd
+        self.is_open = False
+        self.channel = get_channel()
+
+    def open(self):
+        self.is_open = self.channel.call("open") is not None
+        lines = [f"export {key}={shlex.quote(value)}" for key, value in self.env.items()]
+        if self.cwd:
+            lines.append(f"cd {shlex.quote(self.cwd)}")
+        if lines:
+            self.channel.call("write", lines)
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.channel.call("close")
+        self.is_open = False
+
+    def resize(self, width, height):
+        self.channel.call("resize", width, height)
+
+    def get_bounds(self):
+        bounds = self.channel.call("bounds")
+        return tuple(bounds) if bounds else None
+
+    def is_at_prompt(self):
+        return bool(self.channel.call("is_at_prompt"))
+
+    def wait_until_ready(self, timeout):
+        # Ready when the session is idle and its last line is a prompt waiting for input
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_at_prompt():
+                return True
+            time.sleep(POLL_INTERVAL)
+        return False
+
+    def wait_until_resized(self, width, height, timeout):
+        # iTerm2 snaps the window to its cell grid, so wait for the bounds to settle rather than to match exactly
+        deadline = time.monotonic() + timeout
+        previous = None
+        while time.monotonic() < deadline:
+            bounds = self.get_bounds()
+            if bounds and bounds == previous:
+                return True
+            previous = bounds
+            time.sleep(POLL_INTERVAL)
+        return False
+
+    def set_color_scheme(self, name):
+        self.write(r"echo -e '\033]50;SetProfile=" + name + r"\007'")
+
+    def write(self, command):
+        self.channel.call("write", [command])
+
+    def write_many(self, commands, timeouts):
+        self.channel.call("run", list(commands), list(timeouts))
+
+    def capture(self):
+        bounds = self.get_bounds()
+        if not bounds:
+            return None
+        return ImageGrab.grab(bbox=bounds)
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+import numpy as np
+from PIL import Image
+
+CORNER_RADIUS = 10
+
+# Terminal screenshots have few colors, 256 keeps the anti-aliased text intact at a fraction of the RGBA size
+PNG_COLORS = 256
+PNG_COMPRESS_LEVEL = 9
+OPAQUE_ALPHA = 248
+
+executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="postprocess")
+
+
+@cache
+def get_corner_mask(size, radius=CORNER_RADIUS):
+    """Alpha mask of a window with rounded corners, anti-aliased over one pixel.
+
+    Cached per size and radius and shared by all callers, so it must not be modified.
+    """
+    width, height = size
+    mask = np.full((height, width), 255, dtype=np.uint8)
+
+    # Distance of each pixel center in a corner square to the center of the corner circle
+    offsets = np.arange(radius, dtype=np.float32) + 0.5
+    distance = np.hypot(*np.meshgrid(radius - offsets, radius - offsets))
+    corner = (np.clip(radius - distance + 0.5, 0, 1) * 255).astype(np.uint8)
+
+    mask[:radius, :radius] = corner
+    mask[:radius, -radius:] = corner[:, ::-1]
+    mask[-radius:, :radius] = corner[::-1, :]
+    mask[-radius:, -radius:] = corner[::-1, ::-1]
+
+    return Image.fromarray(mask)
+
+
+def round_corners(image, radius=CORNER_RADIUS):
+    # Screenshots are opaque, so the mask can replace the alpha channel instead of compositing onto a new canvas
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    image.putalpha(get_corner_mask(image.size, radius))
+    return image
+
+
+def save_png(image, filepath, colors=PNG_COLORS):
+    if colors:
+        image = image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        # The octree averages alpha too, snap the nearly opaque entries back so the window body stays opaque
+        palette = np.array(image.getpalette("RGBA"), dtype=np.uint8).reshape(-1, 4)
+        palette[palette[:, 3] >= OPAQUE_ALPHA, 3] = 255
+        image.putpalette(palette.tobytes(), "RGBA")
+    image.save(filepath, format="PNG", optimize=True, compress_level=PNG_COMPRESS_LEVEL)
+
+
+def process_screenshot(image, filepath):
+    save_png(round_corners(image), filepath)
+    return filepath
+
+
+def submit_screenshot(image, filepath):
+    """Round and save a screenshot on the post-processing pool, so the scene can go on while the PNG is encoded."""
+    return executor.submit(process_screenshot, image, filepath)
@@ -0,0 +1,163 @@
+"""Visual regression check: render the scenes headlessly and compare them with the README images in assets/images.
+
+Both sides pin what changes between runs and machines, see pinned_renders() in generate.py: the time and os segments
+are switched off, and the user name, memory usage, battery and keyboard layout have fixed values.
+
+Writes a diff image for every scene that changed and a report.json summary to the output directory, and exits with
+status 1 when any image differs. After an intended change, render the images again with generate.py and commit them.
+
+Usage:
+    python assets/regression.py [--only <scene>] [--threshold 16] [--tolerance 0.001]
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from generate import get_scene_outputs, get_scenes, log, pinned_renders, run_scene
+from scenes import Screenshot
+
+OUTPUT_DIR = "assets/regression"
+IMAGES_DIR = "assets/images"
+
+# Per-channel difference a pixel may have before it counts as changed (anti-aliasing, quantization)
+THRESHOLD = 16
+# Share of changed pixels an image may have before it counts as a regression
+TOLERANCE = 0.001
+
+DIFF_COLOR = np.array([255, 0, 80], dtype=np.uint8)
+
+
+def get_actual_path(output_dir, path):
+    return os.path.join(output_dir, "actual", os.path.relpath(path, IMAGES_DIR))
+
+
+def get_diff_path(output_dir, path):
+    return os.path.join(output_dir, "diff", os.path.relpath(path, IMAGES_DIR))
+
+
+def load_rgba(path):
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGBA"))
+
+
+def compare_images(expected, actual, threshold=THRESHOLD):
+    """Return the mask of pixels that differ by more than threshold in any channel, or None if the sizes differ."""
+    if expected.shape != actual.shape:
+        return None
+    difference = np.abs(expected.astype(np.int16) - actual.astype(np.int16))
+    return difference.max(axis=2) > threshold
+
+
+def make_diff_image(expected, changed):
+    # Dimmed grayscale of the expected image with the changed pixels highlighted
+    gray = (expected[:, :, :3].mean(axis=2) * 0.4).astype(np.uint8)
+    diff = np.repeat(gray[:, :, None], 3, axis=2)
+    diff[changed] = DIFF_COLOR
+    return Image.fromarray(diff)
+
+
+def check_image(expected_path, actual_path, diff_path, threshold=THRESHOLD, tolerance=TOLERANCE):
+    result = {"expected": expected_path, "status": "ok"}
+
+    try:
+        expected = load_rgba(expected_path)
+    except FileNotFoundError:
+        return {**result, "status": "missing", "message": "no image, render it with generate.py"}
+    except UnidentifiedImageError:
+        # Images are stored in Git LFS, a pointer file means they were not fetched
+        return {**result, "status": "missing", "message": "not a PNG, run `git lfs pull`"}
+
+    actual = load_rgba(actual_path)
+    changed = compare_images(expected, actual, threshold)
+    if changed is None:
+        return {**result, "status": "changed", "message": f"size {actual.shape[1::-1]} != {expected.shape[1::-1]}"}
+
+    ratio = float(changed.mean())
+    result["changed_pixels"] = int(changed.sum())
+    result["changed_ratio"] = round(ratio, 6)
+    if ratio > tolerance:
+        os.makedirs(os.path.dirname(diff_path), exist_ok=True)
+        make_diff_image(expected, changed).save(diff_path)
+        result["status"] = "changed"
+        result["diff"] = diff_path
+    return result
+
+
+def check_scene(name, actions, output_dir, threshold, tolerance, env, backend="headless"):
+    # Render into the output directory, the images of the scene are what the renders are compared with
+    rendered = [copy.copy(action) for action in actions]
+    for action in rendered:
+        if isinstance(action, Screenshot):
+            action.filepath = get_actual_path(output_dir, action.filepath)
+            os.makedirs(os.path.dirname(action.filepath), exist_ok=True)
+    run_scene(name, rendered, backend, env)
+
+    results = []
+    for expected_path in get_scene_outputs(actions):
+        actual_path = get_actual_path(output_dir, expected_path)
+        if not os.path.exists(actual_path):
+            results.append({"expected": expected_path, "status": "error", "message": "nothing was rendered"})
+            continue
+        diff_path = get_diff_path(output_dir, expected_path)
+        results.append(check_image(expected_path, actual_path, diff_path, threshold, tolerance))
+    return results
+
+
+def run_checks(names, output_dir, workers, threshold=THRESHOLD, tolerance=TOLERANCE):
+    # Samples and config are pinned for the whole run, the scenes render in their own sessions with them
+    with pinned_renders() as env:
+        return run_scenes(names, output_dir, workers, threshold, tolerance, env)
+
+
+def run_scenes(names, output_dir, workers, threshold, tolerance, env):
+    scenes = get_scenes()
+    report = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(check_scene, name, scenes[name], output_dir, threshold, tolerance, env): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            report[name] = future.result()
+            for result in report[name]:
+                log(name, f"{result['status']}: {result['expected']} {result.get('message', '')}".rstrip())
+    return dict(sorted(report.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--only", action="append", choices=list(get_scenes()), help="check only this scene, can be repeated"
+    )
+    parser.add_argument("--output", default=OUTPUT_DIR, help="where to write the renders, diffs and report.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scenes to check in parallel")
+    parser.add_argument("--threshold", type=int, default=THRESHOLD, help="per-channel difference ignored per pixel")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="share of changed pixels allowed")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    names = args.only or list(get_scenes())
+    report = run_checks(names, args.output, args.workers, args.threshold, args.tolerance)
+
+    report_path = os.path.join(args.output, "report.json")
+    with tempfile.NamedTemporaryFile("w", dir=args.output, delete=False) as file:
+        json.dump(report, file, indent=2)
+        file.write("\n")
+    os.replace(file.name, report_path)
+    print(f"Report: {report_path}")
+
+    statuses = [result["status"] for results in report.values() for result in results]
+    sys.exit(0 if all(status == "ok" for status in statuses) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Scene files compiled into action plans.
+
+The scenes are declared as steps in a TOML file (see scenes.toml). The compiler checks every step up front, expands
+them into typed actions, drops clears and resizes that cannot show up in a screenshot and merges consecutive commands
+into one batch, so process_actions gets a plan that is known to be valid before any window opens.
+"""
+
+import heapq
+import os
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+WINDOW_WIDTH = 870
+WINDOW_HEIGHT = 460
+
+DEFAULT_COLORS = "Cockpit-Tokyo-Night"
+DEFAULT_PALETTE = "default"
+
+IMAGES_DIR = os.path.join("assets", "images")
+
+TITLE_COMMAND = r"echo -e '\033]0;Starship Cockpit Demo\007'"
+CLEAR_COMMAND = "clear"
+
+REQUIRED = object()
+NUMBER = (int, float)
+COMMANDS = list
+
+# Fields of every step type, as {name: (type, default)}
+STEP_FIELDS = {
+    "open": {"colors": (str, DEFAULT_COLORS), "palette": (str, DEFAULT_PALETTE), "height": (int, WINDOW_HEIGHT)},
+    "colors": {"colors": (str, REQUIRED)},
+    "palette": {"palette": (str, REQUIRED)},
+    "resize": {"width": (int, REQUIRED), "height": (int, REQUIRED)},
+    "command": {"commands": (COMMANDS, REQUIRED), "command_delay": (NUMBER, 1 / 2)},
+    "clear": {},
+    "screenshot": {"path": (str, REQUIRED)},
+    "close": {},
+}
+
+# Default (delay_before, delay_after) of every step type
+STEP_DELAYS = {
+    "open": (0, 5),
+    "colors": (0, 1 / 2),
+    "palette": (0, 1),
+    "resize": (0, 1 / 2),
+    "command": (0, 1 / 2),
+    "clear": (0, 1 / 2),
+    "screenshot": (2, 0),
+    "close": (0, 0),
+}
+
+
+class SceneError(ValueError):
+    def __init__(self, problems):
+        super().__init__("\n".join(problems))
+        self.problems = problems
+
+
+# ---- Actions -----------------------------------------------------------------
+
+
+class Action:
+    """One step of a compiled plan. Delays are upper bounds in seconds, see process_actions."""
+
+    __slots__ = ("delay_before", "delay_after")
+    type = None
+
+    def __init__(self, delay_before=0, delay_after=0):
+        self.delay_before = delay_before
+        self.delay_after = delay_after
+
+    def get_fields(self):
+        return {name: getattr(self, name) for name in type(self).__slots__}
+
+    def to_dict(self):
+        delays = {"delay_before": self.delay_before, "delay_after": self.delay_after}
+        return {"type": self.type, **self.get_fields(), **delays}
+
+    def estimate(self):
+        """Longest time the action can take."""
+        return self.delay_before + self.delay_after
+
+    def describe(self):
+        fields = " ".join(f"{name}={value!r}" for name, value in self.get_fields().items())
+        return f"{self.type} {fields}".rstrip()
+
+
+class OpenWindow(Action):
+    __slots__ = ()
+    type = "open"
+
+
+class CloseWindow(Action):
+    __slots__ = ()
+    type = "close"
+
+    def estimate(self):
+        # Nothing is waited for once the window is gone
+        return self.delay_before
+
+
+class SetColors(Action):
+    __slots__ = ("colors",)
+    type = "colors"
+
+    def __init__(self, colors, delay_before=0, delay_after=0):
+        super().__init__(delay_before, delay_after)
+        self.colors = colors
+
+
+class SetPalette(Action):
+    __slots__ = ("palette",)
+    type = "palette"
+
+    def __init__(self, palette, delay_before=0, delay_after=0):
+        super().__init__(delay_before, delay_after)
+        self.palette = palette
+
+
+class Resize(Action):
+    __slots__ = ("width", "height")
+    type = "resize"
+
+    def __init__(self, width, height, delay_before=0, delay_after=0):
+        super().__init__(delay_before, delay_after)
+        self.width = width
+        self.height = height
+
+
+class Clear(Action):
+    """Only exists while compiling, it ends up as a "clear" command."""
+
+    __slots__ = ()
+    type = "clear"
+
+
+class CommandList(Action):
+    """Commands typed one after another, each one waits up to its timeout for the prompt to come back."""
+
+    __slots__ = ("commands", "timeouts")
+    type = "command"
+
+    def __init__(self, commands, timeouts, delay_before=0, delay_after=0):
+        super().__init__(delay_before, delay_after)
+        self.commands = list(commands)
+        self.timeouts = list(timeouts)
+
+    def estimate(self):
+        return self.delay_before + sum(self.timeouts) + self.delay_after
+
+    def merge(self, other):
+        # The waits between the two lists become part of the timeout of the last command of the first one
+        timeouts = self.timeouts[:-1] + [self.timeouts[-1] + self.delay_after + other.delay_before] + other.timeouts
+        return CommandList(self.commands + other.commands, timeouts, self.delay_before, other.delay_after)
+
+    def describe(self):
+        return f"{self.type} {'; '.join(self.commands)}"
+
+
+class Screenshot(Action):
+    __slots__ = ("filepath",)
+    type = "screenshot"
+
+    def __init__(self, filepath, delay_before=0, delay_after=0):
+        super().__init__(delay_before, delay_after)
+        self.filepath = filepath
+
+
+# ---- Compiler ----------------------------------------------------------------
+
+
+def check_value(kind, value):
+    if isinstance(value, bool):
+        return False
+    if kind is COMMANDS:
+        return isinstance(value, list) and bool(value) and all(isinstance(item, str) for item in value)
+    return isinstance(value, kind)
+
+
+def check_screenshot_path(path):
+    normalized = os.path.normpath(path)
+    return not os.path.isabs(path) and normalized.startswith(IMAGES_DIR + os.sep) and normalized.endswith(".png")
+
+
+def check_step(where, step, palettes, problems):
+    """Return the values of a step with its defaults filled in, None if the step is not valid."""
+    if not isinstance(step, dict):
+        problems.append(f"{where}: expected a table")
+        return None
+    step_type = step.get("type")
+    if step_type not in STEP_FIELDS:
+        problems.append(f"{where}: unknown type {step_type!r}, expected one of: {', '.join(STEP_FIELDS)}")
+        return None
+
+    delay_before, delay_after = STEP_DELAYS[step_type]
+    fields = {**STEP_FIELDS[step_type], "delay_before": (NUMBER, delay_before), "delay_after": (NUMBER, delay_after)}
+    count = len(problems)
+    for name in step:
+        if name != "type" and name not in fields:
+            problems.append(f"{where}: unknown field {name!r} for {step_type}")
+
+    values = {}
+    for name, (kind, default) in fields.items():
+        if name not in step:
+            if default is REQUIRED:
+                problems.append(f"{where}: {step_type} needs {name!r}")
+            values[name] = default
+        elif not check_value(kind, step[name]):
+            problems.append(f"{where}: {name} = {step[name]!r} is not valid for {step_type}")
+        else:
+            values[name] = step[name]
+
+    if "palette" in step and palettes is not None and step["palette"] not in palettes:
+        problems.append(f"{where}: palette {step['palette']!r} is not defined in starship.toml")
+    if "path" in step and isinstance(step["path"], str) and not check_screenshot_path(step["path"]):
+        problems.append(f"{where}: path {step['path']!r} must be a .png file under {IMAGES_DIR}")
+    if any(isinstance(values.get(name), NUMBER) and values[name] < 0 for name in fields if "delay" in name):
+        problems.append(f"{where}: delays can not be negative")
+    return values if len(problems) == count else None
+
+
+def build_actions(step_type, values):
+    delays = (values["delay_before"], values["delay_after"])
+    if step_type == "open":
+        # Every scene starts the same way: window, colors, palette, title and size
+        return [
+            OpenWindow(*delays),
+            SetColors(values["colors"], *STEP_DELAYS["colors"]),
+            SetPalette(values["palette"], *STEP_DELAYS["palette"]),
+            CommandList([TITLE_COMMAND], [STEP_DELAYS["command"][1]]),
+            Resize(WINDOW_WIDTH, values["height"], *STEP_DELAYS["resize"]),
+        ]
+    if step_type == "colors":
+        return [SetColors(values["colors"], *delays)]
+    if step_type == "palette":
+        return [SetPalette(values["palette"], *delays)]
+    if step_type == "resize":
+        return [Resize(values["width"], values["height"], *delays)]
+    if step_type == "command":
+        commands = values["commands"]
+        return [CommandList(commands, [values["command_delay"]] * len(commands), *delays)]
+    if step_type == "clear":
+        return [Clear(*delays)]
+    if step_type == "screenshot":
+        return [Screenshot(values["path"], *delays)]
+    return [CloseWindow(*delays)]
+
+
+def drop_redundant(actions):
+    """Drop clears and resizes that do not change what the screenshots show."""
+    last_screenshot = max((index for index, action in enumerate(actions) if isinstance(action, Screenshot)), default=-1)
+    kept = []
+    for index, action in enumerate(actions):
+        if isinstance(action, (Clear, Resize)):
+            if index > last_screenshot:
+                continue
+            # Among clears and resizes in a row, only the last one of each kind matters
+            for previous in reversed(kept):
+                if not isinstance(previous, (Clear, Resize)):
+                    break
+                if type(previous) is type(action):
+                    kept.remove(previous)
+                    break
+        kept.append(action)
+    return kept
+
+
+def merge_commands(actions):
+    """Turn clears into commands and merge consecutive commands into one batch."""
+    merged = []
+    for action in actions:
+        if isinstance(action, Clear):
+            action = CommandList([CLEAR_COMMAND], [action.delay_after], action.delay_before)
+        if isinstance(action, CommandList) and merged and isinstance(merged[-1], CommandList):
+            merged[-1] = merged[-1].merge(action)
+        else:
+            merged.append(action)
+    return merged
+
+
+def compile_scene(name, steps, palettes=None, problems=None):
+    """Compile the steps of a scene into actions. Problems are appended to `problems`, or raised as a SceneError."""
+    raise_problems = problems is None
+    problems = [] if problems is None else problems
+    count = len(problems)
+
+    if not isinstance(steps, list) or not steps:
+        problems.append(f"{name}: expected a non-empty list of steps")
+        steps = []
+
+    actions = []
+    for index, step in enumerate(steps, 1):
+        values = check_step(f"{name}, step {index}", step, palettes, problems)
+        if values is not None:
+            actions.extend(build_actions(step["type"], values))
+
+    types = [step.get("type") if isinstance(step, dict) else None for step in steps]
+    if types and types[0] != "open":
+        problems.append(f"{name}: the first step must be open")
+    if types and (types[-1] != "close" or types.count("close") > 1):
+        problems.append(f"{name}: the last step, and only that one, must be close")
+    if types and "screenshot" not in types:
+        problems.append(f"{name}: no screenshot step")
+
+    if raise_problems and len(problems) > count:
+        raise SceneError(problems)
+    return merge_commands(drop_redundant(actions))
+
+
+def read_palettes(config_path):
+    with open(config_path, "rb") as file:
+        return set(tomllib.load(file).get("palettes", {}))
+
+
+def load_scenes(path, config_path=None):
+    """Compile every scene of a scene file, {name: actions}. Raises a SceneError listing all the problems."""
+    with open(path, "rb") as file:
+        try:
+            data = tomllib.load(file)
+        except tomllib.TOMLDecodeError as error:
+            raise SceneError([f"{path}: {error}"])
+    palettes = read_palettes(config_path) if config_path else None
+
+    problems = []
+    scenes = {}
+    for name, scene in data.get("scenes", {}).items():
+        steps = scene.get("steps") if isinstance(scene, dict) else None
+        scenes[name] = compile_scene(name, steps, palettes, problems)
+
+    outputs = {}
+    for name, actions in scenes.items():
+        for action in actions:
+            if isinstance(action, Screenshot):
+                if action.filepath in outputs:
+                    problems.append(f"{name}: {action.filepath} is also written by {outputs[action.filepath]}")
+                outputs.setdefault(action.filepath, name)
+
+    if not scenes:
+        problems.append(f"{path}: no scenes")
+    if problems:
+        raise SceneError(problems)
+    return scenes
+
+
+# ---- Plan --------------------------------------------------------------------
+
+
+def estimate_duration(scenes, workers):
+    # Longest first on the least busy worker, the way the pool picks them up
+    loads = [0.0] * max(workers, 1)
+    for estimate in sorted((sum(action.estimate() for action in actions) for actions in scenes.values()), reverse=True):
+        heapq.heapreplace(loads, loads[0] + estimate)
+    return max(loads)
+
+
+def format_plan(scenes, workers=1):
+    lines = []
+    for name, actions in scenes.items():
+        estimate = sum(action.estimate() for action in actions)
+        lines.append(f"{name}: {len(actions)} actions, up to {estimate:.1f}s")
+        for index, action in enumerate(actions, 1):
+            lines.append(f"  {index:>2}. {action.describe()}  (up to {action.estimate():.1f}s)")
+    lines.append(f"{len(scenes)} scenes, up to {estimate_duration(scenes, workers):.1f}s with {workers} worker(s)")
+    return "\n".join(lines)
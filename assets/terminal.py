@@ -0,0 +1,82 @@
+class Terminal:
+    """Terminal driver that process_actions runs a scene on.
+
+    Drivers keep their session open between actions. Every wait takes a timeout in seconds, returns as soon as the
+    terminal is ready and tells whether it got there in time.
+    """
+
+    def open(self):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    def resize(self, width, height):
+        raise NotImplementedError
+
+    def set_color_scheme(self, name):
+        raise NotImplementedError
+
+    def write(self, command):
+        raise NotImplementedError
+
+    def write_many(self, commands, timeouts):
+        """Run the commands in order, each one once the previous one is back at the prompt or its timeout ran out.
+
+        Drivers with a costly round trip per write override this to send the whole list at once.
+        """
+        for command, timeout in zip(commands, timeouts):
+            self.write(command)
+            self.wait_until_ready(timeout)
+
+    def wait_until_ready(self, timeout):
+        raise NotImplementedError
+
+    def wait_until_resized(self, width, height, timeout):
+        raise NotImplementedError
+
+    def capture(self):
+        """Return the window as a PIL image, None if it could not be captured."""
+        raise NotImplementedError
+
+
+class FakeTerminal(Terminal):
+    """Driver that only records the calls it gets, for testing the scenes without a display or a shell."""
+
+    def __init__(self, width, height, env=None, cwd=None):
+        self.width = width
+        self.height = height
+        self.env = env
+        self.cwd = cwd
+        self.calls = []
+
+    def open(self):
+        self.calls.append(("open",))
+
+    def close(self):
+        self.calls.append(("close",))
+
+    def resize(self, width, height):
+        self.width, self.height = width, height
+        self.calls.append(("resize", width, height))
+
+    def set_color_scheme(self, name):
+        self.calls.append(("set_color_scheme", name))
+
+    def write(self, command):
+        self.calls.append(("write", command))
+
+    def write_many(self, commands, timeouts):
+        self.calls.append(("write_many", list(commands)))
+
+    def wait_until_ready(self, timeout):
+        return True
+
+    def wait_until_resized(self, width, height, timeout):
+        return True
+
+    def capture(self):
+        from PIL import Image
+
+        self.calls.append(("capture",))
+        return Image.new("RGB", (self.width, self.height))
@@ -0,0 +1,244 @@
+"""Prompt latency benchmarks for starship.toml.
+
+Renders the prompt repeatedly for a set of scenarios and records p50/p95/p99 wall time per scenario, together with
+the per-module timings reported by `starship timings`. Results are written as JSON and can be compared against a
+stored baseline, in which case the run fails when a scenario got slower than the allowed tolerance.
+
+The huge git repo is generated for each run. In large-repo mode its prompt has to stay below --max-large-repo-ms,
+otherwise the run fails as well.
+
+Usage:
+    python benchmarks/bench_prompt.py --runs 50
+    python benchmarks/bench_prompt.py --runs 50 --save-baseline
+    python benchmarks/bench_prompt.py --runs 50 --baseline benchmarks/baseline.json
+    python benchmarks/bench_prompt.py --only huge_git_repo --huge-files 200000 --max-large-repo-ms 50
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "tests"))
+
+from git_scenario import GitScenario  # noqa: E402
+from helpers import (  # noqa: E402
+    StarshipPromptHelper,
+    get_custom_module_env,
+    get_custom_modules,
+    get_large_repo_config,
+    get_palettes,
+    read_config,
+    write_palette_config,
+)
+
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+# Scenarios that --max-large-repo-ms applies to
+LARGE_REPO_SCENARIOS = ("huge_git_repo.large_repo", "huge_git_repo.auto")
+DEFAULT_MAX_LARGE_REPO_MS = 100.0
+
+# `starship timings` prints one row per module: " name  -  12ms  -  "output""
+TIMING_PATTERN = r"^\s*(\S+)\s+-\s+(<)?(\d+)ms\s+-"
+
+
+def make_scenarios(root, huge_files, config_path):
+    config = read_config(config_path)
+    custom_modules = get_custom_modules(config)
+    disabled_env = {}
+    for module in custom_modules:
+        disabled_env.update(get_custom_module_env(module, enabled=False))
+
+    empty_dir = os.path.join(root, "empty")
+    os.makedirs(empty_dir)
+
+    small_repo = GitScenario(os.path.join(root, "small_repo"))
+    small_repo.write("README.md", "# Small repo\n").add("README.md").commit("Initial commit")
+    small_repo.write("README.md", "# Small repo\n\nChanged\n").write("new.txt", "new\n").save()
+
+    huge_repo = GitScenario(os.path.join(root, "huge_repo"))
+    huge_repo.generate(huge_files).commit("Add files")
+    huge_repo.write("files/0000/file000000.txt", "changed\n").save()
+
+    scenarios = [
+        {"name": "empty_dir", "cwd": empty_dir, "env": disabled_env},
+        {"name": "small_git_repo", "cwd": small_repo.path, "env": disabled_env},
+    ]
+    # Metrics always on, skipped by STARSHIP_COCKPIT_LARGE_REPO, and skipped from the size of the index. The prompt
+    # uses the config the shell snippets switch to on entering the repo.
+    large_repo_envs = {
+        "huge_git_repo": {"STARSHIP_COCKPIT_LARGE_REPO": "false"},
+        "huge_git_repo.large_repo": {"STARSHIP_COCKPIT_LARGE_REPO": "true"},
+        "huge_git_repo.auto": {"STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD": str(huge_files // 2)},
+    }
+    for name, large_repo_env in large_repo_envs.items():
+        large_repo_env = {**large_repo_env, "XDG_CACHE_HOME": os.path.join(root, "cache")}
+        env = {**disabled_env, "STARSHIP_CONFIG": get_large_repo_config(config_path, large_repo_env, huge_repo.path)}
+        scenarios.append({"name": name, "cwd": huge_repo.path, "env": env})
+    for module in custom_modules:
+        env = dict(disabled_env)
+        env.update(get_custom_module_env(module))
+        scenarios.append({"name": f"custom.{module}", "cwd": small_repo.path, "env": env})
+    for palette in get_palettes(config):
+        config_path = write_palette_config(config, palette, os.path.join(root, f"{palette}.toml"))
+        env = dict(disabled_env)
+        env["STARSHIP_CONFIG"] = config_path
+        scenarios.append({"name": f"palette.{palette}", "cwd": small_repo.path, "env": env})
+    return scenarios
+
+
+def get_percentiles(samples):
+    if len(samples) < 2:
+        return {"p50_ms": samples[0], "p95_ms": samples[0], "p99_ms": samples[0]}
+    quantiles = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": quantiles[49], "p95_ms": quantiles[94], "p99_ms": quantiles[98]}
+
+
+def get_module_timings(helper, base_env, scenario):
+    env = helper.get_prompt_env(base_env, scenario["env"], scenario["cwd"])
+    result = subprocess.run(["starship", "timings"], env=env, cwd=scenario["cwd"], capture_output=True, text=True)
+    timings = {}
+    for name, below, value in re.findall(TIMING_PATTERN, result.stdout, re.MULTILINE):
+        timings[name] = 0.0 if below else float(value)
+    return timings
+
+
+def run_scenario(helper, base_env, scenario, runs, timing_runs):
+    # Warm up file system caches so the first sample is not an outlier
+    helper.render_prompt(base_env, scenario["env"], scenario["cwd"])
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = helper.render_prompt(base_env, scenario["env"], scenario["cwd"])
+        samples.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"starship prompt failed in {scenario['name']}: {result.stderr}")
+
+    module_samples = {}
+    for _ in range(timing_runs):
+        for name, value in get_module_timings(helper, base_env, scenario).items():
+            module_samples.setdefault(name, []).append(value)
+
+    return {
+        **get_percentiles(samples),
+        "mean_ms": statistics.fmean(samples),
+        "runs": runs,
+        "modules": {name: statistics.median(values) for name, values in sorted(module_samples.items())},
+    }
+
+
+def compare_results(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            limit = base[key] * (1 + tolerance) + min_delta_ms
+            if scenario[key] > limit:
+                slower_modules = [
+                    f"{module} {base['modules'].get(module, 0):.0f}ms -> {value:.0f}ms"
+                    for module, value in scenario["modules"].items()
+                    if value > base["modules"].get(module, 0) + min_delta_ms
+                ]
+                regressions.append(
+                    f"{name}: {key} {base[key]:.1f}ms -> {scenario[key]:.1f}ms (limit {limit:.1f}ms)"
+                    + (f" [{', '.join(slower_modules)}]" if slower_modules else "")
+                )
+    return regressions
+
+
+def check_large_repo_bound(results, max_ms):
+    problems = []
+    for name in LARGE_REPO_SCENARIOS:
+        scenario = results["scenarios"].get(name)
+        if scenario and scenario["p95_ms"] > max_ms:
+            problems.append(f"{name}: p95 {scenario['p95_ms']:.1f}ms is above {max_ms:.1f}ms")
+    return problems
+
+
+def check_results(results, baseline, tolerance, min_delta_ms, max_large_repo_ms):
+    """Print the regressions against the baseline and the large-repo bound, return the exit status of the run."""
+    problems = []
+    if baseline:
+        problems.extend(compare_results(results, baseline, tolerance, min_delta_ms))
+    problems.extend(check_large_repo_bound(results, max_large_repo_ms))
+    if problems:
+        print("\nPrompt latency regressions:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+def print_results(results):
+    print(f"{'scenario':<28} {'p50':>8} {'p95':>8} {'p99':>8}  slowest modules")
+    for name, scenario in results["scenarios"].items():
+        slowest = sorted(scenario["modules"].items(), key=lambda item: item[1], reverse=True)[:3]
+        modules = ", ".join(f"{module} {value:.0f}ms" for module, value in slowest)
+        print(
+            f"{name:<28} {scenario['p50_ms']:>6.1f}ms {scenario['p95_ms']:>6.1f}ms {scenario['p99_ms']:>6.1f}ms  {modules}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=30, help="prompt renders per scenario")
+    parser.add_argument("--timing-runs", type=int, default=3, help="`starship timings` runs per scenario")
+    parser.add_argument("--huge-files", type=int, default=100_000, help="number of files in the huge git repo")
+    parser.add_argument("--only", action="append", help="run only scenarios whose name starts with this prefix")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument("--baseline", help="fail when results regress against this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="allowed absolute slowdown")
+    parser.add_argument(
+        "--max-large-repo-ms",
+        type=float,
+        default=DEFAULT_MAX_LARGE_REPO_MS,
+        help="fail when the p95 of the huge repo in large-repo mode is slower",
+    )
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    helper = StarshipPromptHelper()
+    base_env = os.environ.copy()
+    version = helper.run_starship_command(["--version"]).stdout.splitlines()[0]
+
+    with tempfile.TemporaryDirectory() as root:
+        scenarios = make_scenarios(root, args.huge_files, helper.config_path)
+        if args.only:
+            scenarios = [scenario for scenario in scenarios if scenario["name"].startswith(tuple(args.only))]
+
+        results = {"starship_version": version, "scenarios": {}}
+        for scenario in scenarios:
+            print(f"Running scenario: {scenario['name']}", file=sys.stderr)
+            results["scenarios"][scenario["name"]] = run_scenario(
+                helper, base_env, scenario, args.runs, args.timing_runs
+            )
+
+    print_results(results)
+
+    outputs = [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for output in outputs:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    sys.exit(check_results(results, baseline, args.tolerance, args.min_delta_ms, args.max_large_repo_ms))
+
+
+if __name__ == "__main__":
+    main()
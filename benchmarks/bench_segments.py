@@ -0,0 +1,76 @@
+"""Per-segment latency benchmarks for the cockpit custom modules.
+
+Runs the command of each `custom.*` module in starship.toml the way starship does (through `sh`, with the module
+enabled) and compares it with the implementation it replaced, to show the latency saved per prompt.
+
+Usage:
+    python benchmarks/bench_segments.py --runs 50
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "tests"))
+
+from helpers import BASE_DIR, get_custom_module_env  # noqa: E402
+
+# Previous implementations of the custom modules, kept to measure what the current ones save
+LEGACY_COMMANDS = {
+    "memory_usage": "starship module memory_usage",
+    "battery": """
+battery_info=$(starship module battery)
+if [ -n "$battery_info" ]; then
+    percent=$(echo "$battery_info" | grep -o '[0-9]*%' | sed 's/%//')
+    if [ "$percent" -le "${STARSHIP_COCKPIT_BATTERY_THRESHOLD:-0}" ]; then
+        echo "$battery_info" | sed 's/%%/%/'
+    fi
+fi
+""",
+}
+
+
+def time_command(command, shell, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([shell], input=command, env=env, capture_output=True, text=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=30, help="runs per command")
+    args = parser.parse_args()
+
+    config_path = os.path.join(BASE_DIR, "starship.toml")
+    with open(config_path, "rb") as file:
+        config = tomllib.load(file)
+
+    print(f"{'segment':<24} {'current':>9} {'legacy':>9} {'saved':>9}")
+    for module, module_config in config.get("custom", {}).items():
+        env = os.environ.copy()
+        env["STARSHIP_CONFIG"] = config_path
+        env.update(get_custom_module_env(module))
+        shell = module_config.get("shell", "sh")
+
+        current = time_command(module_config["command"], shell, env, args.runs)
+        if module in LEGACY_COMMANDS:
+            legacy = time_command(LEGACY_COMMANDS[module], shell, env, args.runs)
+            print(f"{module:<24} {current:>7.1f}ms {legacy:>7.1f}ms {legacy - current:>7.1f}ms")
+        else:
+            print(f"{module:<24} {current:>7.1f}ms {'-':>9} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
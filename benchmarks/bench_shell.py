@@ -0,0 +1,242 @@
+"""Shell startup and prompt hook benchmarks for starship.toml.
+
+Starts each shell in a pseudo-terminal with a clean home directory whose rc file loads starship with the cockpit
+config, once with the documented `starship init` line ("eval") and once with the snippet from shell/ ("lazy"), and
+records the median of:
+
+    startup_ms  from starting the shell to its first prompt
+    prompt_ms   from pressing Enter on an empty line to the next prompt: the prompt hooks and one render
+    keymap_ms   from a vi mode change to the [character] symbol of the new mode, zsh only (the one shell that
+                re-renders the prompt on a keymap change)
+
+Usage:
+    python benchmarks/bench_shell.py --runs 20
+    python benchmarks/bench_shell.py --runs 20 --shell zsh --mode lazy
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import pty
+import select
+import shutil
+import signal
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import termios
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "tests"))
+
+from helpers import BASE_DIR  # noqa: E402
+
+SHELL_DIR = os.path.join(BASE_DIR, "shell")
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "shell_results.json")
+
+COLUMNS, LINES = 120, 40
+
+# Last character of the cockpit prompt, see [character] in starship.toml
+INSERT_SYMBOL = "❯".encode()
+VIMCMD_SYMBOL = "❮".encode()
+
+MODES = ("eval", "lazy")
+
+# name: how to start the shell with an rc file, and the rc file lines of every mode
+SHELLS = {
+    "bash": {
+        "command": ["bash", "--noprofile", "--rcfile", "{rc}", "-i"],
+        "rc": ".bashrc",
+        "eval": ['eval "$(starship init bash)"'],
+        "lazy": [f"source {os.path.join(SHELL_DIR, 'cockpit.bash')}"],
+    },
+    "zsh": {
+        "command": ["zsh", "-i"],
+        "rc": ".zshrc",
+        # Vi mode, with Esc taking effect at once, so keymap changes can be measured
+        "setup": ["bindkey -v", "KEYTIMEOUT=1"],
+        "eval": ['eval "$(starship init zsh)"'],
+        "lazy": [f"source {os.path.join(SHELL_DIR, 'cockpit.zsh')}"],
+        "keymap": True,
+    },
+    "pwsh": {
+        "command": ["pwsh", "-NoLogo", "-NoProfile", "-NoExit", "-Command", ". '{rc}'"],
+        "rc": "profile.ps1",
+        "eval": ["Invoke-Expression (&starship init powershell)"],
+        "lazy": [f". {os.path.join(SHELL_DIR, 'cockpit.ps1')}"],
+    },
+}
+
+
+class PtyShell:
+    """Interactive shell on a pseudo-terminal, read until the prompt symbols show up."""
+
+    def __init__(self, command, env, cwd):
+        master, slave = pty.openpty()
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", LINES, COLUMNS, 0, 0))
+        self.start = time.perf_counter()
+        self.process = subprocess.Popen(
+            command, stdin=slave, stdout=slave, stderr=slave, env=env, cwd=cwd, start_new_session=True
+        )
+        os.close(slave)
+        self.master = master
+        self.output = b""
+
+    def read_until(self, symbol, timeout):
+        """Return the seconds until symbol shows up in the output, None on timeout."""
+        deadline = time.perf_counter() + timeout
+        while symbol not in self.output:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not select.select([self.master], [], [], remaining)[0]:
+                return None
+            try:
+                self.output += os.read(self.master, 65536)
+            except OSError:
+                return None
+        return time.perf_counter()
+
+    def drain(self, quiet=0.05):
+        # Let the prompt finish drawing, so the next read only sees what the next key causes
+        while select.select([self.master], [], [], quiet)[0]:
+            try:
+                os.read(self.master, 65536)
+            except OSError:
+                break
+        self.output = b""
+
+    def send(self, keys):
+        self.output = b""
+        os.write(self.master, keys)
+        return time.perf_counter()
+
+    def close(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+        os.close(self.master)
+
+
+def make_home(root, shell, mode):
+    home = os.path.join(root, f"{shell}-{mode}")
+    os.makedirs(home)
+    spec = SHELLS[shell]
+    rc_path = os.path.join(home, spec["rc"])
+    with open(rc_path, "w") as file:
+        file.write("\n".join(spec.get("setup", []) + spec[mode]) + "\n")
+    return home, rc_path
+
+
+def get_shell_env(home, config_path):
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("STARSHIP_", "XDG_"))}
+    env.update(
+        {
+            "HOME": home,
+            "ZDOTDIR": home,
+            "XDG_CACHE_HOME": os.path.join(home, ".cache"),
+            "STARSHIP_CONFIG": config_path,
+            "TERM": "xterm-256color",
+        }
+    )
+    return env
+
+
+def measure(shell, mode, home, rc_path, env, cwd, timeout):
+    """One run of the shell: {metric: milliseconds}, without the metrics that timed out."""
+    command = [part.format(rc=rc_path) for part in SHELLS[shell]["command"]]
+    session = PtyShell(command, env, cwd)
+    try:
+        ready = session.read_until(INSERT_SYMBOL, timeout)
+        if ready is None:
+            raise RuntimeError(f"{shell} ({mode}) did not show a prompt: {session.output[-200:]!r}")
+        result = {"startup_ms": (ready - session.start) * 1000}
+
+        session.drain()
+        sent = session.send(b"\r")
+        ready = session.read_until(INSERT_SYMBOL, timeout)
+        if ready is not None:
+            result["prompt_ms"] = (ready - sent) * 1000
+
+        if SHELLS[shell].get("keymap"):
+            session.drain()
+            sent = session.send(b"\x1b")
+            to_vimcmd = session.read_until(VIMCMD_SYMBOL, timeout)
+            session.drain()
+            sent_back = session.send(b"i")
+            to_insert = session.read_until(INSERT_SYMBOL, timeout)
+            if to_vimcmd is not None and to_insert is not None:
+                result["keymap_ms"] = ((to_vimcmd - sent) + (to_insert - sent_back)) * 500
+        return result
+    finally:
+        session.close()
+
+
+def run_benchmark(root, shell, mode, config_path, cwd, runs, timeout):
+    home, rc_path = make_home(root, shell, mode)
+    env = get_shell_env(home, config_path)
+
+    # Warm up file system caches, and the init cache of the lazy mode
+    measure(shell, mode, home, rc_path, env, cwd, timeout)
+
+    samples = {}
+    for _ in range(runs):
+        for name, value in measure(shell, mode, home, rc_path, env, cwd, timeout).items():
+            samples.setdefault(name, []).append(value)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def format_ms(value):
+    return f"{value:>7.1f}ms" if value is not None else f"{'-':>9}"
+
+
+def print_results(results):
+    print(f"{'shell':<8} {'mode':<6} {'startup':>9} {'prompt':>9} {'keymap':>9}")
+    for shell, modes in results["shells"].items():
+        for mode, result in modes.items():
+            columns = " ".join(format_ms(result.get(name)) for name in ("startup_ms", "prompt_ms", "keymap_ms"))
+            print(f"{shell:<8} {mode:<6} {columns}")
+        if "eval" in modes and "lazy" in modes:
+            saved = modes["eval"]["startup_ms"] - modes["lazy"]["startup_ms"]
+            print(f"{shell:<8} {'saved':<6} {format_ms(saved)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="shell starts per shell and mode")
+    parser.add_argument("--shell", action="append", choices=sorted(SHELLS), help="only benchmark these shells")
+    parser.add_argument("--mode", action="append", choices=MODES, help="only benchmark these modes")
+    parser.add_argument("--cwd", help="directory the shells start in, an empty one by default")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for a prompt")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    args = parser.parse_args()
+
+    shells = [shell for shell in args.shell or SHELLS if shutil.which(shell)]
+    if not shells:
+        parser.error("none of the shells is installed")
+    config_path = os.path.join(BASE_DIR, "starship.toml")
+    version = subprocess.run(["starship", "--version"], capture_output=True, text=True).stdout.splitlines()[0]
+
+    results = {"starship_version": version, "shells": {}}
+    with tempfile.TemporaryDirectory() as root:
+        cwd = args.cwd or os.path.join(root, "cwd")
+        os.makedirs(cwd, exist_ok=True)
+        for shell in shells:
+            for mode in args.mode or MODES:
+                print(f"Running {shell} ({mode})", file=sys.stderr)
+                results["shells"].setdefault(shell, {})[mode] = run_benchmark(
+                    root, shell, mode, config_path, cwd, args.runs, args.timeout
+                )
+
+    print_results(results)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Profile-driven prompt trimming for starship.toml.
+
+Profiles the modules of the top-level `format` with `starship timings` in a sample of real directories, then writes a
+config variant for a workload without the language and tool modules that the workload does not need, that showed
+nothing in any sampled directory and that cost at least --min-ms there. Prompt latency before and after is measured in
+the same directories.
+
+Usage:
+    python benchmarks/trim_prompt.py --workload python ~/src/app ~/src/lib
+    python benchmarks/trim_prompt.py --workload k8s --output ~/.config/starship.toml ~/ops ~/charts
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "tests"))
+
+from bench_prompt import get_percentiles  # noqa: E402
+from helpers import BASE_DIR, StarshipPromptHelper, read_config  # noqa: E402
+
+# Same rows as TIMING_PATTERN in bench_prompt.py, with the module output: " name  -  12ms  -  "output""
+TIMING_OUTPUT_PATTERN = r'^\s*(\S+)\s+-\s+(<)?(\d+)ms\s+-\s+"(.*)"\s*$'
+
+# Modules that probe the directory for project files on every prompt. The rest of the format is always kept.
+PROBING_MODULES = [
+    "c",
+    "rust",
+    "golang",
+    "nodejs",
+    "php",
+    "java",
+    "kotlin",
+    "haskell",
+    "python",
+    "package",
+    "docker_context",
+    "kubernetes",
+]
+
+# Probing modules each workload keeps even when the sampled directories did not trigger them
+WORKLOADS = {
+    "minimal": [],
+    "python": ["python", "package"],
+    "node": ["nodejs", "package"],
+    "rust": ["rust", "package"],
+    "go": ["golang"],
+    "jvm": ["java", "kotlin", "package"],
+    "k8s": ["kubernetes", "docker_context"],
+}
+
+
+def get_module_timings(env, cwd):
+    """Return {module: (milliseconds, output)} for the modules `starship timings` reports in cwd."""
+    result = subprocess.run(["starship", "timings"], env=env, cwd=cwd, capture_output=True, text=True)
+    timings = {}
+    for name, below, value, output in re.findall(TIMING_OUTPUT_PATTERN, result.stdout, re.MULTILINE):
+        timings[name] = (0.0 if below else float(value), output)
+    return timings
+
+
+def profile_modules(helper, base_env, dirs, runs):
+    """Median cost of each module per directory, and whether it rendered anything in any of them."""
+    profile = {}
+    for cwd in dirs:
+        env = helper.get_prompt_env(base_env, cwd=cwd)
+        samples = {}
+        for _ in range(runs):
+            for name, (value, output) in get_module_timings(env, cwd).items():
+                module = profile.setdefault(name, {"ms": {}, "shown": False})
+                module["shown"] = module["shown"] or bool(output.strip())
+                samples.setdefault(name, []).append(value)
+        for name, values in samples.items():
+            profile[name]["ms"][cwd] = statistics.median(values)
+    return profile
+
+
+def get_module_cost(module):
+    """Worst median cost of a profiled module over the sampled directories."""
+    return max(module["ms"].values(), default=0.0)
+
+
+def get_removable_modules(profile, workload, min_ms):
+    """Hidden probing modules outside the workload that cost at least min_ms, most expensive first."""
+    keep = set(WORKLOADS[workload])
+    # `starship timings` leaves out empty modules that took at most 1ms, those count as hidden and free
+    costs = {
+        module: get_module_cost(profile[module]) if module in profile else 0.0
+        for module in PROBING_MODULES
+        if module not in keep and not profile.get(module, {}).get("shown", False)
+    }
+    return sorted((module for module, cost in costs.items() if cost >= min_ms), key=lambda module: -costs[module])
+
+
+def trim_format(config, modules):
+    # The format lists one `$module\` per line, remove those lines and leave the rest of the file untouched
+    for module in modules:
+        config = re.sub(rf"^\${module}\\\n", "", config, flags=re.MULTILINE)
+    return config
+
+
+def measure_latency(helper, base_env, dirs, config_path, runs):
+    latency = {}
+    for cwd in dirs:
+        env = {"STARSHIP_CONFIG": config_path}
+        # Warm up file system caches so the first sample is not an outlier
+        helper.render_prompt(base_env, env, cwd)
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            helper.render_prompt(base_env, env, cwd)
+            samples.append((time.perf_counter() - start) * 1000)
+        latency[cwd] = get_percentiles(samples)["p50_ms"]
+    return latency
+
+
+def print_profile(profile, removed):
+    print(f"{'module':<20} {'max ms':>8} {'shown':>6}")
+    for name, module in sorted(profile.items(), key=lambda item: -get_module_cost(item[1])):
+        cost = get_module_cost(module)
+        marker = "  (removed)" if name in removed else ""
+        print(f"{name:<20} {cost:>8.1f} {'yes' if module['shown'] else 'no':>6}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dirs", nargs="*", default=[os.getcwd()], help="directories to profile (default: cwd)")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="minimal", help="modules to keep")
+    parser.add_argument("--output", help="where to write the variant (default: starship.<workload>.toml)")
+    parser.add_argument(
+        "--min-ms", type=float, default=1.0, help="keep hidden modules cheaper than this (default: %(default)s)"
+    )
+    parser.add_argument("--runs", type=int, default=10, help="prompt renders per directory for the latency")
+    parser.add_argument("--timing-runs", type=int, default=3, help="`starship timings` runs per directory")
+    args = parser.parse_args()
+
+    dirs = [os.path.abspath(os.path.expanduser(path)) for path in args.dirs]
+    output = args.output or os.path.join(BASE_DIR, f"starship.{args.workload}.toml")
+
+    helper = StarshipPromptHelper()
+    base_env = os.environ.copy()
+
+    profile = profile_modules(helper, base_env, dirs, args.timing_runs)
+    removed = get_removable_modules(profile, args.workload, args.min_ms)
+    print_profile(profile, removed)
+
+    with open(output, "w") as file:
+        file.write(trim_format(read_config(), removed))
+    print(f"\nWrote {output} without: {', '.join(removed) or 'nothing'}")
+
+    before = measure_latency(helper, base_env, dirs, helper.config_path, args.runs)
+    after = measure_latency(helper, base_env, dirs, os.path.abspath(output), args.runs)
+    print(f"\n{'directory':<40} {'before':>9} {'after':>9}")
+    for cwd in dirs:
+        print(f"{cwd[-40:]:<40} {before[cwd]:>7.1f}ms {after[cwd]:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
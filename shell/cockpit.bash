@@ -0,0 +1,76 @@
+# Starship cockpit for bash, in place of `eval "$(starship init bash)"`. Add to ~/.bashrc:
+#
+#     source /path/to/starship-cockpit/shell/cockpit.bash
+#
+# `starship init bash` starts starship twice before the first prompt, once for the loader and once for the script it
+# sources. The full init script is cached instead and regenerated when the starship binary changes, so the shell
+# starts without running starship at all. The cockpit sampler is started once for all shells, in the background, when
+# STARSHIP_COCKPIT_SAMPLER_ENABLED=true.
+#
+# Large-repo mode hooks into starship_precmd_user_func. To run a function of your own there as well, set
+# starship_precmd_user_func before sourcing this file, it is still called.
+
+_cockpit_update_init() {
+    # Points _cockpit_init at the cached init script. Its first line names the binary it came from and it gets the
+    # mtime of that binary, so another binary, or the same one replaced by a newer or older build, writes it again.
+    # The size is left out, bash has no way to read it without starting a process.
+    hash starship 2>/dev/null || return
+    local starship="${BASH_CMDS[starship]}"
+    local header="# starship-cockpit: $starship" line=""
+    _cockpit_init="${XDG_CACHE_HOME:-$HOME/.cache}/starship-cockpit/init.bash"
+    [ -s "$_cockpit_init" ] && read -r line < "$_cockpit_init"
+    if [ "$line" != "$header" ] || [ "$starship" -nt "$_cockpit_init" ] || [ "$starship" -ot "$_cockpit_init" ]; then
+        mkdir -p "${_cockpit_init%/*}" &&
+            { echo "$header" && "$starship" init bash --print-full-init; } > "$_cockpit_init.$$" &&
+            touch -r "$starship" "$_cockpit_init.$$" &&
+            mv -f "$_cockpit_init.$$" "$_cockpit_init"
+    fi
+}
+
+_cockpit_start_sampler() {
+    [ "${STARSHIP_COCKPIT_SAMPLER_ENABLED:-false}" = "true" ] || return 0
+    # Keep in sync with `sampler_dir` in the custom commands of starship.toml
+    local runtime_dir="${XDG_RUNTIME_DIR:-${TMPDIR:-/tmp}}"
+    local sampler_dir="${STARSHIP_COCKPIT_SAMPLER_DIR:-$runtime_dir/starship-cockpit-${USER:-cockpit}}"
+    local file pid
+    # Pid files are only trusted in a directory that belongs to this user, the sampler refuses any other one
+    if [ -O "$sampler_dir" ] && [ ! -L "$sampler_dir" ]; then
+        for file in "$sampler_dir"/*; do
+            if [ -f "$file" ] && read -r pid _ < "$file" && kill -0 "$pid" 2>/dev/null; then
+                return 0
+            fi
+        done
+    fi
+    (python3 "$_cockpit_dir/../tools/cockpit_sampler.py" > /dev/null 2>&1 &)
+}
+
+_cockpit_large_repo() {
+    # Picks the config for the current directory with large_repo.sh, once per directory. It runs from starship_precmd
+    # after the status of the last command has been saved, and before the prompt is rendered.
+    if [ "$PWD" != "$_cockpit_large_repo_pwd" ]; then
+        _cockpit_large_repo_pwd="$PWD"
+        local config=""
+        if [ "${STARSHIP_COCKPIT_LARGE_REPO:-auto}" != "false" ]; then
+            config="$(sh "$_cockpit_large_repo_script" "$_cockpit_config")"
+        fi
+        export STARSHIP_CONFIG="${config:-$_cockpit_config}"
+    fi
+    if [ -n "$_cockpit_precmd_user_func" ]; then
+        $_cockpit_precmd_user_func
+    fi
+}
+
+_cockpit_dir="${BASH_SOURCE[0]%/*}"
+# Sourced here rather than in a function, where the declarations of the init script would be local
+_cockpit_update_init && [ -s "$_cockpit_init" ] && source "$_cockpit_init"
+_cockpit_start_sampler
+_cockpit_config="${STARSHIP_CONFIG:-$HOME/.config/starship.toml}"
+_cockpit_large_repo_script="$_cockpit_dir/large_repo.sh"
+case "$_cockpit_large_repo_script" in
+    /*) ;;
+    *) _cockpit_large_repo_script="$PWD/$_cockpit_large_repo_script" ;;
+esac
+_cockpit_precmd_user_func="${starship_precmd_user_func-}"
+starship_precmd_user_func=_cockpit_large_repo
+unset -f _cockpit_update_init _cockpit_start_sampler
+unset _cockpit_dir _cockpit_init
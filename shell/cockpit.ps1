@@ -0,0 +1,69 @@
+# Starship cockpit for PowerShell, in place of `Invoke-Expression (&starship init powershell)`. Add to $PROFILE:
+#
+#     . /path/to/starship-cockpit/shell/cockpit.ps1
+#
+# The full init script of `starship init powershell` is cached and regenerated when the starship binary changes, so
+# the shell starts without running starship at all. The cockpit sampler is started once for all shells, in the
+# background, when STARSHIP_COCKPIT_SAMPLER_ENABLED=true.
+
+$cockpitInit = & {
+    $starship = Get-Command starship -CommandType Application -ErrorAction SilentlyContinue | Select-Object -First 1
+    if (-not $starship) { return }
+    $cacheHome = if ($env:XDG_CACHE_HOME) { $env:XDG_CACHE_HOME } else { Join-Path $HOME ".cache" }
+    $cache = Join-Path $cacheHome "starship-cockpit" "init.ps1"
+    # The first line holds the path, size and mtime of the binary the script came from, any other binary, or the same
+    # one replaced by a newer or older build, writes it again
+    $binary = Get-Item $starship.Source
+    $header = "# starship-cockpit: $($binary.FullName) $($binary.Length) $($binary.LastWriteTimeUtc.Ticks)"
+    $line = if (Test-Path $cache) { Get-Content -TotalCount 1 $cache }
+    if ($line -ne $header) {
+        New-Item -ItemType Directory -Force (Split-Path $cache) | Out-Null
+        @($header) + @(& $starship.Source init powershell --print-full-init) | Out-File -Encoding utf8 "$cache.$PID"
+        Move-Item -Force "$cache.$PID" $cache
+    }
+    $cache
+}
+if ($cockpitInit) { . $cockpitInit }
+Remove-Variable cockpitInit
+
+& {
+    if ($env:STARSHIP_COCKPIT_SAMPLER_ENABLED -ne "true") { return }
+    # Keep in sync with `sampler_dir` in the custom commands of starship.toml
+    $runtimeDir = @($env:XDG_RUNTIME_DIR, $env:TMPDIR, "/tmp") | Where-Object { $_ } | Select-Object -First 1
+    $user = if ($env:USER) { $env:USER } else { "cockpit" }
+    $samplerDir = $env:STARSHIP_COCKPIT_SAMPLER_DIR
+    if (-not $samplerDir) { $samplerDir = Join-Path $runtimeDir "starship-cockpit-$user" }
+    # Pid files are only trusted in a directory that belongs to this user, the sampler refuses any other one
+    $item = Get-Item -LiteralPath $samplerDir -Force -ErrorAction SilentlyContinue
+    $trusted = $item -and -not $item.LinkType -and ($IsWindows -or $item.User -eq [Environment]::UserName)
+    $files = if ($trusted) { Get-ChildItem -File $samplerDir -ErrorAction SilentlyContinue } else { @() }
+    foreach ($file in $files) {
+        $samplerPid = ((Get-Content -TotalCount 1 $file.FullName) -split " ")[0]
+        if ($samplerPid -match "^\d+$" -and (Get-Process -Id $samplerPid -ErrorAction SilentlyContinue)) { return }
+    }
+    $sampler = Join-Path $PSScriptRoot ".." "tools" "cockpit_sampler.py"
+    $log = Join-Path ([System.IO.Path]::GetTempPath()) "starship-cockpit-sampler.log"
+    Start-Process -FilePath python3 -ArgumentList "`"$sampler`"" -RedirectStandardError $log
+}
+
+# Large-repo mode: picks the config for the current directory with large_repo.sh. It runs when the location changes,
+# outside of the prompt, so $? of the last command is left alone. Needs sh on PATH, the config stays as it is without.
+$global:CockpitConfig = $env:STARSHIP_CONFIG
+if (-not $global:CockpitConfig) { $global:CockpitConfig = Join-Path $HOME ".config" "starship.toml" }
+$global:CockpitLargeRepoScript = Join-Path $PSScriptRoot "large_repo.sh"
+function global:Update-CockpitLargeRepo {
+    $exitCode = $global:LASTEXITCODE
+    $config = if ($env:STARSHIP_COCKPIT_LARGE_REPO -ne "false" -and (Get-Command sh -ErrorAction SilentlyContinue)) {
+        sh $global:CockpitLargeRepoScript $global:CockpitConfig
+    }
+    $env:STARSHIP_CONFIG = if ($config) { $config } else { $global:CockpitConfig }
+    $global:LASTEXITCODE = $exitCode
+}
+& {
+    $previous = $ExecutionContext.SessionState.InvokeCommand.LocationChangedAction
+    $ExecutionContext.SessionState.InvokeCommand.LocationChangedAction = {
+        Update-CockpitLargeRepo
+        if ($previous) { & $previous @args }
+    }.GetNewClosure()
+}
+Update-CockpitLargeRepo
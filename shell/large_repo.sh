@@ -0,0 +1,73 @@
+# Large-repo mode of the cockpit snippets. Prints the starship config to use in the current directory:
+#
+#     sh shell/large_repo.sh /path/to/starship.toml
+#
+# The git metrics run `git diff`, which has to check every tracked file. Starship cannot switch a module off from the
+# environment, so in a large repository this prints a copy of the config with [git_metrics] disabled, and the config
+# itself everywhere else. The snippets run it when the directory changes and export the result as STARSHIP_CONFIG, so
+# the prompt itself starts nothing extra.
+
+config="$1"
+mode="${STARSHIP_COCKPIT_LARGE_REPO:-auto}"
+threshold="${STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD:-50000}"
+
+is_large_repo() {
+    [ "$mode" = "true" ] && return 0
+    [ "$mode" = "auto" ] || return 1
+
+    # Find the git directory with shell builtins, worktrees and submodules point to it from a .git file
+    dir="$PWD"
+    while [ -n "$dir" ] && [ ! -e "$dir/.git" ]; do
+        dir="${dir%/*}"
+    done
+    git_dir="$dir/.git"
+    if [ -f "$git_dir" ]; then
+        read -r _ git_dir < "$git_dir"
+        case "$git_dir" in
+            /*) ;;
+            *) git_dir="$dir/$git_dir" ;;
+        esac
+    fi
+
+    # The index header holds the number of tracked files as a 32-bit big-endian integer at offset 8
+    [ -r "$git_dir/index" ] || return 1
+    set -- $(od -An -tu1 -j8 -N4 "$git_dir/index" 2>/dev/null)
+    [ $# -eq 4 ] && [ $(( ($1 << 24) + ($2 << 16) + ($3 << 8) + $4 )) -gt "$threshold" ] || return 1
+
+    # With core.fsmonitor set, git only looks at the files that changed, so the metrics stay cheap
+    case "$(git config --get core.fsmonitor)" in
+        ""|false|no|off|0) return 0 ;;
+    esac
+    return 1
+}
+
+if [ ! -r "$config" ] || ! is_large_repo; then
+    echo "$config"
+    exit 0
+fi
+
+# One copy per config, named after its checksum. Its first line names the config it came from, and it is written
+# again when that config is newer.
+set -- $(printf '%s' "$config" | cksum)
+variant="${XDG_CACHE_HOME:-$HOME/.cache}/starship-cockpit/large-repo-$1.toml"
+header="# starship-cockpit: $config"
+line=""
+[ -s "$variant" ] && read -r line < "$variant"
+if [ "$line" != "$header" ] || [ "$config" -nt "$variant" ]; then
+    mkdir -p "${variant%/*}" &&
+        {
+            echo "$header" &&
+                awk '
+                    /^\[/ { section = $1 }
+                    section == "[git_metrics]" && /^[ \t]*disabled[ \t]*=/ { next }
+                    { print }
+                    /^\[/ && $1 == "[git_metrics]" { print "disabled = true" }
+                ' "$config"
+        } > "$variant.$$" &&
+        mv -f "$variant.$$" "$variant" || {
+        rm -f "$variant.$$"
+        echo "$config"
+        exit 0
+    }
+fi
+echo "$variant"
@@ -0,0 +1,19 @@
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-snapshots",
+        action="store_true",
+        default=False,
+        help="rewrite the golden files in tests/snapshots instead of comparing against them",
+    )
+    parser.addoption(
+        "--prompt-trace",
+        metavar="PATH",
+        default=None,
+        help="append a JSONL record of prompt renders to PATH (command, env changes, duration, parsed segments)",
+    )
+    parser.addoption(
+        "--prompt-trace-level",
+        choices=["error", "all"],
+        default="error",
+        help="renders to record with --prompt-trace: only failed ones (default) or all",
+    )
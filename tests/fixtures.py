@@ -1,3 +1,7 @@
+import functools
+import hashlib
+import json
+import os
 import shutil
 import subprocess
 import tempfile
@@ -5,72 +9,249 @@ from pathlib import Path
 
 import pytest
 
-from helpers import StarshipPromptHelper
+from git_scenario import GitScenario
+from helpers import FakePowerSupply, FakeXkb, PromptTrace, SpawnCounter, StarshipPromptHelper
+
+# Fixed identity and dates make every cached repo state byte-for-byte reproducible
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Test User",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_AUTHOR_DATE": "2024-01-01T00:00:00Z",
+    "GIT_COMMITTER_NAME": "Test User",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+    "GIT_COMMITTER_DATE": "2024-01-01T00:00:00Z",
+}
+
+# Recipe steps:
+#     ("write", path, content)  - write a file in the work tree
+#     ("remove", path)          - remove a file from the work tree
+#     ("git", *args)            - run a git command that must succeed
+#     ("git_try", *args)        - run a git command that is expected to fail (e.g. a conflicting rebase)
+GIT_REPO_TEMPLATE = [
+    ("git", "init", "-b", "main"),
+    ("git", "config", "user.name", "Test User"),
+    ("git", "config", "user.email", "test@example.com"),
+    # Copies get new inodes and ctimes, only compare mtime and size so they don't force an index refresh
+    ("git", "config", "core.trustctime", "false"),
+    ("git", "config", "core.checkStat", "minimal"),
+    ("write", "test.txt", "test content\n"),
+    ("git", "add", "test.txt"),
+    ("git", "commit", "-m", "Initial commit"),
+    ("write", "deleted.txt", "test content\n"),
+    ("git", "add", "deleted.txt"),
+    ("git", "commit", "-m", "Add deleted.txt"),
+    ("write", "modified.txt", "test content\n"),
+    ("git", "add", "modified.txt"),
+    ("git", "commit", "-m", "Add modified.txt"),
+]
+
+GIT_REPO_STATES = {
+    "clean": [],
+    "dirty": [
+        ("write", "modified.txt", "modified content\n"),
+        ("write", "new.txt", "new content\n"),
+    ],
+    "staged": [
+        ("write", "new.txt", "new content\n"),
+        ("git", "add", "new.txt"),
+    ],
+    "deleted": [
+        ("remove", "deleted.txt"),
+    ],
+    "detached": [
+        ("git", "checkout", "--detach", "HEAD~1"),
+    ],
+    "rebasing": [
+        ("git", "checkout", "-b", "feature"),
+        ("write", "feature.txt", "feature content\n"),
+        ("git", "add", "feature.txt"),
+        ("git", "commit", "-m", "Add feature"),
+        ("write", "main.txt", "conflicting content\n"),
+        ("git", "add", "main.txt"),
+        ("git", "commit", "-m", "Create conflict"),
+        ("git", "checkout", "main"),
+        ("write", "main.txt", "main content\n"),
+        ("git", "add", "main.txt"),
+        ("git", "commit", "-m", "Add main file"),
+        ("git", "checkout", "feature"),
+        ("git_try", "rebase", "main"),
+    ],
+}
+
+
+def run_git_recipe(recipe, path):
+    git_env = os.environ.copy()
+    git_env.update(GIT_ENV)
+    for step, *args in recipe:
+        if step == "write":
+            name, content = args
+            (Path(path) / name).write_text(content)
+        elif step == "remove":
+            os.remove(Path(path) / args[0])
+        elif step in ("git", "git_try"):
+            subprocess.run(["git"] + args, cwd=path, env=git_env, check=step == "git", capture_output=True)
+        else:
+            raise ValueError(f"Unknown git recipe step: {step}")
+
+
+@functools.cache
+def get_git_version():
+    return subprocess.run(["git", "--version"], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def get_git_recipe_key(recipe):
+    payload = json.dumps([get_git_version(), GIT_ENV, recipe])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def copy_git_repo(source, destination):
+    # Objects are immutable once written, so they can be shared between copies
+    objects_dir = os.path.join(source, ".git", "objects")
+
+    def copy_file(src, dst):
+        if os.path.commonpath([objects_dir, src]) == objects_dir:
+            try:
+                os.link(src, dst)
+                return dst
+            except OSError:
+                pass
+        return shutil.copy2(src, dst)
+
+    shutil.copytree(source, destination, symlinks=True, copy_function=copy_file, dirs_exist_ok=True)
+    return destination
+
+
+class GitRepoCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def get(self, *recipes):
+        """Return the path of a cached repo built from the given recipes, building it on first use."""
+        recipe = [list(step) for step in sum(recipes, [])]
+        path = os.path.join(self.cache_dir, get_git_recipe_key(recipe))
+        if not os.path.isdir(path):
+            build_dir = tempfile.mkdtemp(dir=self.cache_dir)
+            try:
+                run_git_recipe(recipe, build_dir)
+                os.rename(build_dir, path)
+            except OSError:
+                # Another worker finished the same state first
+                if not os.path.isdir(path):
+                    raise
+            finally:
+                if os.path.isdir(build_dir):
+                    shutil.rmtree(build_dir)
+        return path
+
+    def get_state(self, name):
+        return self.get(GIT_REPO_TEMPLATE, GIT_REPO_STATES[name])
+
+
+@pytest.fixture(scope="session")
+def prompt_helper(request):
+    trace = PromptTrace(request.config.getoption("--prompt-trace"), request.config.getoption("--prompt-trace-level"))
+    helper = StarshipPromptHelper(trace=trace)
+    yield helper
+    helper.close()
+
+
+@pytest.fixture(scope="session")
+def git_repo_cache(request, tmp_path_factory):
+    if hasattr(request.config, "cache"):
+        cache_dir = request.config.cache.mkdir("git_repos")
+    else:
+        cache_dir = tmp_path_factory.mktemp("git_repos")
+    return GitRepoCache(str(cache_dir))
+
+
+@pytest.fixture(scope="session")
+def git_repo_template(git_repo_cache):
+    return git_repo_cache.get_state("clean")
 
 
 @pytest.fixture
-def prompt_helper():
-    return StarshipPromptHelper()
+def git_repo_state(git_repo_cache):
+    # Create temporary git repos from the named states in GIT_REPO_STATES
+    temp_dirs = []
+
+    def make(name="clean"):
+        temp_dir = tempfile.mkdtemp()
+        temp_dirs.append(temp_dir)
+        return copy_git_repo(git_repo_cache.get_state(name), temp_dir)
+
+    yield make
+
+    # Clean up
+    for temp_dir in temp_dirs:
+        shutil.rmtree(temp_dir)
 
 
 @pytest.fixture
-def git_repo():
+def git_repo(git_repo_template):
     # Create a temporary directory for git repo
     temp_dir = tempfile.mkdtemp()
     try:
-        # Initialize git repo
-        subprocess.run(["git", "init", "-b", "main"], cwd=temp_dir, check=True, capture_output=True)
-        subprocess.run(
-            ["git", "config", "user.name", "Test User"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
-        subprocess.run(
-            ["git", "config", "user.email", "test@example.com"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
-
-        # Create and add a file
-        test_file = Path(temp_dir) / "test.txt"
-        test_file.write_text("test content\n")
-        subprocess.run(["git", "add", "test.txt"], cwd=temp_dir, check=True, capture_output=True)
-        subprocess.run(
-            ["git", "commit", "-m", "Initial commit"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
-
-        # Create and add a file
-        test_file = Path(temp_dir) / "deleted.txt"
-        test_file.write_text("test content\n")
-        subprocess.run(["git", "add", "deleted.txt"], cwd=temp_dir, check=True, capture_output=True)
-        subprocess.run(
-            ["git", "commit", "-m", "Add deleted.txt"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
-
-        # Create and add a file
-        test_file = Path(temp_dir) / "modified.txt"
-        test_file.write_text("test content\n")
-        subprocess.run(
-            ["git", "add", "modified.txt"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
-        subprocess.run(
-            ["git", "commit", "-m", "Add modified.txt"],
-            cwd=temp_dir,
-            check=True,
-            capture_output=True,
-        )
+        yield copy_git_repo(git_repo_template, temp_dir)
+    finally:
+        # Clean up
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def git_scenario():
+    # Create temporary git repos that are built in-process with GitScenario
+    temp_dirs = []
 
+    def make(branch="main"):
+        temp_dir = tempfile.mkdtemp()
+        temp_dirs.append(temp_dir)
+        return GitScenario(temp_dir, branch)
+
+    yield make
+
+    # Clean up
+    for temp_dir in temp_dirs:
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def spawn_counter():
+    # Create a temporary directory for the PATH shims
+    temp_dir = tempfile.mkdtemp()
+    try:
+        yield SpawnCounter(temp_dir)
+    finally:
+        # Clean up
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def fake_xkb():
+    # Create a temporary directory for the fake setxkbmap
+    temp_dir = tempfile.mkdtemp()
+    try:
+        yield FakeXkb(temp_dir)
+    finally:
+        # Clean up
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def fake_power_supply():
+    # Create a temporary directory for the fake /sys/class/power_supply
+    temp_dir = tempfile.mkdtemp()
+    try:
+        yield FakePowerSupply(os.path.join(temp_dir, "power_supply"))
+    finally:
+        # Clean up
+        shutil.rmtree(temp_dir)
+
+
+@pytest.fixture
+def sampler_dir():
+    # Create a temporary directory for the cockpit-sampler values and segment caches
+    temp_dir = tempfile.mkdtemp()
+    try:
         yield temp_dir
     finally:
         # Clean up
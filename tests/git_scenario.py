@@ -0,0 +1,463 @@
+import hashlib
+import os
+import struct
+import zlib
+
+AUTHOR = "Test User <test@example.com>"
+AUTHOR_TIME = 1704067200
+
+FILE_MODE = 0o100644
+TREE_MODE = "40000"
+
+# Below this many pending objects they are written loose, above it they go into a single pack
+PACK_THRESHOLD = 1024
+
+PACK_TYPES = {"commit": 1, "tree": 2, "blob": 3}
+
+
+class GitScenario:
+    """Build git repository states by writing objects, refs and the index directly into .git.
+
+    Every method returns the scenario, so states can be described as a chain:
+
+        GitScenario(path).write("a.txt", "a\\n").add("a.txt").commit("Add a").write("a.txt", "")
+
+    Objects are kept in memory and written to disk by save(), which also writes HEAD, refs and the index.
+    """
+
+    def __init__(self, path, branch="main"):
+        self.path = os.path.abspath(path)
+        self.git_dir = os.path.join(self.path, ".git")
+        self.store = {}
+        self.pending = []
+        self.commits = {}
+        self.refs = {}
+        self.head = f"refs/heads/{branch}"
+        self.index = {}
+        # Stat of each staged file when it was staged, the only time its content is known to match the index
+        self.index_stats = {}
+        self.conflicts = {}
+        self.upstreams = {}
+        self.remotes = set()
+        self.rebase_state = None
+        self.extra_refs = {}
+        self.clock = AUTHOR_TIME
+
+        for name in ("objects/info", "objects/pack", "refs/heads", "refs/tags"):
+            os.makedirs(os.path.join(self.git_dir, name), exist_ok=True)
+
+    # ---- Objects -----------------------------------------------------------
+
+    def hash_object(self, kind, data):
+        raw = f"{kind} {len(data)}\0".encode() + data
+        sha = hashlib.sha1(raw).hexdigest()
+        if sha not in self.store:
+            self.store[sha] = (kind, data)
+            self.pending.append(sha)
+        return sha
+
+    def write_tree(self, files):
+        root = {}
+        for name, sha in files.items():
+            *dirs, base = name.split("/")
+            node = root
+            for directory in dirs:
+                node = node.setdefault(directory, {})
+            node[base] = sha
+        return self.write_tree_node(root)
+
+    def write_tree_node(self, node):
+        entries = []
+        for name, value in node.items():
+            if isinstance(value, dict):
+                entries.append((name + "/", TREE_MODE, name, self.write_tree_node(value)))
+            else:
+                entries.append((name, f"{FILE_MODE:o}", name, value))
+        entries.sort()
+        data = b"".join(f"{mode} {name}".encode() + b"\0" + bytes.fromhex(sha) for _, mode, name, sha in entries)
+        return self.hash_object("tree", data)
+
+    def write_commit(self, files, message, parents, author_time=None):
+        self.clock += 1
+        lines = [f"tree {self.write_tree(files)}"]
+        lines += [f"parent {parent}" for parent in parents]
+        lines.append(f"author {AUTHOR} {author_time or self.clock} +0000")
+        lines.append(f"committer {AUTHOR} {self.clock} +0000")
+        data = ("\n".join(lines) + f"\n\n{message}\n").encode()
+        sha = self.hash_object("commit", data)
+        self.commits[sha] = {"files": dict(files), "message": message, "parents": parents, "time": self.clock}
+        return sha
+
+    # ---- Refs --------------------------------------------------------------
+
+    def get_head_commit(self):
+        if self.head.startswith("refs/"):
+            return self.refs.get(self.head)
+        return self.head
+
+    def resolve(self, rev):
+        rev, _, generations = rev.partition("~")
+        if rev == "HEAD":
+            sha = self.get_head_commit()
+        elif f"refs/heads/{rev}" in self.refs:
+            sha = self.refs[f"refs/heads/{rev}"]
+        elif f"refs/remotes/{rev}" in self.refs:
+            sha = self.refs[f"refs/remotes/{rev}"]
+        elif rev in self.commits:
+            sha = rev
+        else:
+            raise ValueError(f"Unknown revision: {rev}")
+        for _ in range(int(generations or 0)):
+            sha = self.commits[sha]["parents"][0]
+        return sha
+
+    def get_ancestors(self, sha):
+        ancestors = set()
+        stack = [sha]
+        while stack:
+            sha = stack.pop()
+            if sha not in ancestors:
+                ancestors.add(sha)
+                stack.extend(self.commits[sha]["parents"])
+        return ancestors
+
+    # ---- Work tree and index -----------------------------------------------
+
+    def write(self, name, content):
+        """Write a file in the work tree without staging it."""
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content.encode() if isinstance(content, str) else content)
+        return self
+
+    def write_many(self, files):
+        for name, content in files.items():
+            self.write(name, content)
+        return self
+
+    def generate(self, count, prefix="files", per_dir=1000):
+        """Write and stage `count` small files spread over directories of `per_dir` files."""
+        names = [f"{prefix}/{i // per_dir:04d}/file{i:06d}.txt" for i in range(count)]
+        for directory in {name.rsplit("/", 1)[0] for name in names}:
+            os.makedirs(os.path.join(self.path, directory), exist_ok=True)
+        for name in names:
+            content = f"{name}\n".encode()
+            with open(os.path.join(self.path, name), "wb") as file:
+                file.write(content)
+            self.stage(name, self.hash_object("blob", content))
+        return self
+
+    def remove(self, name):
+        """Remove a file from the work tree without staging the removal."""
+        os.remove(os.path.join(self.path, name))
+        return self
+
+    def add(self, *names):
+        """Stage the work tree state of the given files, including removals."""
+        for name in names:
+            self.conflicts.pop(name, None)
+            path = os.path.join(self.path, name)
+            if not os.path.exists(path):
+                self.index.pop(name, None)
+                self.index_stats.pop(name, None)
+                continue
+            with open(path, "rb") as file:
+                self.stage(name, self.hash_object("blob", file.read()))
+        return self
+
+    def stage(self, name, sha):
+        self.index[name] = sha
+        self.index_stats[name] = os.stat(os.path.join(self.path, name))
+
+    def add_all(self):
+        names = set(self.index) | set(self.conflicts)
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = [directory for directory in dirs if directory != ".git"]
+            names.update(os.path.relpath(os.path.join(root, name), self.path) for name in files)
+        return self.add(*sorted(names))
+
+    def rm(self, name):
+        return self.remove(name).add(name)
+
+    def reset_work_tree(self, files):
+        for name in set(self.index) - set(files):
+            os.remove(os.path.join(self.path, name))
+        for name, sha in files.items():
+            if self.index.get(name) != sha:
+                self.write(name, self.store[sha][1])
+                self.index_stats[name] = os.stat(os.path.join(self.path, name))
+        self.index = dict(files)
+        self.index_stats = {name: st for name, st in self.index_stats.items() if name in files}
+        self.conflicts = {}
+
+    # ---- History -----------------------------------------------------------
+
+    def commit(self, message):
+        head = self.get_head_commit()
+        sha = self.write_commit(self.index, message, [head] if head else [])
+        self.set_head_commit(sha)
+        return self
+
+    def set_head_commit(self, sha):
+        if self.head.startswith("refs/"):
+            self.refs[self.head] = sha
+        else:
+            self.head = sha
+
+    def branch(self, name, rev="HEAD"):
+        self.refs[f"refs/heads/{name}"] = self.resolve(rev)
+        return self
+
+    def checkout(self, name, create=False):
+        if create:
+            self.branch(name)
+        sha = self.refs[f"refs/heads/{name}"]
+        self.reset_work_tree(self.commits[sha]["files"])
+        self.head = f"refs/heads/{name}"
+        return self
+
+    def detach(self, rev="HEAD"):
+        sha = self.resolve(rev)
+        self.reset_work_tree(self.commits[sha]["files"])
+        self.head = sha
+        return self
+
+    def track(self, remote="origin", rev="HEAD"):
+        """Point the remote-tracking branch of the current branch at `rev` and set it as upstream."""
+        branch = self.head.rpartition("/")[2]
+        self.refs[f"refs/remotes/{remote}/{branch}"] = self.resolve(rev)
+        self.upstreams[branch] = remote
+        self.remotes.add(remote)
+        return self
+
+    def remote_commit(self, message, files, remote="origin"):
+        """Add a commit to the upstream of the current branch, leaving the work tree untouched."""
+        branch = self.head.rpartition("/")[2]
+        ref = f"refs/remotes/{remote}/{branch}"
+        parent = self.refs[ref]
+        tree = dict(self.commits[parent]["files"])
+        tree.update({name: self.hash_object("blob", content.encode()) for name, content in files.items()})
+        self.refs[ref] = self.write_commit(tree, message, [parent])
+        return self
+
+    def rebase(self, upstream):
+        """Replay the current branch onto `upstream`, stopping at the first conflicting commit like git does."""
+        branch = self.head
+        orig_head = self.get_head_commit()
+        onto = self.resolve(upstream)
+        merged = self.get_ancestors(onto)
+
+        picks = []
+        sha = orig_head
+        while sha not in merged:
+            picks.append(sha)
+            sha = self.commits[sha]["parents"][0]
+        picks.reverse()
+
+        self.head = onto
+        self.reset_work_tree(self.commits[onto]["files"])
+        for number, pick in enumerate(picks, start=1):
+            commit = self.commits[pick]
+            base = self.commits[commit["parents"][0]]["files"]
+            files = dict(self.index)
+            conflicts = {}
+            for name in set(base) | set(commit["files"]):
+                ours, theirs, ancestor = files.get(name), commit["files"].get(name), base.get(name)
+                if theirs == ancestor or theirs == ours:
+                    continue
+                if ours == ancestor:
+                    if theirs is None:
+                        files.pop(name)
+                    else:
+                        files[name] = theirs
+                else:
+                    conflicts[name] = (ancestor, ours, theirs)
+
+            if conflicts:
+                self.stop_rebase(branch, onto, orig_head, picks, number, files, conflicts)
+                return self
+
+            self.reset_work_tree(files)
+            self.head = self.write_commit(files, commit["message"], [self.head], commit["time"])
+
+        self.refs[branch] = self.head
+        self.head = branch
+        return self
+
+    def stop_rebase(self, branch, onto, orig_head, picks, number, files, conflicts):
+        pick = picks[number - 1]
+        subject = self.commits[pick]["message"].splitlines()[0]
+        self.reset_work_tree({name: sha for name, sha in files.items() if name not in conflicts})
+        for name, (ancestor, ours, theirs) in conflicts.items():
+            ours_text = self.store[ours][1] if ours else b""
+            theirs_text = self.store[theirs][1] if theirs else b""
+            self.write(
+                name,
+                b"<<<<<<< HEAD\n"
+                + ours_text
+                + b"=======\n"
+                + theirs_text
+                + f">>>>>>> {pick[:7]} ({subject})\n".encode(),
+            )
+            self.index.pop(name, None)
+            self.index_stats.pop(name, None)
+            self.conflicts[name] = {1: ancestor, 2: ours, 3: theirs}
+
+        todo = [f"pick {sha} {self.commits[sha]['message'].splitlines()[0]}\n" for sha in picks]
+        self.rebase_state = {
+            "head-name": f"{branch}\n",
+            "interactive": "",
+            "onto": f"{onto}\n",
+            "orig-head": f"{orig_head}\n",
+            "msgnum": f"{number}\n",
+            "end": f"{len(picks)}\n",
+            "done": "".join(todo[:number]),
+            "git-rebase-todo": "".join(todo[number:]),
+            "stopped-sha": f"{pick}\n",
+            "message": self.commits[pick]["message"] + "\n",
+        }
+        self.extra_refs = {"ORIG_HEAD": orig_head, "REBASE_HEAD": pick}
+
+    # ---- Writing -----------------------------------------------------------
+
+    def save(self):
+        """Write pending objects, refs, HEAD, config and the index into .git."""
+        if len(self.pending) > PACK_THRESHOLD:
+            self.write_pack(self.pending)
+        else:
+            for sha in self.pending:
+                self.write_loose_object(sha)
+        self.pending = []
+
+        for ref, sha in self.refs.items():
+            self.write_git_file(ref, f"{sha}\n")
+        head = f"ref: {self.head}\n" if self.head.startswith("refs/") else f"{self.head}\n"
+        self.write_git_file("HEAD", head)
+        self.write_git_file("config", self.get_config())
+        self.write_index()
+
+        rebase_dir = os.path.join(self.git_dir, "rebase-merge")
+        if self.rebase_state:
+            os.makedirs(rebase_dir, exist_ok=True)
+            for name, content in self.rebase_state.items():
+                self.write_git_file(os.path.join("rebase-merge", name), content)
+            for name, sha in self.extra_refs.items():
+                self.write_git_file(name, f"{sha}\n")
+        return self
+
+    def write_git_file(self, name, content):
+        path = os.path.join(self.git_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            file.write(content)
+
+    def get_config(self):
+        lines = [
+            "[core]",
+            "\trepositoryformatversion = 0",
+            "\tfilemode = true",
+            "\tbare = false",
+            "\tlogallrefupdates = true",
+            "[user]",
+            "\tname = Test User",
+            "\temail = test@example.com",
+        ]
+        for remote in sorted(self.remotes):
+            lines += [
+                f'[remote "{remote}"]',
+                f"\turl = ../{remote}.git",
+                f"\tfetch = +refs/heads/*:refs/remotes/{remote}/*",
+            ]
+        for branch, remote in sorted(self.upstreams.items()):
+            lines += [f'[branch "{branch}"]', f"\tremote = {remote}", f"\tmerge = refs/heads/{branch}"]
+        return "\n".join(lines) + "\n"
+
+    def write_loose_object(self, sha):
+        kind, data = self.store[sha]
+        path = os.path.join(self.git_dir, "objects", sha[:2], sha[2:])
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(zlib.compress(f"{kind} {len(data)}\0".encode() + data, 1))
+
+    def write_pack(self, shas):
+        shas = sorted(set(shas))
+        pack = [b"PACK" + struct.pack(">II", 2, len(shas))]
+        offset = len(pack[0])
+        offsets, crcs = {}, {}
+        for sha in shas:
+            kind, data = self.store[sha]
+            size = len(data)
+            header = bytearray([(PACK_TYPES[kind] << 4) | (size & 0x0F)])
+            size >>= 4
+            while size:
+                header[-1] |= 0x80
+                header.append(size & 0x7F)
+                size >>= 7
+            entry = bytes(header) + zlib.compress(data, 1)
+            offsets[sha], crcs[sha] = offset, zlib.crc32(entry)
+            offset += len(entry)
+            pack.append(entry)
+        pack_data = b"".join(pack)
+        pack_sha = hashlib.sha1(pack_data).digest()
+
+        fanout = [0] * 256
+        for sha in shas:
+            fanout[int(sha[:2], 16)] += 1
+        for i in range(1, 256):
+            fanout[i] += fanout[i - 1]
+        index_data = b"".join(
+            [
+                b"\xfftOc" + struct.pack(">I", 2),
+                struct.pack(">256I", *fanout),
+                b"".join(bytes.fromhex(sha) for sha in shas),
+                b"".join(struct.pack(">I", crcs[sha]) for sha in shas),
+                b"".join(struct.pack(">I", offsets[sha]) for sha in shas),
+                pack_sha,
+            ]
+        )
+        index_data += hashlib.sha1(index_data).digest()
+
+        name = os.path.join(self.git_dir, "objects", "pack", f"pack-{pack_sha.hex()}")
+        with open(f"{name}.pack", "wb") as file:
+            file.write(pack_data + pack_sha)
+        with open(f"{name}.idx", "wb") as file:
+            file.write(index_data)
+
+    def write_index(self):
+        entries = [(name.encode(), 0, sha) for name, sha in self.index.items()]
+        for name, stages in self.conflicts.items():
+            entries += [(name.encode(), stage, sha) for stage, sha in stages.items() if sha]
+        entries.sort()
+
+        data = [b"DIRC" + struct.pack(">II", 2, len(entries))]
+        for name, stage, sha in entries:
+            st = None if stage else self.index_stats.get(name.decode())
+            if st is None:
+                # A zeroed stat never matches the work tree, so git hashes the file again
+                stat = (0,) * 6 + (FILE_MODE, 0, 0, len(self.store[sha][1]))
+            else:
+                stat = (
+                    int(st.st_ctime),
+                    st.st_ctime_ns % 1_000_000_000,
+                    int(st.st_mtime),
+                    st.st_mtime_ns % 1_000_000_000,
+                    st.st_dev,
+                    st.st_ino,
+                    FILE_MODE,
+                    st.st_uid,
+                    st.st_gid,
+                    st.st_size,
+                )
+            flags = (stage << 12) | min(len(name), 0xFFF)
+            entry = struct.pack(">10I", *(value & 0xFFFFFFFF for value in stat))
+            entry += bytes.fromhex(sha) + struct.pack(">H", flags) + name
+            # Entries are NUL padded to a multiple of eight bytes, with at least one NUL
+            entry += b"\0" * (8 - len(entry) % 8)
+            data.append(entry)
+        data = b"".join(data)
+
+        with open(os.path.join(self.git_dir, "index"), "wb") as file:
+            file.write(data + hashlib.sha1(data).digest())
@@ -1,17 +1,232 @@
+import json
 import os
 import re
+import shutil
 import subprocess
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import partial
+
+from prompt_parser import parse_prompt
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS_DIR = os.path.join(BASE_DIR, "tools")
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+BENCHMARKS_DIR = os.path.join(BASE_DIR, "benchmarks")
+LARGE_REPO_SCRIPT = os.path.join(BASE_DIR, "shell", "large_repo.sh")
 
 COLOR_CODE_PATTERN = r"\x1b\[[0-9;]*m"
 
+BATTERY_SYMBOLS = ("󰁹", "󰂄", "󰂃", "󰂑", "󰂎")
+
+RENDER_WORKERS = os.cpu_count() or 1
+
+# Commands the cockpit segments may spawn while rendering a prompt
+SPAWN_COMMANDS = ["starship", "sh", "grep", "sed", "cut", "tr", "printenv", "defaults", "uname", "cat", "git", "od"]
+
+PROMPT_COMMAND = ["starship", "prompt"]
+
+# "error" keeps the renders that exited non-zero or wrote to stderr, "all" keeps every render
+TRACE_LEVELS = {"off": 0, "error": 1, "all": 2}
+TRACE_BATCH_SIZE = 100
+
+PALETTE_PATTERN = r"^\[palettes\.(\w+)\]"
+CUSTOM_MODULE_PATTERN = r"^\[custom\.(\w+)\]"
+
+
+def read_config(config_path=None):
+    with open(config_path or os.path.join(BASE_DIR, "starship.toml")) as file:
+        return file.read()
+
+
+def load_config(config_path=None):
+    return tomllib.loads(read_config(config_path))
+
+
+def run_custom_module_command(module, env=None, config_path=None, cwd=None):
+    """Run the command of a custom module the way starship does, without rendering the prompt."""
+    module_config = load_config(config_path)["custom"][module]
+    command_env = os.environ.copy()
+    if env:
+        command_env.update(env)
+    return subprocess.run(
+        [module_config.get("shell", "sh")],
+        input=module_config["command"],
+        env=command_env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+
+
+def get_large_repo_config(config_path, env=None, cwd=None):
+    """Config the shell snippets switch to in cwd, the large-repo variant of config_path or config_path itself."""
+    command_env = os.environ.copy()
+    if env:
+        command_env.update(env)
+    result = subprocess.run(
+        ["sh", LARGE_REPO_SCRIPT, config_path], env=command_env, cwd=cwd, capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip()
+
+
+def get_palettes(config):
+    return re.findall(PALETTE_PATTERN, config, re.MULTILINE)
+
+
+def get_custom_modules(config):
+    """Custom modules that are turned on and off with STARSHIP_COCKPIT_<MODULE>_ENABLED."""
+    modules = re.findall(CUSTOM_MODULE_PATTERN, config, re.MULTILINE)
+    return [module for module in modules if f"STARSHIP_COCKPIT_{module.upper()}_ENABLED" in config]
+
+
+def get_custom_module_env(module, enabled=True):
+    return {f"STARSHIP_COCKPIT_{module.upper()}_ENABLED": "true" if enabled else "false"}
+
+
+def write_palette_config(config, palette, path):
+    config = re.sub(r"^palette = .*$", f"palette = '{palette}'", config, count=1, flags=re.MULTILINE)
+    with open(path, "w") as file:
+        file.write(config)
+    return path
+
+
+class SpawnCounter:
+    """Count process spawns by putting logging shims for the given commands in front of PATH."""
+
+    def __init__(self, bin_dir, commands=SPAWN_COMMANDS):
+        self.log_path = os.path.join(bin_dir, "spawns.log")
+        path = os.environ.get("PATH", "")
+        for command in commands:
+            real_command = shutil.which(command, path=path)
+            if not real_command:
+                continue
+            shim_path = os.path.join(bin_dir, command)
+            with open(shim_path, "w") as file:
+                file.write(f'#!/bin/sh\necho {command} >> "{self.log_path}"\nexec "{real_command}" "$@"\n')
+            os.chmod(shim_path, 0o755)
+        self.env = {"PATH": bin_dir + os.pathsep + path}
+        self.reset()
+
+    def reset(self):
+        open(self.log_path, "w").close()
+
+    def get_counts(self):
+        counts = {}
+        with open(self.log_path) as file:
+            for command in file.read().split():
+                counts[command] = counts.get(command, 0) + 1
+        return counts
+
+
+class FakeXkb:
+    """Fake `setxkbmap -query` on PATH, reporting the layouts set with set_layouts()."""
+
+    def __init__(self, bin_dir, layouts=("us",)):
+        self.bin_dir = bin_dir
+        self.query_path = os.path.join(bin_dir, "setxkbmap.query")
+        script_path = os.path.join(bin_dir, "setxkbmap")
+        with open(script_path, "w") as file:
+            file.write(f'#!/bin/sh\nwhile IFS= read -r line; do echo "$line"; done < "{self.query_path}"\n')
+        os.chmod(script_path, 0o755)
+        self.env = {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""), "DISPLAY": ":99"}
+        self.set_layouts(*layouts)
+
+    def set_layouts(self, *layouts):
+        with open(self.query_path, "w") as file:
+            file.write(f"rules:      evdev\nmodel:      pc105\nlayout:     {','.join(layouts)}\n")
+
+
+class FakePowerSupply:
+    """Fake /sys/class/power_supply with one battery, for STARSHIP_COCKPIT_POWER_SUPPLY_DIR."""
+
+    def __init__(self, path, capacity=42, status="Discharging"):
+        self.path = path
+        os.makedirs(os.path.join(path, "AC"))
+        with open(os.path.join(path, "AC", "type"), "w") as file:
+            file.write("Mains\n")
+        self.env = {"STARSHIP_COCKPIT_POWER_SUPPLY_DIR": path}
+        self.set_battery(capacity, status)
+
+    def set_battery(self, capacity, status):
+        battery_dir = os.path.join(self.path, "BAT0")
+        os.makedirs(battery_dir, exist_ok=True)
+        for name, value in (("type", "Battery"), ("capacity", capacity), ("status", status)):
+            with open(os.path.join(battery_dir, name), "w") as file:
+                file.write(f"{value}\n")
+
+
+class PromptTrace:
+    """JSONL trace of prompt renders, appended to a file in batches.
+
+    Off unless a path is given. Records are only built for the renders the level keeps, so a disabled or quiet trace
+    costs nothing on the renders themselves.
+    """
+
+    def __init__(self, path=None, level="error", batch_size=TRACE_BATCH_SIZE):
+        self.path = path
+        self.level = TRACE_LEVELS[level] if path else TRACE_LEVELS["off"]
+        self.batch_size = batch_size
+        self.records = []
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.level > TRACE_LEVELS["off"]
+
+    def wants(self, result):
+        if self.level >= TRACE_LEVELS["all"]:
+            return True
+        return self.level >= TRACE_LEVELS["error"] and (result.returncode != 0 or bool(result.stderr))
+
+    def add(self, result, make_record):
+        if not self.wants(result):
+            return
+        record = make_record()
+        with self.lock:
+            self.records.append(record)
+            if len(self.records) >= self.batch_size:
+                self.write_records()
+
+    def flush(self):
+        with self.lock:
+            self.write_records()
+
+    def write_records(self):
+        if not self.records:
+            return
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in self.records)
+        self.records = []
+
 
 class StarshipPromptHelper:
-    def __init__(self):
+    def __init__(self, workers=RENDER_WORKERS, trace=None):
         self.config_path = os.path.join(BASE_DIR, "starship.toml")
         os.environ["STARSHIP_CONFIG"] = self.config_path
+        self.workers = workers
+        self.pool = None
+        self.trace = trace or PromptTrace()
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        self.trace.flush()
+
+    def get_pool(self):
+        # Renders spend their time waiting on the starship process, so threads are enough to keep every core busy
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="starship-prompt")
+        return self.pool
 
     def run_starship_command(self, args, env=None, cwd=None):
         cmd = ["starship"] + args
@@ -21,24 +236,74 @@ class StarshipPromptHelper:
         result = subprocess.run(cmd, env=custom_env, capture_output=True, text=True, cwd=cwd)
         return result
 
-    def run_starship_prompt_command(self, env=None, cwd=None):
-        prompt_env = os.environ.copy()
+    def get_prompt_env(self, base_env, env=None, cwd=None):
+        prompt_env = dict(base_env)
         prompt_env["PWD"] = cwd if cwd else BASE_DIR
         prompt_env["STARSHIP_SHELL"] = prompt_env.get("STARSHIP_SHELL", "bash")
         if env:
             prompt_env.update(env)
+        return prompt_env
 
-        result = subprocess.run(
-            ["starship", "prompt"],
-            env=prompt_env,
+    def render_prompt(self, base_env, env=None, cwd=None):
+        return subprocess.run(
+            PROMPT_COMMAND,
+            env=self.get_prompt_env(base_env, env, cwd),
             cwd=cwd,
             text=True,
             capture_output=True,
         )
 
-        self.print_prompt_debug(result)
+    def render_prompt_timed(self, base_env, env=None, cwd=None):
+        start = time.perf_counter()
+        result = self.render_prompt(base_env, env, cwd)
+        result.duration_ms = (time.perf_counter() - start) * 1000
         return result
 
+    def get_trace_record(self, base_env, request, result):
+        prompt_env = self.get_prompt_env(base_env, request.get("env"), request.get("cwd"))
+        return {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "command": PROMPT_COMMAND,
+            "cwd": request.get("cwd"),
+            # Only what the render changed on top of the test process environment
+            "env": {key: value for key, value in prompt_env.items() if base_env.get(key) != value},
+            "duration_ms": round(result.duration_ms, 3),
+            "returncode": result.returncode,
+            "stderr": result.stderr,
+            "stdout": result.stdout,
+            "segments": [
+                [[segment.module, segment.text] for segment in line.segments]
+                for line in self.parse_prompt(result).lines
+            ],
+        }
+
+    def render_many(self, requests, base_env=None):
+        """Render prompts concurrently on the worker pool.
+
+        Each request is a dict with optional "env" and "cwd" keys, as accepted by run_starship_prompt_command, applied
+        on top of base_env (the test process environment by default). Results are returned in request order.
+        """
+        requests = list(requests)
+        base_env = os.environ.copy() if base_env is None else base_env
+        pool = self.get_pool()
+        render = self.render_prompt_timed if self.trace.enabled else self.render_prompt
+        futures = {
+            pool.submit(render, base_env, request.get("env"), request.get("cwd")): index
+            for index, request in enumerate(requests)
+        }
+
+        results = [None] * len(requests)
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+        if self.trace.enabled:
+            for request, result in zip(requests, results):
+                self.trace.add(result, partial(self.get_trace_record, base_env, request, result))
+        return results
+
+    def run_starship_prompt_command(self, env=None, cwd=None):
+        return self.render_many([{"env": env, "cwd": cwd}])[0]
+
     def clean_output(self, output):
         output = output.replace("\\[", "")
         output = output.replace("\\]", "")
@@ -53,57 +318,23 @@ class StarshipPromptHelper:
     def get_prompt(self, result):
         return self.clean_output(result.stdout.strip())
 
+    def parse_prompt(self, result):
+        # Memoized on the output, every lookup below shares one parse per result
+        return parse_prompt(result.stdout)
+
     def get_prompt_lines(self, result):
-        prompt = self.get_prompt(result)
-        prompt_lines = [line.strip() for line in prompt.split("\n")]
-        return prompt_lines
+        return [line.raw for line in self.parse_prompt(result).lines] or [""]
 
     def get_prompt_parts(self, result):
-        prompt_lines = self.get_prompt_lines(result)
-        prompt_parts = prompt_lines[0].split("  ")
-        return prompt_parts
+        lines = self.parse_prompt(result).lines
+        if not lines:
+            return [""]
+        return [segment.raw for segment in lines[0].segments]
+
+    def get_prompt_segment(self, result, part_name):
+        prompt = self.parse_prompt(result)
+        return prompt.get_segment(part_name)
 
     def get_prompt_part(self, prompt, part_name):
-        prompt_parts = self.get_prompt_parts(prompt)
-        if part_name == "main":
-            return prompt_parts[0]
-        for part in prompt_parts:
-            clean_part = self.clean_color_codes(part)
-            if any(
-                [
-                    part_name == "git" and (clean_part.startswith("") or clean_part.startswith("@")),
-                    part_name == "shell" and clean_part.startswith(""),
-                    part_name == "memory_usage" and clean_part.startswith("󰓅"),
-                    part_name == "time" and clean_part.startswith("󰔛"),
-                ]
-            ):
-                return part
-        return None
-
-    def print_prompt_debug(self, result):
-        self.print_spacer()
-        self.print_spacer()
-        self.print_prompt(result)
-        self.print_spacer()
-        self.print_prompt_parts(result)
-        self.print_spacer()
-
-    def print_parts(self, parts, header):
-        divider = "┆"
-        print(f"{header} {divider}{parts[0]}")
-        for part in parts[1:]:
-            spacer = " " * len(header)
-            print(f"{spacer} {divider}{part}")
-
-    def print_prompt(self, result):
-        prompt_lines = self.get_prompt_lines(result)
-        header = "PROMPT"
-        self.print_parts(prompt_lines, header)
-
-    def print_prompt_parts(self, result):
-        prompt_parts = self.get_prompt_parts(result)
-        header = "PARTS "
-        self.print_parts(prompt_parts, header)
-
-    def print_spacer(self):
-        print("")
+        segment = self.get_prompt_segment(prompt, part_name)
+        return segment.raw if segment else None
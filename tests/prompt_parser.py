@@ -0,0 +1,175 @@
+"""Single-pass parser for the output of `starship prompt`.
+
+Turns the raw output for bash (`\\[ \\]` wrappers), zsh (`%{ %}` wrappers) and pwsh (bare escapes) into lines of
+segments. Segments are the groups separated by two spaces, as the cockpit format lays them out; each one keeps its raw
+text (with color codes), its plain text and the SGR style of every span of text.
+"""
+
+import re
+from functools import lru_cache
+
+# Zero-width wrappers bash and zsh put around escape sequences
+WRAPPERS = ("\\[", "\\]", "%{", "%}")
+SEPARATOR = "  "
+
+TOKEN_PATTERN = re.compile(r"(\\\[|\\\]|%\{|%\})|(\x1b\[[0-9;]*m)|(\n)|([^\\%\x1b\n]+|[\\%\x1b])")
+
+# Leading symbols of the cockpit segments, in lookup order. The first segment of the first line is always "main".
+SEGMENT_SYMBOLS = [
+    ("git", ("\uf418", "@")),
+    ("shell", ("\uebca",)),
+    ("memory_usage", ("\U000f04c5",)),
+    ("battery", ("\U000f0079", "\U000f0084", "\U000f0083", "\U000f0091", "\U000f008e")),
+    ("keyboard_layout", ("\U000f030c",)),
+    ("time", ("\U000f051b",)),
+]
+
+
+class Span:
+    def __init__(self, start, end, style):
+        self.start = start
+        self.end = end
+        # SGR parameters in effect, e.g. "1;38;2;255;0;0", "" for the default style
+        self.style = style
+
+    def __repr__(self):
+        return f"Span({self.start}, {self.end}, {self.style!r})"
+
+
+class Segment:
+    def __init__(self):
+        self.module = None
+        self.raw_parts = []
+        self.text_parts = []
+        self.spans = []
+        self.length = 0
+
+    @property
+    def raw(self):
+        return "".join(self.raw_parts)
+
+    @property
+    def text(self):
+        return "".join(self.text_parts)
+
+    def add_text(self, text, style):
+        self.raw_parts.append(text)
+        self.text_parts.append(text)
+        self.spans.append(Span(self.length, self.length + len(text), style))
+        self.length += len(text)
+
+    def add_code(self, code):
+        self.raw_parts.append(code)
+
+    def is_empty(self):
+        return not self.raw_parts
+
+    def __repr__(self):
+        return f"Segment({self.module!r}, {self.text!r})"
+
+
+class PromptLine:
+    def __init__(self, segments):
+        self.segments = segments
+
+    @property
+    def raw(self):
+        return SEPARATOR.join(segment.raw for segment in self.segments)
+
+
+class Prompt:
+    def __init__(self, lines):
+        self.lines = lines
+        # First segment of each module on the first line, for constant time lookups
+        self.modules = {}
+        for segment in lines[0].segments if lines else []:
+            if segment.module and segment.module not in self.modules:
+                self.modules[segment.module] = segment
+
+    def get_segment(self, module):
+        return self.modules.get(module)
+
+
+def get_segment_module(text):
+    for module, symbols in SEGMENT_SYMBOLS:
+        if text.startswith(symbols):
+            return module
+    return None
+
+
+class PromptParser:
+    """Builds a Prompt from raw output in one pass over its tokens.
+
+    Matches the old `strip()` / `split("\\n")` / `split("  ")` processing: wrappers are dropped, lines lose their
+    surrounding whitespace, and two spaces in a row of text (not interrupted by a color code) separate segments.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.segments = []
+        self.segment = Segment()
+        self.pending = []
+        self.style = ""
+
+    def flush_text(self, line_end=False):
+        text = "".join(self.pending)
+        self.pending = []
+        if not self.segments and self.segment.is_empty():
+            text = text.lstrip()
+        if line_end:
+            text = text.rstrip()
+        pieces = text.split(SEPARATOR)
+        for index, piece in enumerate(pieces):
+            if index:
+                self.end_segment()
+            if piece:
+                self.segment.add_text(piece, self.style)
+
+    def end_segment(self):
+        self.segments.append(self.segment)
+        self.segment = Segment()
+
+    def end_line(self):
+        self.flush_text(line_end=True)
+        if not self.segment.is_empty() or self.segments:
+            self.end_segment()
+        self.lines.append(PromptLine(self.segments))
+        self.segments = []
+
+    def set_style(self, code):
+        params = code[2:-1]
+        if params in ("", "0"):
+            self.style = ""
+        else:
+            self.style = f"{self.style};{params}" if self.style else params
+
+    def parse(self, output):
+        for wrapper, code, newline, text in TOKEN_PATTERN.findall(output):
+            if text:
+                self.pending.append(text)
+            elif code:
+                self.flush_text()
+                self.segment.add_code(code)
+                self.set_style(code)
+            elif newline:
+                self.end_line()
+        self.end_line()
+
+        # Leading and trailing empty lines, e.g. from add_newline
+        lines = self.lines
+        while lines and not lines[0].segments:
+            lines = lines[1:]
+        while lines and not lines[-1].segments:
+            lines = lines[:-1]
+
+        if lines:
+            segments = lines[0].segments
+            for index, segment in enumerate(segments):
+                segment.module = "main" if index == 0 else get_segment_module(segment.text)
+        return Prompt(lines)
+
+
+@lru_cache(maxsize=4096)
+def parse_prompt(output):
+    """Parse raw `starship prompt` output. Memoized, so repeated lookups on the same output do not parse again."""
+    return PromptParser().parse(output)
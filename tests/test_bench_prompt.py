@@ -0,0 +1,87 @@
+import os
+import sys
+
+from helpers import BASE_DIR, BENCHMARKS_DIR, load_config
+
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import bench_prompt  # noqa: E402
+
+CONFIG_PATH = os.path.join(BASE_DIR, "starship.toml")
+
+
+def test_large_repo_scenarios(tmp_path):
+    scenarios = {scenario["name"]: scenario for scenario in bench_prompt.make_scenarios(str(tmp_path), 20, CONFIG_PATH)}
+
+    # The synthetic huge repo gets the config of the shell snippets, without the git metrics in large-repo mode
+    assert scenarios["huge_git_repo"]["env"]["STARSHIP_CONFIG"] == CONFIG_PATH
+    for name in bench_prompt.LARGE_REPO_SCENARIOS:
+        config = load_config(scenarios[name]["env"]["STARSHIP_CONFIG"])
+        assert config["git_metrics"]["disabled"] is True
+
+
+def make_results(scenarios, modules=None):
+    # {name: (p50, p95)}, each scenario with the same module timings
+    return {
+        "scenarios": {
+            name: {"p50_ms": p50, "p95_ms": p95, "modules": dict(modules or {})}
+            for name, (p50, p95) in scenarios.items()
+        }
+    }
+
+
+def test_percentiles_single_sample():
+    assert bench_prompt.get_percentiles([12.5]) == {"p50_ms": 12.5, "p95_ms": 12.5, "p99_ms": 12.5}
+
+
+def test_percentiles():
+    percentiles = bench_prompt.get_percentiles([float(value) for value in range(1, 102)])
+
+    assert percentiles == {"p50_ms": 51.0, "p95_ms": 96.0, "p99_ms": 100.0}
+
+
+def test_compare_results():
+    baseline = make_results(
+        {"empty_dir": (10.0, 20.0), "small_git_repo": (10.0, 20.0)}, {"git_status": 10.0, "directory": 1.0}
+    )
+    results = make_results(
+        {"empty_dir": (17.0, 30.0), "small_git_repo": (18.0, 20.0)}, {"git_status": 10.0, "directory": 1.0}
+    )
+    results["scenarios"]["small_git_repo"]["modules"]["git_status"] = 16.0
+    # Scenarios missing from the baseline are not compared
+    results["scenarios"]["new"] = {"p50_ms": 100.0, "p95_ms": 100.0, "modules": {}}
+
+    # Within tolerance * base + min_delta: 10 * 1.25 + 5 = 17.5 and 20 * 1.25 + 5 = 30
+    assert bench_prompt.compare_results(results, baseline, 0.25, 5.0) == [
+        "small_git_repo: p50_ms 10.0ms -> 18.0ms (limit 17.5ms) [git_status 10ms -> 16ms]"
+    ]
+    assert bench_prompt.compare_results(results, baseline, 0.25, 10.0) == []
+    assert bench_prompt.compare_results(results, baseline, 0.0, 0.0) == [
+        "empty_dir: p50_ms 10.0ms -> 17.0ms (limit 10.0ms)",
+        "empty_dir: p95_ms 20.0ms -> 30.0ms (limit 20.0ms)",
+        "small_git_repo: p50_ms 10.0ms -> 18.0ms (limit 10.0ms) [git_status 10ms -> 16ms]",
+    ]
+
+
+def test_check_large_repo_bound():
+    results = make_results({"huge_git_repo": (500.0, 900.0), "huge_git_repo.large_repo": (40.0, 120.0)})
+
+    # Only the large-repo scenarios are bounded, the metrics are expected to be slow without it
+    assert bench_prompt.check_large_repo_bound(results, 100.0) == [
+        "huge_git_repo.large_repo: p95 120.0ms is above 100.0ms"
+    ]
+    assert bench_prompt.check_large_repo_bound(results, 150.0) == []
+
+
+def test_check_results(capsys):
+    baseline = make_results({"empty_dir": (10.0, 20.0)})
+    results = make_results({"empty_dir": (10.0, 20.0), "huge_git_repo.auto": (40.0, 60.0)})
+
+    assert bench_prompt.check_results(results, baseline, 0.25, 5.0, 100.0) == 0
+    assert capsys.readouterr().out == ""
+
+    # The bound fails the run without a baseline as well
+    assert bench_prompt.check_results(results, None, 0.25, 5.0, 50.0) == 1
+    assert capsys.readouterr().out == (
+        "\nPrompt latency regressions:\n  huge_git_repo.auto: p95 60.0ms is above 50.0ms\n"
+    )
@@ -0,0 +1,44 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from helpers import BENCHMARKS_DIR
+
+# Stand-in for starship: a version, and an init script whose prompt ends with the [character] symbol
+FAKE_STARSHIP = """#!/bin/sh
+case "$1" in
+    --version) echo "starship 0.0.0-stand-in" ;;
+    init) echo "PS1='cockpit ❯ '" ;;
+esac
+"""
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_bench_shell_with_stand_in(tmp_path):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "starship").write_text(FAKE_STARSHIP)
+    (bin_dir / "starship").chmod(0o755)
+    output = tmp_path / "shell_results.json"
+    command = [sys.executable, os.path.join(BENCHMARKS_DIR, "bench_shell.py"), "--runs", "2", "--shell", "bash"]
+    command += ["--output", str(output)]
+    env = {**os.environ, "PATH": str(bin_dir) + os.pathsep + os.environ.get("PATH", "")}
+
+    result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    results = json.loads(output.read_text())
+    assert results["starship_version"] == "starship 0.0.0-stand-in"
+    # Both ways of loading the prompt start a shell and answer an empty line, bash has no keymap metric
+    for mode in ("eval", "lazy"):
+        assert set(results["shells"]["bash"][mode]) == {"startup_ms", "prompt_ms"}
+        assert all(value > 0 for value in results["shells"]["bash"][mode].values())
+    assert [line.split()[:2] for line in result.stdout.splitlines()[1:]] == [
+        ["bash", "eval"],
+        ["bash", "lazy"],
+        ["bash", "saved"],
+    ]
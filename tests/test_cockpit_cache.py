@@ -0,0 +1,137 @@
+import os
+import subprocess
+import sys
+import time
+
+from helpers import TOOLS_DIR
+
+sys.path.insert(0, TOOLS_DIR)
+
+import cockpit_cache  # noqa: E402
+
+CACHE_SCRIPT = os.path.join(TOOLS_DIR, "cockpit_cache.py")
+
+# Upper bound for one `get` on a cold or stale cache, interpreter startup included, however slow the command is
+MAX_GET_SECONDS = 1.0
+
+
+def slow_command(value, seconds=3, counter=None):
+    # Prints value after sleeping, and appends a line to counter every time it runs
+    script = f"echo run >> {counter}; " if counter else ""
+    return ["sh", "-c", f"{script}sleep {seconds}; echo {value}"]
+
+
+def run_get(cache_dir, cwd, module, command, *options):
+    start = time.monotonic()
+    result = subprocess.run(
+        [sys.executable, CACHE_SCRIPT, "get", module, "--dir", str(cache_dir), *options, "--", *command],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout, time.monotonic() - start
+
+
+def wait_for_value(path, value, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entry = cockpit_cache.read_entry(path)
+        if entry and entry[1] == value and not os.path.exists(f"{path}.lock"):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_get_cache_dir():
+    assert cockpit_cache.get_cache_dir({"STARSHIP_COCKPIT_CACHE_DIR": "/custom"}) == "/custom"
+    assert cockpit_cache.get_cache_dir({"XDG_CACHE_HOME": "/cache", "HOME": "/home/test"}) == (
+        "/cache/starship-cockpit"
+    )
+    assert cockpit_cache.get_cache_dir({"HOME": "/home/test"}) == "/home/test/.cache/starship-cockpit"
+
+
+def test_entry_path_per_directory_and_module(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, "/repo", "kubernetes")
+
+    assert os.path.basename(path).startswith("kubernetes-")
+    assert path == cockpit_cache.get_entry_path(tmp_path, "/repo", "kubernetes")
+    assert path != cockpit_cache.get_entry_path(tmp_path, "/other", "kubernetes")
+    assert path != cockpit_cache.get_entry_path(tmp_path, "/repo", "docker_context")
+    assert os.path.dirname(cockpit_cache.get_entry_path(tmp_path, "/repo", "../custom")) == str(tmp_path)
+
+
+def test_cold_cache_does_not_wait_for_slow_command(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, str(tmp_path), "slow")
+
+    output, seconds = run_get(tmp_path, tmp_path, "slow", slow_command("fresh", seconds=1))
+    assert output == ""
+    assert seconds < MAX_GET_SECONDS
+
+    # The refresh goes on in the background and the next prompt gets its value
+    assert wait_for_value(path, "fresh")
+    output, _ = run_get(tmp_path, tmp_path, "slow", slow_command("fresh", seconds=1))
+    assert output == "fresh\n"
+
+
+def test_cold_cache_waits_for_fast_command(tmp_path):
+    output, _ = run_get(tmp_path, tmp_path, "fast", ["echo", "fresh"], "--wait", "5")
+    assert output == "fresh\n"
+
+
+def test_stale_value_is_served_while_refreshing(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, str(tmp_path), "slow")
+    cockpit_cache.write_entry(path, "old", 0)
+
+    output, seconds = run_get(tmp_path, tmp_path, "slow", slow_command("new", seconds=1))
+    assert output == "old\n"
+    assert seconds < MAX_GET_SECONDS
+    assert wait_for_value(path, "new")
+
+
+def test_fresh_value_is_not_refreshed(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, str(tmp_path), "slow")
+    counter = tmp_path / "runs"
+    cockpit_cache.write_entry(path, "cached", time.time())
+
+    output, _ = run_get(tmp_path, tmp_path, "slow", slow_command("new", 0, counter), "--ttl", "60")
+    assert output == "cached\n"
+    time.sleep(0.5)
+    assert not counter.exists()
+
+
+def test_one_refresh_at_a_time(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, str(tmp_path), "slow")
+    counter = tmp_path / "runs"
+    cockpit_cache.write_entry(path, "old", 0)
+
+    for _ in range(3):
+        output, _ = run_get(tmp_path, tmp_path, "slow", slow_command("new", 1, counter))
+        assert output == "old\n"
+    assert wait_for_value(path, "new")
+    assert counter.read_text() == "run\n"
+
+
+def test_failed_and_timed_out_refresh(tmp_path):
+    path = cockpit_cache.get_entry_path(tmp_path, "/repo", "slow")
+
+    # A timeout keeps the previous value, a failure leaves nothing to show
+    cockpit_cache.write_entry(path, "old", 0)
+    cockpit_cache.refresh(path, slow_command("new", seconds=5), timeout=0.2, max_entries=10)
+    assert cockpit_cache.read_entry(path) == (0, "old")
+
+    cockpit_cache.refresh(path, ["sh", "-c", "echo partial; exit 1"], timeout=5, max_entries=10)
+    assert cockpit_cache.read_entry(path)[1] == ""
+    assert not os.path.exists(f"{path}.lock")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = [cockpit_cache.get_entry_path(tmp_path, f"/repo{index}", "git") for index in range(4)]
+    for index, path in enumerate(paths):
+        cockpit_cache.write_entry(path, str(index), time.time())
+        os.utime(path, (index, index))
+
+    # Reading an entry makes it the most recently used one
+    assert cockpit_cache.get(tmp_path, "git", ["true"], 60, 0, 5, 10, cwd="/repo0") == "0"
+    cockpit_cache.evict(tmp_path, 2)
+
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in (paths[0], paths[3]))
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+from helpers import BASE_DIR, TOOLS_DIR, read_config
+
+sys.path.insert(0, TOOLS_DIR)
+
+import cockpit_lint  # noqa: E402
+
+
+def write_config(path, config):
+    with open(path, "w") as file:
+        file.write(config)
+    return str(path)
+
+
+def get_problems(path, cache_path):
+    return cockpit_lint.check_model(cockpit_lint.load_model(path, cache_path))
+
+
+def test_config_has_no_problems(tmp_path):
+    config_path = os.path.join(BASE_DIR, "starship.toml")
+    assert get_problems(config_path, tmp_path / "lint.json") == []
+
+
+def test_get_style_colors():
+    assert cockpit_lint.get_style_colors("bold fg:color_ok bg:#282828") == ["color_ok", "#282828"]
+    assert cockpit_lint.get_style_colors("$style bold") == []
+    assert cockpit_lint.get_style_colors("") == []
+
+
+def test_unknown_color_reference(tmp_path):
+    config = read_config().replace('style = "fg:color_git"', 'style = "fg:color_gti"', 1)
+    path = write_config(tmp_path / "starship.toml", config)
+
+    problems = get_problems(path, tmp_path / "lint.json")
+    assert problems == [
+        "git_branch.style: color 'color_gti' is not defined in palettes: default, gruvbox_dark, gruvbox_light"
+    ]
+
+
+def test_color_missing_from_one_palette(tmp_path):
+    config = read_config().replace(
+        "color_vimcmd_visual = '#d79921'\n\n[palettes.gruvbox_light]", "[palettes.gruvbox_light]"
+    )
+    path = write_config(tmp_path / "starship.toml", config)
+
+    problems = get_problems(path, tmp_path / "lint.json")
+    assert problems == [
+        "character.vimcmd_visual_symbol: color 'color_vimcmd_visual' is not defined in palettes: gruvbox_dark"
+    ]
+
+
+def test_unknown_palette_and_custom_module(tmp_path):
+    config = read_config().replace("palette = 'default'", "palette = 'solarized'", 1)
+    config = config.replace("${custom.battery}", "${custom.batery}", 1)
+    path = write_config(tmp_path / "starship.toml", config)
+
+    problems = get_problems(path, tmp_path / "lint.json")
+    assert "palette: 'solarized' is not defined in [palettes]" in problems
+    assert "format: ${custom.batery} has no [custom.batery] section" in problems
+
+
+def test_load_model_cache(tmp_path, monkeypatch):
+    path = write_config(tmp_path / "starship.toml", read_config())
+    cache_path = tmp_path / "lint.json"
+    model = cockpit_lint.load_model(path, cache_path)
+
+    def fail(config):
+        raise AssertionError("config was compiled again")
+
+    monkeypatch.setattr(cockpit_lint, "compile_config", fail)
+
+    # Unchanged file, and a touched file with the same content, reuse the cached model
+    assert cockpit_lint.load_model(path, cache_path) == model
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cockpit_lint.load_model(path, cache_path) == model
+
+    write_config(path, read_config().replace("palette = 'default'", "palette = 'gruvbox_dark'", 1))
+    with pytest.raises(AssertionError, match="compiled again"):
+        cockpit_lint.load_model(path, cache_path)
@@ -0,0 +1,193 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pytest
+
+from fixtures import fake_xkb, sampler_dir
+from helpers import TOOLS_DIR, get_custom_module_env, run_custom_module_command
+
+sys.path.insert(0, TOOLS_DIR)
+
+import cockpit_sampler  # noqa: E402
+
+
+def get_dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def test_format_kib():
+    assert cockpit_sampler.format_kib(512) == "512KiB"
+    assert cockpit_sampler.format_kib(1536) == "2MiB"
+    assert cockpit_sampler.format_kib(8 * 1024 * 1024) == "8GiB"
+    assert cockpit_sampler.format_kib(16 * 1024 * 1024 - 1) == "16GiB"
+
+
+def test_get_sampler_dir():
+    assert cockpit_sampler.get_sampler_dir({"STARSHIP_COCKPIT_SAMPLER_DIR": "/custom"}) == "/custom"
+    assert cockpit_sampler.get_sampler_dir({"XDG_RUNTIME_DIR": "/run/user/1000", "USER": "test"}) == (
+        "/run/user/1000/starship-cockpit-test"
+    )
+    assert cockpit_sampler.get_sampler_dir({}) == "/tmp/starship-cockpit-cockpit"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="/proc/meminfo is Linux only")
+def test_sample_memory_usage_matches_custom_command():
+    env = get_custom_module_env("memory_usage")
+    env["STARSHIP_COCKPIT_SAMPLER_DIR"] = "/nonexistent"
+
+    value = cockpit_sampler.sample_memory_usage()
+    result = run_custom_module_command("memory_usage", env)
+
+    assert re.fullmatch(r"\d+[KMGT]iB/\d+[KMGT]iB", value)
+    assert result.stdout.strip().split("/")[1] == value.split("/")[1]
+
+
+def test_check_sampler_dir(sampler_dir, tmp_path):
+    assert cockpit_sampler.check_sampler_dir(sampler_dir) is None
+
+    link = tmp_path / "link"
+    link.symlink_to(sampler_dir)
+    assert cockpit_sampler.check_sampler_dir(str(link)) == f"{link} is not a directory"
+
+    os.chmod(sampler_dir, 0o755)
+    assert cockpit_sampler.check_sampler_dir(sampler_dir).startswith(f"{sampler_dir} is accessible by other users")
+
+
+def test_run_refuses_shared_dir(sampler_dir):
+    os.chmod(sampler_dir, 0o777)
+    result = subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIR, "cockpit_sampler.py"), "--dir", sampler_dir, "--only", "battery"],
+        capture_output=True,
+        text=True,
+        timeout=10,
+    )
+
+    assert result.returncode == 1
+    assert "is accessible by other users" in result.stderr
+    assert os.listdir(sampler_dir) == []
+
+
+def test_publish(sampler_dir):
+    cockpit_sampler.publish(sampler_dir, "memory_usage", "8GiB/16GiB", 42)
+    cockpit_sampler.publish(sampler_dir, "battery", None, 42)
+
+    assert open(os.path.join(sampler_dir, "memory_usage")).read() == "42 8GiB/16GiB\n"
+    assert open(os.path.join(sampler_dir, "battery")).read() == "42\n"
+
+    cockpit_sampler.unpublish(sampler_dir, ["memory_usage", "battery"])
+
+    assert os.listdir(sampler_dir) == []
+
+
+def test_custom_commands_read_published_values(sampler_dir):
+    pid = os.getpid()
+    cockpit_sampler.publish(sampler_dir, "memory_usage", "8GiB/16GiB", pid)
+    cockpit_sampler.publish(sampler_dir, "battery", "15 \U000f0083 15%%", pid)
+
+    env = {"STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir, "STARSHIP_COCKPIT_BATTERY_THRESHOLD": "20"}
+    env.update(get_custom_module_env("memory_usage"))
+    env.update(get_custom_module_env("battery"))
+
+    assert run_custom_module_command("memory_usage", env).stdout == "8GiB/16GiB\n"
+    assert run_custom_module_command("battery", env).stdout == "\U000f0083 15%\n"
+
+    # Above the threshold
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "10"
+    assert run_custom_module_command("battery", env).stdout == ""
+
+    # Nothing to show
+    cockpit_sampler.publish(sampler_dir, "battery", None, pid)
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "100"
+    assert run_custom_module_command("battery", env).stdout == ""
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="/proc/meminfo is Linux only")
+def test_custom_commands_ignore_stale_values(sampler_dir):
+    cockpit_sampler.publish(sampler_dir, "memory_usage", "stale", get_dead_pid())
+
+    env = {"STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir}
+    env.update(get_custom_module_env("memory_usage"))
+    result = run_custom_module_command("memory_usage", env)
+
+    assert re.fullmatch(r"\d+[KMGT]iB/\d+[KMGT]iB\n", result.stdout)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="/proc/meminfo is Linux only")
+def test_custom_commands_ignore_untrusted_dir(sampler_dir, tmp_path):
+    cockpit_sampler.publish(sampler_dir, "memory_usage", "fake", os.getpid())
+    link = tmp_path / "link"
+    link.symlink_to(sampler_dir)
+
+    env = {"STARSHIP_COCKPIT_SAMPLER_DIR": str(link)}
+    env.update(get_custom_module_env("memory_usage"))
+    result = run_custom_module_command("memory_usage", env)
+
+    assert re.fullmatch(r"\d+[KMGT]iB/\d+[KMGT]iB\n", result.stdout)
+
+
+def test_run_publishes_until_stopped(sampler_dir):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(TOOLS_DIR, "cockpit_sampler.py"), "--dir", sampler_dir, "--only", "battery"],
+    )
+    try:
+        path = os.path.join(sampler_dir, "battery")
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        assert open(path).read().split()[0] == str(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+    assert not os.path.exists(os.path.join(sampler_dir, "battery"))
+
+
+def test_read_xkb_layout(fake_xkb, monkeypatch):
+    monkeypatch.setenv("PATH", fake_xkb.env["PATH"])
+    fake_xkb.set_layouts("ua", "us")
+
+    assert cockpit_sampler.read_xkb_layout() == "ua"
+
+
+def test_read_console_layout(tmp_path):
+    vconsole = tmp_path / "vconsole.conf"
+    keyboard = tmp_path / "keyboard"
+    keyboard.write_text('XKBMODEL="pc105"\nXKBLAYOUT="de,us"\n')
+
+    assert cockpit_sampler.read_console_layout([str(vconsole), str(keyboard)]) == "de"
+
+    vconsole.write_text("KEYMAP=fr\nFONT=eurlatgr\n")
+
+    assert cockpit_sampler.read_console_layout([str(vconsole), str(keyboard)]) == "fr"
+
+
+def test_keyboard_layout_command_reads_published_value(sampler_dir):
+    cockpit_sampler.publish(sampler_dir, "keyboard_layout", "Ukrainian", os.getpid())
+
+    env = {"STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir, "STARSHIP_COCKPIT_KEYBOARD_LAYOUT_UKRAINIAN": "UKR"}
+    env.update(get_custom_module_env("keyboard_layout"))
+
+    assert run_custom_module_command("keyboard_layout", env).stdout == "UKR\n"
+
+    del env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_UKRAINIAN"]
+
+    assert run_custom_module_command("keyboard_layout", env).stdout == "Ukrainian\n"
+
+
+def test_keyboard_layout_command_rejects_planted_cache(sampler_dir, tmp_path):
+    cockpit_sampler.publish(sampler_dir, "keyboard_layout", "us", os.getpid())
+    marker = tmp_path / "pwned"
+    with open(os.path.join(sampler_dir, "keyboard_layout.cache"), "w") as file:
+        file.write(f'us A}}";touch${{IFS}}{marker};:"${{A -\n')
+
+    env = {"STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir}
+    env.update(get_custom_module_env("keyboard_layout"))
+
+    assert run_custom_module_command("keyboard_layout", env).stdout == "us\n"
+    assert not marker.exists()
@@ -0,0 +1,116 @@
+import os
+import subprocess
+from pathlib import Path
+
+from fixtures import git_repo_cache, git_repo_state, git_scenario
+
+
+def test_git_repo_states(git_repo_state):
+    expected_statuses = {
+        "clean": "",
+        "dirty": " M modified.txt\n?? new.txt\n",
+        "staged": "A  new.txt\n",
+        "deleted": " D deleted.txt\n",
+        "detached": "",
+        "rebasing": "AA main.txt\n",
+    }
+
+    for name, expected_status in expected_statuses.items():
+        repo = git_repo_state(name)
+        result = subprocess.run(["git", "status", "--porcelain"], cwd=repo, check=True, capture_output=True, text=True)
+
+        assert result.stdout == expected_status, f"state: {name}"
+
+    # The copy must not share work tree files with the cached state
+    repo = git_repo_state("clean")
+    (Path(repo) / "modified.txt").write_text("")
+
+    assert Path(git_repo_state("clean"), "modified.txt").read_text() == "test content\n"
+
+
+def git(repo, *args):
+    return subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True, text=True).stdout
+
+
+def make_base_scenario(git_scenario):
+    scenario = git_scenario()
+    scenario.write("test.txt", "test content\n").add("test.txt").commit("Initial commit")
+    scenario.write("deleted.txt", "test content\n").add("deleted.txt").commit("Add deleted.txt")
+    scenario.write("modified.txt", "test content\n").add("modified.txt").commit("Add modified.txt")
+    return scenario
+
+
+def test_git_scenario_status(git_scenario):
+    scenario = make_base_scenario(git_scenario).save()
+
+    assert git(scenario.path, "status", "--porcelain") == ""
+    assert git(scenario.path, "log", "--format=%s") == "Add modified.txt\nAdd deleted.txt\nInitial commit\n"
+
+    scenario.write("modified.txt", "modified content\n").write("new.txt", "new content\n").add("new.txt")
+    scenario.rm("deleted.txt").save()
+
+    assert git(scenario.path, "status", "--porcelain") == "D  deleted.txt\n M modified.txt\nA  new.txt\n"
+    assert git(scenario.path, "diff", "HEAD", "--numstat") == "0\t1\tdeleted.txt\n1\t1\tmodified.txt\n1\t0\tnew.txt\n"
+
+    git(scenario.path, "fsck", "--strict", "--no-dangling")
+
+
+def test_git_scenario_same_size_rewrite(git_scenario):
+    scenario = make_base_scenario(git_scenario)
+
+    # Rewritten after staging with the same size and an mtime older than the index, outside the racy-git window
+    path = Path(scenario.path, "modified.txt")
+    path.write_text("test CONTENT\n")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 5_000_000_000))
+    scenario.save()
+
+    assert git(scenario.path, "status", "--porcelain") == " M modified.txt\n"
+
+
+def test_git_scenario_ahead_behind(git_scenario):
+    scenario = make_base_scenario(git_scenario).track("origin", "HEAD~1")
+    scenario.remote_commit("Remote change", {"remote.txt": "remote content\n"}).save()
+
+    assert git(scenario.path, "rev-list", "--left-right", "--count", "HEAD...@{upstream}") == "1\t1\n"
+
+    git(scenario.path, "fsck", "--strict", "--no-dangling")
+
+
+def test_git_scenario_detached(git_scenario):
+    scenario = make_base_scenario(git_scenario).detach("HEAD~1").save()
+
+    assert git(scenario.path, "status", "--porcelain", "--branch") == "## HEAD (no branch)\n"
+    assert not Path(scenario.path, "modified.txt").exists()
+
+
+def test_git_scenario_rebase(git_scenario):
+    scenario = make_base_scenario(git_scenario).checkout("feature", create=True)
+    scenario.write("feature.txt", "feature content\n").add("feature.txt").commit("Add feature")
+    scenario.write("main.txt", "conflicting content\n").add("main.txt").commit("Create conflict")
+    scenario.checkout("main")
+    scenario.write("main.txt", "main content\n").add("main.txt").commit("Add main file")
+    scenario.checkout("feature").rebase("main").save()
+
+    git_dir = Path(scenario.path, ".git")
+    assert git(scenario.path, "status", "--porcelain") == "AA main.txt\n"
+    assert (git_dir / "rebase-merge" / "msgnum").read_text() == "2\n"
+    assert (git_dir / "rebase-merge" / "end").read_text() == "2\n"
+    assert git(scenario.path, "log", "--format=%s", "HEAD") == (
+        "Add feature\nAdd main file\nAdd modified.txt\nAdd deleted.txt\nInitial commit\n"
+    )
+
+    # The state must be one git itself can continue from
+    git(scenario.path, "rebase", "--abort")
+
+    assert git(scenario.path, "status", "--porcelain", "--branch") == "## feature\n"
+
+
+def test_git_scenario_large_repo(git_scenario):
+    scenario = git_scenario().generate(5000).commit("Add files").save()
+
+    assert len(list(Path(scenario.path, ".git", "objects", "pack").glob("*.pack"))) == 1
+    assert git(scenario.path, "status", "--porcelain") == ""
+    assert int(git(scenario.path, "ls-files", "--", "files").count("\n")) == 5000
+
+    git(scenario.path, "fsck", "--strict", "--no-dangling")
@@ -0,0 +1,228 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from helpers import ASSETS_DIR, BASE_DIR, run_custom_module_command
+
+# The screenshot pipeline needs the asset generation packages, see assets/postprocess.py
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+sys.path.insert(0, ASSETS_DIR)
+
+import generate  # noqa: E402
+from scenes import Screenshot, compile_scene  # noqa: E402
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    monkeypatch.chdir(BASE_DIR)
+    # Palette overlays go to tmp_path rather than the user's cache
+    monkeypatch.setattr(generate, "CONFIG_OVERLAY_DIR", str(tmp_path / "configs"))
+    generate.write_config_overlay.cache_clear()
+    session = generate.Session("test-fake", "fake")
+    yield session
+    session.close()
+    generate.write_config_overlay.cache_clear()
+
+
+def test_sessions_are_isolated(session):
+    other = generate.Session("test-fake", "fake")
+    try:
+        # Concurrent runs of a scene get their own directories, shown as ~ in the prompt
+        assert other.dir != session.dir
+        assert session.env["HOME"] == session.dir == session.terminal.cwd
+        log = subprocess.run(
+            ["git", "log", "--format=%s"], cwd=session.env["COCKPIT_DEMO_REPO"], capture_output=True, text=True
+        )
+        assert log.stdout == "Add starship.toml\nAdd README.md\n"
+    finally:
+        other.close()
+    assert not os.path.exists(other.dir)
+
+
+def test_command_list_is_one_batch(session):
+    actions = compile_scene(
+        "test",
+        [
+            {"type": "open"},
+            {"type": "command", "commands": ["cd ~", "export A=1"], "command_delay": 2},
+            {"type": "clear"},
+            {"type": "screenshot", "path": "assets/images/test.png"},
+            {"type": "close"},
+        ],
+    )
+    generate.process_actions(session, *actions[5:6])
+
+    assert session.terminal.calls == [("write_many", ["cd ~", "export A=1", "clear"])]
+
+
+def test_scene_actions(session, tmp_path):
+    actions = compile_scene(
+        "test",
+        [
+            {"type": "open", "colors": "Tokyo-Night", "palette": "gruvbox_dark", "height": 105},
+            {"type": "clear"},
+            {"type": "screenshot", "path": "assets/images/test.png"},
+            {"type": "close"},
+        ],
+    )
+    filepath = str(tmp_path / "scene.png")
+    actions[-2].filepath = filepath
+    generate.process_actions(session, *actions)
+    for future in session.pending:
+        future.result()
+
+    overlay = generate.get_config_overlay("gruvbox_dark")
+    assert os.path.dirname(overlay) == str(tmp_path / "configs")
+    assert session.terminal.calls == [
+        ("open",),
+        ("set_color_scheme", "Tokyo-Night"),
+        ("write", f"export STARSHIP_CONFIG={overlay}"),
+        ("write_many", [r"echo -e '\033]0;Starship Cockpit Demo\007'"]),
+        ("resize", generate.WINDOW_WIDTH, 105),
+        ("write_many", ["clear"]),
+        ("capture",),
+        ("close",),
+    ]
+    assert os.path.exists(filepath)
+
+
+def test_interrupted_scene_stops(session, monkeypatch):
+    monkeypatch.setattr(generate, "interrupted", generate.threading.Event())
+    generate.interrupted.set()
+
+    generate.process_actions(session, *generate.get_scenes()["demo"])
+
+    assert session.terminal.calls == []
+
+
+def test_config_overlay_is_private(monkeypatch, tmp_path):
+    monkeypatch.chdir(BASE_DIR)
+    monkeypatch.setattr(generate, "CONFIG_OVERLAY_DIR", str(tmp_path / "configs"))
+    generate.write_config_overlay.cache_clear()
+
+    path = generate.write_config_overlay("palette = 'test'\n")
+    assert os.stat(generate.CONFIG_OVERLAY_DIR).st_mode & 0o777 == 0o700
+
+    # A changed overlay is written again instead of being trusted
+    with open(path, "w") as file:
+        file.write("format = 'planted'\n")
+    generate.write_config_overlay.cache_clear()
+    assert generate.write_config_overlay("palette = 'test'\n") == path
+    with open(path) as file:
+        assert file.read() == "palette = 'test'\n"
+
+    os.chmod(generate.CONFIG_OVERLAY_DIR, 0o777)
+    generate.write_config_overlay.cache_clear()
+    with pytest.raises(RuntimeError, match="not a directory private to this user"):
+        generate.write_config_overlay("palette = 'other'\n")
+    generate.write_config_overlay.cache_clear()
+
+
+def test_pin_config():
+    with open(os.path.join(BASE_DIR, "starship.toml")) as file:
+        config = generate.pin_config(file.read())
+
+    assert "[time]\ndisabled = true\n" in config
+    assert "[os]\ndisabled = true\n" in config
+    with pytest.raises(ValueError, match=r"\[time\]"):
+        generate.pin_config("[time]\nformat = '$time'\n")
+
+
+@pytest.mark.parametrize(
+    "module, env, expected",
+    [
+        ("memory_usage", {}, "8GiB/16GiB"),
+        ("battery", {"STARSHIP_COCKPIT_BATTERY_THRESHOLD": "100"}, "\U000f0083 73%"),
+        ("keyboard_layout", {"STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ABC": "ENG"}, "ENG"),
+    ],
+)
+def test_pinned_samples(tmp_path, module, env, expected):
+    generate.pin_samples(str(tmp_path))
+
+    env = {**env, f"STARSHIP_COCKPIT_{module.upper()}_ENABLED": "true", "STARSHIP_COCKPIT_SAMPLER_DIR": str(tmp_path)}
+    assert run_custom_module_command(module, env).stdout.strip() == expected
+
+
+@pytest.fixture
+def run_scenes(monkeypatch, tmp_path):
+    # Runs scenes with the fake backend against a manifest in tmp_path, returns the names that were rendered
+    monkeypatch.chdir(BASE_DIR)
+    monkeypatch.setattr(generate, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(generate, "CONFIG_OVERLAY_DIR", str(tmp_path / "configs"))
+    # Put back afterwards, a test may switch to another config
+    monkeypatch.setattr(generate, "STARSHIP_CONFIG", generate.STARSHIP_CONFIG)
+    generate.write_config_overlay.cache_clear()
+    rendered = []
+    run_scene = generate.run_scene
+
+    def record_scene(name, actions, backend, env=None):
+        rendered.append(name)
+        run_scene(name, actions, backend, env)
+
+    monkeypatch.setattr(generate, "run_scene", record_scene)
+
+    def run(plans, force=False):
+        rendered.clear()
+        generate.run_scenes(plans, "fake", 1, force)
+        return list(rendered)
+
+    yield run
+    generate.read_starship_config.cache_clear()
+    generate.get_scenes.cache_clear()
+    generate.write_config_overlay.cache_clear()
+
+
+def make_scene(path, height=105):
+    actions = compile_scene(
+        "test",
+        [
+            {"type": "open", "height": height},
+            {"type": "screenshot", "path": "assets/images/test.png"},
+            {"type": "close"},
+        ],
+    )
+    for action in actions:
+        if isinstance(action, Screenshot):
+            action.filepath = str(path)
+    return actions
+
+
+def test_unchanged_scene_is_skipped(run_scenes, tmp_path):
+    plans = {"test": make_scene(tmp_path / "test.png")}
+
+    assert run_scenes(plans) == ["test"]
+    assert run_scenes(plans) == []
+    # --force renders it anyway
+    assert run_scenes(plans, force=True) == ["test"]
+
+
+def test_changed_config_renders_again(run_scenes, tmp_path):
+    plans = {"test": make_scene(tmp_path / "test.png")}
+    run_scenes(plans)
+
+    config_path = tmp_path / "starship.toml"
+    config_path.write_text(generate.read_starship_config().replace("command_timeout = 2000", "command_timeout = 1000"))
+    generate.use_starship_config(str(config_path))
+
+    assert run_scenes(plans) == ["test"]
+    assert run_scenes(plans) == []
+
+
+def test_changed_scene_renders_again(run_scenes, tmp_path):
+    run_scenes({"test": make_scene(tmp_path / "test.png")})
+
+    assert run_scenes({"test": make_scene(tmp_path / "test.png", height=200)}) == ["test"]
+
+
+def test_missing_output_renders_again(run_scenes, tmp_path):
+    plans = {"test": make_scene(tmp_path / "test.png")}
+    run_scenes(plans)
+
+    os.remove(tmp_path / "test.png")
+
+    assert run_scenes(plans) == ["test"]
+    assert os.path.exists(tmp_path / "test.png")
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from helpers import ASSETS_DIR
+
+# The headless driver needs the asset generation packages, see assets/postprocess.py
+pytest.importorskip("pyte")
+pytest.importorskip("PIL")
+
+sys.path.insert(0, ASSETS_DIR)
+
+from headless import HeadlessTerminal  # noqa: E402
+
+# Stand-in for `starship init bash`, the driver appends its sentinel to whatever PS1 this sets
+FAKE_STARSHIP = """#!/bin/sh
+[ "$1" = "init" ] && echo "PS1='cockpit ❯ '"
+"""
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="bash is not installed")
+def test_headless_terminal_runs_command(tmp_path):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "starship").write_text(FAKE_STARSHIP)
+    (bin_dir / "starship").chmod(0o755)
+    env = {"PATH": str(bin_dir) + os.pathsep + os.environ.get("PATH", ""), "HOME": str(tmp_path)}
+    terminal = HeadlessTerminal(600, 300, env=env, cwd=str(tmp_path))
+
+    terminal.open()
+    try:
+        # Ready once the OSC 777 sentinel of the first prompt came through
+        assert terminal.wait_until_ready(10)
+        assert terminal.first_prompt is not None
+
+        terminal.write("echo headless-$((6 * 7))")
+        assert terminal.wait_until_ready(10)
+
+        lines = [line.rstrip() for line in terminal.screen.display]
+        assert lines[:3] == ["cockpit ❯ echo headless-$((6 * 7))", "headless-42", "cockpit ❯"]
+        assert terminal.last_prompt == terminal.first_prompt + 1
+        assert terminal.capture().size == (600, 300)
+    finally:
+        terminal.close()
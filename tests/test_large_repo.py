@@ -0,0 +1,123 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from fixtures import git_repo_cache, git_repo_state, spawn_counter
+from helpers import BASE_DIR, get_large_repo_config, load_config, read_config
+
+CONFIG_PATH = os.path.join(BASE_DIR, "starship.toml")
+
+
+@pytest.fixture
+def dirty_repo(git_repo_state):
+    return git_repo_state("dirty")
+
+
+@pytest.fixture
+def large_repo_config(spawn_counter, tmp_path):
+    # Config large_repo.sh picks for a directory, with its variants cached under tmp_path
+    def run(cwd, config_path=CONFIG_PATH, **env):
+        env = {**spawn_counter.env, "XDG_CACHE_HOME": str(tmp_path / "cache"), **env}
+        return get_large_repo_config(config_path, env, cwd=cwd)
+
+    return run
+
+
+def test_git_metrics_builtin():
+    config = load_config()
+
+    # The normal path is the builtin module, large-repo mode lives in the shell snippets
+    assert "$git_metrics" in config["format"]
+    assert config["git_metrics"]["disabled"] is False
+    assert config["git_metrics"]["added_style"] == "fg:color_git_added"
+    assert config["git_metrics"]["deleted_style"] == "fg:color_git_deleted"
+
+
+def test_small_repo(dirty_repo, large_repo_config, spawn_counter):
+    assert large_repo_config(dirty_repo) == CONFIG_PATH
+    # Only the index header is read, git is not started
+    assert spawn_counter.get_counts().get("od") == 1
+    assert spawn_counter.get_counts().get("git", 0) == 0
+
+
+def test_outside_repo(large_repo_config, spawn_counter, tmp_path):
+    assert large_repo_config(tmp_path) == CONFIG_PATH
+    assert spawn_counter.get_counts().get("od", 0) == 0
+
+
+def test_large_repo_mode(dirty_repo, large_repo_config, spawn_counter):
+    variant = large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO="true")
+
+    assert variant != CONFIG_PATH
+    assert spawn_counter.get_counts().get("git", 0) == spawn_counter.get_counts().get("od", 0) == 0
+    # Only [git_metrics] is turned off
+    variant_config = load_config(variant)
+    config = load_config()
+    assert variant_config["git_metrics"].pop("disabled") is True
+    assert config["git_metrics"].pop("disabled") is False
+    assert variant_config == config
+
+
+def test_forced_on(dirty_repo, large_repo_config, spawn_counter):
+    result = large_repo_config(
+        dirty_repo, STARSHIP_COCKPIT_LARGE_REPO="false", STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="0"
+    )
+
+    assert result == CONFIG_PATH
+    assert spawn_counter.get_counts().get("od", 0) == 0
+
+
+def test_above_threshold(dirty_repo, large_repo_config, spawn_counter):
+    # The repo tracks 3 files
+    assert large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="3") == CONFIG_PATH
+
+    spawn_counter.reset()
+    assert large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="2") != CONFIG_PATH
+    # Only the core.fsmonitor lookup, no git diff
+    assert spawn_counter.get_counts().get("git", 0) == 1
+
+
+def test_in_worktree(dirty_repo, large_repo_config, tmp_path):
+    worktree = tmp_path / "worktree"
+    subprocess.run(["git", "worktree", "add", "-q", "--detach", str(worktree)], cwd=dirty_repo, check=True)
+    (worktree / "sub").mkdir()
+
+    # Worktrees point to their git directory from a .git file, which has its own index
+    assert large_repo_config(worktree / "sub", STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="3") == CONFIG_PATH
+    assert large_repo_config(worktree / "sub", STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="2") != CONFIG_PATH
+
+
+@pytest.mark.parametrize("value, large", [("true", False), ("false", True), ("/usr/bin/watchman", False)])
+def test_above_threshold_with_fsmonitor(dirty_repo, large_repo_config, value, large):
+    subprocess.run(["git", "config", "core.fsmonitor", value], cwd=dirty_repo, check=True)
+
+    assert (large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="2") != CONFIG_PATH) == large
+
+
+def test_fsmonitor_from_global_config(dirty_repo, large_repo_config):
+    # core.fsmonitor can come from any git config, not only the one of the repository
+    env = {"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "core.fsmonitor", "GIT_CONFIG_VALUE_0": "true"}
+    assert large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="2", **env) == CONFIG_PATH
+
+
+def test_variant_follows_config(dirty_repo, large_repo_config, tmp_path):
+    config_path = str(tmp_path / "starship.toml")
+    shutil.copy(CONFIG_PATH, config_path)
+    os.utime(config_path, (1_000_000_000, 1_000_000_000))
+
+    variant = large_repo_config(dirty_repo, config_path, STARSHIP_COCKPIT_LARGE_REPO="true")
+    mtime = os.stat(variant).st_mtime_ns
+    # Reused while the config is unchanged
+    assert large_repo_config(dirty_repo, config_path, STARSHIP_COCKPIT_LARGE_REPO="true") == variant
+    assert os.stat(variant).st_mtime_ns == mtime
+
+    with open(config_path, "w") as file:
+        file.write(read_config().replace("command_timeout = 2000", "command_timeout = 1000"))
+    assert large_repo_config(dirty_repo, config_path, STARSHIP_COCKPIT_LARGE_REPO="true") == variant
+    assert load_config(variant)["command_timeout"] == 1000
+    assert load_config(variant)["git_metrics"]["disabled"] is True
+
+    # Each config has its own variant
+    assert large_repo_config(dirty_repo, STARSHIP_COCKPIT_LARGE_REPO="true") != variant
@@ -1,9 +1,23 @@
 import os
 import re
 import subprocess
+import sys
 from pathlib import Path
 
-from fixtures import git_repo, prompt_helper
+import pytest
+
+from fixtures import (
+    fake_power_supply,
+    fake_xkb,
+    git_repo,
+    git_repo_cache,
+    git_repo_template,
+    git_scenario,
+    prompt_helper,
+    sampler_dir,
+    spawn_counter,
+)
+from helpers import run_custom_module_command
 
 
 def test_prompt(prompt_helper, git_repo):
@@ -48,6 +62,18 @@ def test_prompt_part_shell(prompt_helper, git_repo):
     assert shell_part == " bash"
 
 
+def test_prompt_render_many(prompt_helper, git_repo):
+    shells = ["bash", "zsh", "fish", "pwsh"] * 4
+    requests = [{"env": {"STARSHIP_SHELL": shell}} for shell in shells]
+
+    results = prompt_helper.render_many(requests)
+
+    assert len(results) == len(shells)
+    for shell, result in zip(shells, results):
+        assert result.returncode == 0
+        assert prompt_helper.get_prompt_part(result, "shell") == f" {shell}"
+
+
 def test_prompt_part_memory_usage(prompt_helper, git_repo):
     env = {}
 
@@ -72,6 +98,204 @@ def test_prompt_part_memory_usage(prompt_helper, git_repo):
     assert memory_usage_part == "󰓅 8GiB/16GiB"
 
 
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="/proc/meminfo is Linux only")
+def test_prompt_part_memory_usage_spawns(prompt_helper, spawn_counter):
+    env = dict(spawn_counter.env)
+    env["STARSHIP_COCKPIT_MEMORY_USAGE_ENABLED"] = "true"
+
+    result = prompt_helper.run_starship_prompt_command(env)
+    memory_usage_part = prompt_helper.get_prompt_part(result, "memory_usage")
+    counts = spawn_counter.get_counts()
+
+    # The segment is computed in the custom command's shell, without a nested starship process
+    assert re.fullmatch(r"\S \d+[KMGT]iB/\d+[KMGT]iB", memory_usage_part), f"part: {memory_usage_part}"
+    assert counts.get("starship") == 1
+
+
+def test_prompt_part_battery(prompt_helper, git_repo):
+    env = {}
+
+    # Disabled by default
+    env["STARSHIP_COCKPIT_BATTERY_ENABLED"] = ""
+    result = prompt_helper.run_starship_prompt_command(env)
+    battery_part = prompt_helper.get_prompt_part(result, "battery")
+    assert battery_part is None
+
+    # Enabled, but the charge is above the threshold
+    env["STARSHIP_COCKPIT_BATTERY_ENABLED"] = "true"
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "-1"
+    result = prompt_helper.run_starship_prompt_command(env)
+    battery_part = prompt_helper.get_prompt_part(result, "battery")
+    assert battery_part is None
+
+    # Enabled with the highest threshold, shown whenever the machine has a battery
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "100"
+    result = prompt_helper.run_starship_prompt_command(env)
+    battery_part = prompt_helper.get_prompt_part(result, "battery")
+    if battery_part is not None:
+        battery_part = prompt_helper.clean_color_codes(battery_part)
+        assert re.fullmatch(r"\S \d{1,3}%", battery_part), f"part: {battery_part}"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="sysfs battery check is Linux only")
+def test_prompt_part_battery_spawns(prompt_helper, spawn_counter):
+    env = dict(spawn_counter.env)
+    env["STARSHIP_COCKPIT_BATTERY_ENABLED"] = "true"
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "-1"
+
+    result = prompt_helper.run_starship_prompt_command(env)
+    counts = spawn_counter.get_counts()
+
+    # The threshold is checked without rendering the battery module in a nested starship process
+    assert result.returncode == 0
+    assert counts.get("starship") == 1
+    assert counts.get("grep", 0) == counts.get("sed", 0) == 0
+
+
+def test_prompt_part_battery_shown_spawns(prompt_helper, spawn_counter, fake_power_supply):
+    env = {**spawn_counter.env, **fake_power_supply.env}
+    env["STARSHIP_COCKPIT_BATTERY_ENABLED"] = "true"
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "100"
+
+    result = prompt_helper.run_starship_prompt_command(env)
+    counts = spawn_counter.get_counts()
+
+    # Shown as well, the charge and its symbol are rendered from sysfs without a nested starship process
+    assert result.returncode == 0
+    battery_part = prompt_helper.get_prompt_part(result, "battery")
+    assert prompt_helper.clean_color_codes(battery_part) == "\U000f0083 42%"
+    assert counts.get("starship") == 1
+    assert counts.get("grep", 0) == counts.get("sed", 0) == counts.get("cat", 0) == 0
+
+
+@pytest.mark.parametrize(
+    "capacity, status, expected",
+    [
+        (42, "Discharging", "\U000f0083 42%"),
+        (42, "Charging", "\U000f0084 42%"),
+        (100, "Full", "\U000f0079 100%"),
+        (0, "Empty", "\U000f008e 0%"),
+        (80, "Not charging", "\U000f0091 80%"),
+    ],
+)
+def test_battery_from_sysfs(fake_power_supply, spawn_counter, sampler_dir, capacity, status, expected):
+    fake_power_supply.set_battery(capacity, status)
+    env = {**spawn_counter.env, **fake_power_supply.env, "STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir}
+    env["STARSHIP_COCKPIT_BATTERY_ENABLED"] = "true"
+
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = "100"
+    assert run_custom_module_command("battery", env).stdout == f"{expected}\n"
+    env["STARSHIP_COCKPIT_BATTERY_THRESHOLD"] = str(capacity - 1)
+    assert run_custom_module_command("battery", env).stdout == ""
+    # Only the shells of the two runs
+    assert spawn_counter.get_counts() == {"sh": 2}
+
+
+def test_prompt_part_keyboard_layout(prompt_helper, fake_xkb, sampler_dir):
+    env = dict(fake_xkb.env)
+    env["STARSHIP_COCKPIT_SAMPLER_DIR"] = sampler_dir
+
+    # Disabled by default
+    env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED"] = ""
+    result = prompt_helper.run_starship_prompt_command(env)
+    keyboard_layout_part = prompt_helper.get_prompt_part(result, "keyboard_layout")
+    assert keyboard_layout_part is None
+
+    # Enabled, without alias
+    env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED"] = "true"
+    result = prompt_helper.run_starship_prompt_command(env)
+    keyboard_layout_part = prompt_helper.get_prompt_part(result, "keyboard_layout")
+    assert keyboard_layout_part == "󰌌 us"
+
+    # Enabled, with alias. The X11 layout is cached for a few seconds, start over as if they had passed.
+    fake_xkb.set_layouts("ua", "us")
+    os.remove(os.path.join(sampler_dir, "keyboard_layout.cache"))
+    env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_UA"] = "UKR"
+    result = prompt_helper.run_starship_prompt_command(env)
+    keyboard_layout_part = prompt_helper.get_prompt_part(result, "keyboard_layout")
+    assert keyboard_layout_part == "󰌌 UKR"
+
+
+def test_prompt_part_keyboard_layout_spawns(prompt_helper, fake_xkb, sampler_dir, spawn_counter):
+    env = dict(fake_xkb.env)
+    env["PATH"] = fake_xkb.bin_dir + os.pathsep + spawn_counter.env["PATH"]
+    env["STARSHIP_COCKPIT_SAMPLER_DIR"] = sampler_dir
+    env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED"] = "true"
+    env["STARSHIP_COCKPIT_KEYBOARD_LAYOUT_US"] = "ENG"
+
+    result = prompt_helper.run_starship_prompt_command(env)
+    assert prompt_helper.get_prompt_part(result, "keyboard_layout") == "󰌌 ENG"
+    assert spawn_counter.get_counts().get("tr") == 1
+
+    # The alias key is cached while the layout does not change
+    spawn_counter.reset()
+    result = prompt_helper.run_starship_prompt_command(env)
+    counts = spawn_counter.get_counts()
+
+    assert prompt_helper.get_prompt_part(result, "keyboard_layout") == "󰌌 ENG"
+    assert counts.get("starship") == 1
+    assert counts.get("tr", 0) == counts.get("cut", 0) == counts.get("printenv", 0) == 0
+
+
+def test_keyboard_layout_x11_is_cached(fake_xkb, sampler_dir):
+    env = {
+        **fake_xkb.env,
+        "STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir,
+        "STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED": "true",
+    }
+    cache_path = os.path.join(sampler_dir, "keyboard_layout.cache")
+    assert run_custom_module_command("keyboard_layout", env).stdout == "us\n"
+
+    # setxkbmap is not asked again for a few seconds
+    fake_xkb.set_layouts("de")
+    assert run_custom_module_command("keyboard_layout", env).stdout == "us\n"
+
+    # Nor is the value of another display used
+    env["DISPLAY"] = ":98"
+    assert run_custom_module_command("keyboard_layout", env).stdout == "de\n"
+
+    # A value queried longer ago is refreshed
+    fake_xkb.set_layouts("fr")
+    with open(cache_path) as file:
+        layout_id, key, source = file.read().split()
+    assert source.startswith("x11@") and source.endswith("@:98")
+    with open(cache_path, "w") as file:
+        file.write(f"{layout_id} {key} x11@0@:98\n")
+    assert run_custom_module_command("keyboard_layout", env).stdout == "fr\n"
+
+
+def test_keyboard_layout_macos_is_cached(sampler_dir, tmp_path):
+    plist = tmp_path / "Library" / "Preferences" / "com.apple.HIToolbox.plist"
+    plist.parent.mkdir(parents=True)
+    plist.write_text("")
+    os.utime(plist, (1_000_000_000, 1_000_000_000))
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    defaults_log = tmp_path / "defaults.log"
+    (bin_dir / "defaults").write_text(f'#!/bin/sh\necho "$*" >> "{defaults_log}"\necho com.apple.keylayout.ABC\n')
+    (bin_dir / "defaults").chmod(0o755)
+    env = {
+        "HOME": str(tmp_path),
+        "PATH": str(bin_dir) + os.pathsep + os.environ["PATH"],
+        "STARSHIP_COCKPIT_SAMPLER_DIR": sampler_dir,
+        "STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ENABLED": "true",
+        "STARSHIP_COCKPIT_KEYBOARD_LAYOUT_ABC": "ENG",
+    }
+
+    assert run_custom_module_command("keyboard_layout", env).stdout == "ENG\n"
+    assert len(defaults_log.read_text().splitlines()) == 1
+
+    # Read from the cache while the plist is not written again
+    assert run_custom_module_command("keyboard_layout", env).stdout == "ENG\n"
+    assert len(defaults_log.read_text().splitlines()) == 1
+
+    # Written after the cache, when the input source changed
+    cache_mtime = os.stat(os.path.join(sampler_dir, "keyboard_layout.cache")).st_mtime
+    os.utime(plist, (cache_mtime + 1, cache_mtime + 1))
+    assert run_custom_module_command("keyboard_layout", env).stdout == "ENG\n"
+    assert len(defaults_log.read_text().splitlines()) == 2
+
+
 def test_prompt_part_time(prompt_helper, git_repo):
     env = {}
 
@@ -200,3 +424,67 @@ def test_prompt_part_git(prompt_helper, git_repo):
 
     # Clean up the rebase (abort it)
     subprocess.run(["git", "rebase", "--abort"], cwd=git_repo, check=True, capture_output=True)
+
+
+def make_git_scenario(git_scenario):
+    scenario = git_scenario()
+    scenario.write("test.txt", "test content\n").add("test.txt").commit("Initial commit")
+    scenario.write("deleted.txt", "test content\n").add("deleted.txt").commit("Add deleted.txt")
+    scenario.write("modified.txt", "test content\n").add("modified.txt").commit("Add modified.txt")
+    return scenario
+
+
+def test_prompt_part_git_ahead_behind(prompt_helper, git_scenario):
+    env = {}
+
+    # Ahead
+    scenario = make_git_scenario(git_scenario).track("origin", "HEAD~1").save()
+    result = prompt_helper.run_starship_prompt_command(env=env, cwd=scenario.path)
+    git_part = prompt_helper.get_prompt_part(result, "git")
+    git_part = prompt_helper.clean_color_codes(git_part)
+
+    assert git_part == " main ⇡1"
+
+    # Diverged
+    scenario.remote_commit("Remote change", {"remote.txt": "remote content\n"}).save()
+    result = prompt_helper.run_starship_prompt_command(env=env, cwd=scenario.path)
+    git_part = prompt_helper.get_prompt_part(result, "git")
+    git_part = prompt_helper.clean_color_codes(git_part)
+
+    assert git_part == " main ⇡1⇣1"
+
+    # Behind
+    scenario.track("origin", "HEAD").remote_commit("Remote change", {"remote.txt": "remote content\n"}).save()
+    result = prompt_helper.run_starship_prompt_command(env=env, cwd=scenario.path)
+    git_part = prompt_helper.get_prompt_part(result, "git")
+    git_part = prompt_helper.clean_color_codes(git_part)
+
+    assert git_part == " main ⇣1"
+
+
+def test_prompt_part_git_detached(prompt_helper, git_scenario):
+    env = {}
+
+    scenario = make_git_scenario(git_scenario).detach("HEAD~1").save()
+    result = prompt_helper.run_starship_prompt_command(env=env, cwd=scenario.path)
+    git_part = prompt_helper.get_prompt_part(result, "git")
+    git_part = prompt_helper.clean_color_codes(git_part)
+
+    assert git_part == "@" + scenario.head[:7]
+
+
+def test_prompt_part_git_rebasing(prompt_helper, git_scenario):
+    env = {}
+
+    scenario = make_git_scenario(git_scenario).checkout("feature", create=True)
+    scenario.write("feature.txt", "feature content\n").add("feature.txt").commit("Add feature")
+    scenario.write("main.txt", "conflicting content\n").add("main.txt").commit("Create conflict")
+    scenario.checkout("main")
+    scenario.write("main.txt", "main content\n").add("main.txt").commit("Add main file")
+    scenario.checkout("feature").rebase("main").save()
+
+    result = prompt_helper.run_starship_prompt_command(env=env, cwd=scenario.path)
+    git_part = prompt_helper.get_prompt_part(result, "git")
+    git_part = prompt_helper.clean_color_codes(git_part)
+
+    assert git_part == f"@{scenario.head[:7]} =1 +4 REBASING 2/2"
@@ -0,0 +1,62 @@
+import sys
+
+import pytest
+
+from helpers import ASSETS_DIR
+
+# The screenshot pipeline needs the asset generation packages, see assets/postprocess.py
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+sys.path.insert(0, ASSETS_DIR)
+
+import postprocess  # noqa: E402
+from PIL import Image  # noqa: E402
+
+
+def make_screenshot(size=(120, 80)):
+    # A gradient with many more colors than the PNG palette
+    width, height = size
+    x, y = np.meshgrid(np.arange(width), np.arange(height))
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=2).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def test_corner_mask_is_cached():
+    postprocess.get_corner_mask.cache_clear()
+
+    mask = postprocess.get_corner_mask((120, 80))
+
+    assert postprocess.get_corner_mask((120, 80)) is mask
+    assert postprocess.get_corner_mask((120, 81)) is not mask
+    assert postprocess.get_corner_mask.cache_info().hits == 1
+
+
+def test_round_corners():
+    image = postprocess.round_corners(make_screenshot())
+    alpha = np.asarray(image.getchannel("A"))
+
+    assert image.mode == "RGBA"
+    # Transparent corners, anti-aliased on the way to the opaque window body
+    for y, x in ((0, 0), (0, -1), (-1, 0), (-1, -1)):
+        assert alpha[y, x] == 0
+    assert 0 < alpha[2, 3] < 255
+    assert (alpha[postprocess.CORNER_RADIUS : -postprocess.CORNER_RADIUS, :] == 255).all()
+    assert (alpha[:, postprocess.CORNER_RADIUS : -postprocess.CORNER_RADIUS] == 255).all()
+
+
+def test_processed_screenshot(tmp_path):
+    path = str(tmp_path / "screenshot.png")
+
+    assert postprocess.submit_screenshot(make_screenshot(), path).result() == path
+
+    with Image.open(path) as image:
+        assert image.format == "PNG"
+        assert image.mode == "P"
+        assert len(image.getpalette("RGBA")) // 4 <= postprocess.PNG_COLORS
+        assert len(image.getcolors(maxcolors=1024)) <= postprocess.PNG_COLORS
+        pixels = np.asarray(image.convert("RGBA"))
+    assert pixels.shape == (80, 120, 4)
+    # The corners stay transparent through quantization, the window body is opaque again
+    assert pixels[0, 0, 3] == pixels[-1, -1, 3] == 0
+    assert (pixels[postprocess.CORNER_RADIUS : -postprocess.CORNER_RADIUS, :, 3] == 255).all()
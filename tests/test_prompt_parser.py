@@ -0,0 +1,92 @@
+import re
+
+import pytest
+
+from helpers import COLOR_CODE_PATTERN
+from prompt_parser import parse_prompt
+
+GIT_STYLE = "\x1b[38;2;104;157;106m"
+SHELL_STYLE = "\x1b[1m"
+TIME_STYLE = "\x1b[33m"
+RESET = "\x1b[0m"
+
+GIT = f"{GIT_STYLE}\uf418 main{RESET}"
+SHELL = f"{SHELL_STYLE}\uebca bash{RESET}"
+TIME = f"{TIME_STYLE}\U000f051b 12:00{RESET}"
+
+
+def wrap(code, shell):
+    return {"bash": f"\\[{code}\\]", "zsh": f"%{{{code}%}}", "pwsh": code}[shell]
+
+
+def make_prompt(shell):
+    # The same prompt as each shell prints it, with its zero-width wrappers around the escape codes
+    segments = [
+        f"{wrap(GIT_STYLE, shell)}\uf418 main{wrap(RESET, shell)}",
+        f"{wrap(SHELL_STYLE, shell)}\uebca bash{wrap(RESET, shell)}",
+        f"{wrap(TIME_STYLE, shell)}\U000f051b 12:00{wrap(RESET, shell)}",
+    ]
+    return "\n" + "  ".join(segments) + "\n❯ "
+
+
+PROMPTS = {shell: make_prompt(shell) for shell in ("bash", "zsh", "pwsh")}
+
+
+def legacy_parts(output):
+    # The string-split processing the parser replaced
+    output = output.strip()
+    for wrapper in ("\\[", "\\]", "%{", "%}"):
+        output = output.replace(wrapper, "")
+    lines = [line.strip() for line in output.split("\n")]
+    return lines, lines[0].split("  ")
+
+
+@pytest.mark.parametrize("shell", PROMPTS)
+def test_parse_prompt_segments(shell):
+    prompt = parse_prompt(PROMPTS[shell])
+
+    assert [line.raw for line in prompt.lines] == [f"{GIT}  {SHELL}  {TIME}", "❯"]
+    assert [segment.module for segment in prompt.lines[0].segments] == ["main", "shell", "time"]
+    assert prompt.get_segment("shell").text == "\uebca bash"
+    assert prompt.get_segment("time").raw == TIME
+    assert prompt.get_segment("battery") is None
+
+
+def test_parse_prompt_spans():
+    segment = parse_prompt(PROMPTS["pwsh"]).lines[0].segments[0]
+
+    assert segment.text == "\uf418 main"
+    assert [(span.start, span.end, span.style) for span in segment.spans] == [(0, 6, "38;2;104;157;106")]
+
+    segment = parse_prompt("\x1b[1m\x1b[31mbold red\x1b[0m plain").lines[0].segments[0]
+    assert [(span.start, span.end, span.style) for span in segment.spans] == [(0, 8, "1;31"), (8, 14, "")]
+
+
+@pytest.mark.parametrize(
+    "output",
+    [
+        *PROMPTS.values(),
+        "",
+        "   ",
+        "a   b",
+        "a    b",
+        "  a  b  ",
+        "a \x1b[0m  b",
+        "a  \x1b[0m",
+        "a \\[\\] b",
+        "\x1b[0m  a\n\n  b  c\n\n",
+    ],
+)
+def test_parse_prompt_matches_legacy_split(output):
+    lines, parts = legacy_parts(output)
+    prompt = parse_prompt(output)
+
+    segments = prompt.lines[0].segments if prompt.lines else []
+    assert ([line.raw for line in prompt.lines] or [""]) == lines
+    assert ([segment.raw for segment in segments] if prompt.lines else [""]) == parts
+    for segment in segments:
+        assert segment.text == re.sub(COLOR_CODE_PATTERN, "", segment.raw)
+
+
+def test_parse_prompt_is_memoized():
+    assert parse_prompt(PROMPTS["bash"]) is parse_prompt(PROMPTS["bash"])
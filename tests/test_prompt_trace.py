@@ -0,0 +1,75 @@
+import json
+import subprocess
+
+import pytest
+
+from helpers import PromptTrace, StarshipPromptHelper
+
+PROMPT = "\x1b[1m\uf418 main\x1b[0m  \x1b[33m\U000f051b 12:00\x1b[0m\n❯ "
+
+
+def make_result(returncode=0, stderr=""):
+    result = subprocess.CompletedProcess(["starship", "prompt"], returncode, PROMPT, stderr)
+    result.duration_ms = 12.5
+    return result
+
+
+def read_records(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def fail():
+    raise AssertionError("record was built")
+
+
+def test_trace_disabled_without_path(tmp_path):
+    trace = PromptTrace(level="all")
+
+    assert not trace.enabled
+    trace.add(make_result(returncode=1), fail)
+    trace.flush()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize(
+    "level, result, expected",
+    [
+        ("error", make_result(), False),
+        ("error", make_result(returncode=1), True),
+        ("error", make_result(stderr="[WARN] timed out"), True),
+        ("all", make_result(), True),
+    ],
+)
+def test_trace_level(tmp_path, level, result, expected):
+    trace = PromptTrace(tmp_path / "trace.jsonl", level)
+    assert trace.wants(result) == expected
+
+
+def test_trace_writes_in_batches(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    trace = PromptTrace(path, "all", batch_size=2)
+
+    trace.add(make_result(), lambda: {"n": 1})
+    trace.add(make_result(), lambda: {"n": 2})
+    trace.add(make_result(), lambda: {"n": 3})
+    assert read_records(path) == [{"n": 1}, {"n": 2}]
+
+    trace.flush()
+    assert read_records(path) == [{"n": 1}, {"n": 2}, {"n": 3}]
+
+
+def test_trace_record(tmp_path):
+    helper = StarshipPromptHelper(workers=1)
+    base_env = {"PATH": "/usr/bin", "STARSHIP_SHELL": "zsh"}
+    request = {"env": {"STARSHIP_COCKPIT_BATTERY_ENABLED": "true"}, "cwd": str(tmp_path)}
+
+    record = helper.get_trace_record(base_env, request, make_result(returncode=1, stderr="boom"))
+
+    assert record["command"] == ["starship", "prompt"]
+    assert record["env"] == {"PWD": str(tmp_path), "STARSHIP_COCKPIT_BATTERY_ENABLED": "true"}
+    assert record["duration_ms"] == 12.5
+    assert record["returncode"] == 1
+    assert record["stderr"] == "boom"
+    assert record["segments"] == [[["main", "\uf418 main"], ["time", "\U000f051b 12:00"]], [[None, "❯"]]]
+    json.dumps(record)
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+from helpers import ASSETS_DIR, BASE_DIR
+
+# The regression check needs the asset generation packages, see assets/postprocess.py
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+sys.path.insert(0, ASSETS_DIR)
+
+import generate  # noqa: E402
+import regression  # noqa: E402
+from PIL import Image  # noqa: E402
+from scenes import Screenshot, compile_scene  # noqa: E402
+
+
+@pytest.fixture
+def scene(tmp_path, monkeypatch):
+    # One screenshot of the fake backend, which captures a black window, as a scene of assets/images under tmp_path
+    monkeypatch.chdir(BASE_DIR)
+    monkeypatch.setattr(regression, "IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(generate, "CONFIG_OVERLAY_DIR", str(tmp_path / "configs"))
+    generate.write_config_overlay.cache_clear()
+    actions = compile_scene(
+        "test", [{"type": "open"}, {"type": "screenshot", "path": "assets/images/test.png"}, {"type": "close"}]
+    )
+    for action in actions:
+        if isinstance(action, Screenshot):
+            action.filepath = str(tmp_path / "images" / "test.png")
+    yield actions
+    generate.write_config_overlay.cache_clear()
+
+
+def test_check_scene(scene, tmp_path):
+    output_dir = str(tmp_path / "output")
+    expected_path = str(tmp_path / "images" / "test.png")
+    os.makedirs(os.path.dirname(expected_path))
+    generate.run_scene("test", scene, "fake")
+
+    # Rendered again the same way, nothing changed
+    results = regression.check_scene("test", scene, output_dir, regression.THRESHOLD, 0, {}, backend="fake")
+    assert results == [{"expected": expected_path, "status": "ok", "changed_pixels": 0, "changed_ratio": 0.0}]
+
+    # A changed image is reported with a diff that marks where
+    with Image.open(expected_path) as image:
+        image = image.convert("RGBA")
+    image.paste((255, 255, 255, 255), (100, 100, 110, 110))
+    image.save(expected_path)
+    results = regression.check_scene("test", scene, output_dir, regression.THRESHOLD, 0, {}, backend="fake")
+    assert [result["status"] for result in results] == ["changed"]
+    assert results[0]["changed_pixels"] == 100
+    assert results[0]["diff"] == os.path.join(output_dir, "diff", "test.png")
+    with Image.open(results[0]["diff"]) as diff:
+        assert diff.getpixel((105, 105)) == tuple(regression.DIFF_COLOR)
+
+    os.remove(expected_path)
+    results = regression.check_scene("test", scene, output_dir, regression.THRESHOLD, 0, {}, backend="fake")
+    assert [result["status"] for result in results] == ["missing"]
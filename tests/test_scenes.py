@@ -0,0 +1,126 @@
+import os
+import sys
+
+import pytest
+
+from helpers import ASSETS_DIR, BASE_DIR
+
+sys.path.insert(0, ASSETS_DIR)
+
+import scenes  # noqa: E402
+from scenes import Clear, CommandList, Resize, SceneError, Screenshot, compile_scene  # noqa: E402
+
+OPEN = {"type": "open"}
+SCREENSHOT = {"type": "screenshot", "path": "assets/images/test.png"}
+CLOSE = {"type": "close"}
+
+
+def get_problems(steps, palettes=("default",)):
+    with pytest.raises(SceneError) as error:
+        compile_scene("test", steps, set(palettes))
+    return error.value.problems
+
+
+def test_scene_file_compiles():
+    plans = scenes.load_scenes(os.path.join(ASSETS_DIR, "scenes.toml"), os.path.join(BASE_DIR, "starship.toml"))
+
+    assert list(plans) == [
+        "demo",
+        "palette_default",
+        "palette_gruvbox_dark",
+        "palette_gruvbox_light",
+        "memory_usage",
+        "battery",
+        "keyboard_layout",
+    ]
+    for actions in plans.values():
+        assert all(not isinstance(action, Clear) for action in actions)
+        assert sum(isinstance(action, Screenshot) for action in actions) == 1
+
+
+def test_actions_have_slots():
+    action = CommandList(["clear"], [0.5])
+    with pytest.raises(AttributeError):
+        action.command = "clear"
+
+
+def test_check_steps():
+    problems = get_problems(
+        [
+            {"type": "opne"},
+            {"type": "command"},
+            {"type": "command", "commands": "ls", "delay": 1},
+            {"type": "palette", "palette": "solarized"},
+            {"type": "screenshot", "path": "../demo.png"},
+            {"type": "resize", "width": 870, "height": 100, "delay_after": -1},
+        ]
+    )
+
+    assert problems == [
+        "test, step 1: unknown type 'opne', expected one of: "
+        "open, colors, palette, resize, command, clear, screenshot, close",
+        "test, step 2: command needs 'commands'",
+        "test, step 3: unknown field 'delay' for command",
+        "test, step 3: commands = 'ls' is not valid for command",
+        "test, step 4: palette 'solarized' is not defined in starship.toml",
+        "test, step 5: path '../demo.png' must be a .png file under assets/images",
+        "test, step 6: delays can not be negative",
+        "test: the first step must be open",
+        "test: the last step, and only that one, must be close",
+    ]
+
+
+def test_merge_commands():
+    actions = compile_scene(
+        "test",
+        [
+            OPEN,
+            {"type": "command", "commands": ["a", "b"], "command_delay": 1, "delay_after": 2},
+            {"type": "clear"},
+            {"type": "command", "commands": ["c"], "delay_before": 3},
+            SCREENSHOT,
+            CLOSE,
+        ],
+    )
+
+    commands = actions[5]
+    assert commands.commands == ["a", "b", "clear", "c"]
+    assert commands.timeouts == [1, 1 + 2, 0.5 + 3, 0.5]
+    assert commands.delay_after == 0.5
+    assert isinstance(actions[6], Screenshot)
+
+
+def test_drop_redundant_clear_and_resize():
+    actions = compile_scene(
+        "test",
+        [
+            OPEN,
+            {"type": "resize", "width": 870, "height": 200},
+            {"type": "clear"},
+            {"type": "resize", "width": 870, "height": 300},
+            {"type": "clear"},
+            SCREENSHOT,
+            {"type": "resize", "width": 870, "height": 460},
+            {"type": "clear"},
+            CLOSE,
+        ],
+    )
+
+    # The resize of the open step is replaced by the later ones, and nothing after the screenshot is captured
+    assert [action.describe() for action in actions[4:]] == [
+        "resize width=870 height=300",
+        "command clear",
+        "screenshot filepath='assets/images/test.png'",
+        "close",
+    ]
+    assert sum(isinstance(action, Resize) for action in actions) == 1
+
+
+def test_format_plan():
+    plans = {"a": compile_scene("a", [OPEN, SCREENSHOT, CLOSE]), "b": compile_scene("b", [OPEN, SCREENSHOT, CLOSE])}
+
+    plan = scenes.format_plan(plans, workers=2)
+
+    assert "a: 7 actions, up to 9.5s" in plan
+    assert plan.endswith("2 scenes, up to 9.5s with 2 worker(s)")
+    assert scenes.estimate_duration(plans, 1) == 19
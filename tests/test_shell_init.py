@@ -0,0 +1,167 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from helpers import BASE_DIR, load_config
+
+SHELL_DIR = os.path.join(BASE_DIR, "shell")
+
+# shell: command that sources the snippet and prints the prompt it set up
+SNIPPETS = {
+    "bash": ["bash", "--noprofile", "--norc", "-c", f'source {SHELL_DIR}/cockpit.bash; echo "$PS1"'],
+    "zsh": ["zsh", "--no-rcs", "-c", f'source {SHELL_DIR}/cockpit.zsh; echo "$PROMPT"'],
+}
+
+# shell: command that sources the snippet, changes to the directory in $1 and prints the config the prompt uses there
+LARGE_REPO_SNIPPETS = {
+    "bash": [
+        "bash",
+        "--noprofile",
+        "--norc",
+        "-c",
+        f'source {SHELL_DIR}/cockpit.bash; cd "$1"; $starship_precmd_user_func; echo "$STARSHIP_CONFIG"',
+        "bash",
+    ],
+    "zsh": ["zsh", "--no-rcs", "-c", f"source {SHELL_DIR}/cockpit.zsh; cd $1; echo $STARSHIP_CONFIG", "zsh"],
+}
+
+
+class FakeStarship:
+    """Fake `starship init` and `python3` on PATH, logging every call."""
+
+    def __init__(self, root):
+        self.bin_dir = os.path.join(root, "bin")
+        self.log_path = os.path.join(root, "calls.log")
+        os.makedirs(self.bin_dir)
+        self.write_command("starship", "echo \"PROMPT='cockpit'; PS1='cockpit'\"")
+        self.write_command("python3", ":")
+        self.env = {
+            "PATH": self.bin_dir + os.pathsep + os.environ.get("PATH", ""),
+            "HOME": root,
+            "XDG_CACHE_HOME": os.path.join(root, "cache"),
+            "STARSHIP_COCKPIT_SAMPLER_DIR": os.path.join(root, "sampler"),
+        }
+
+    def write_command(self, name, body):
+        path = os.path.join(self.bin_dir, name)
+        with open(path, "w") as file:
+            file.write(f'#!/bin/sh\necho "{name} $*" >> "{self.log_path}"\n{body}\n')
+        os.chmod(path, 0o755)
+
+    def read_log(self):
+        try:
+            with open(self.log_path) as file:
+                return file.read()
+        except FileNotFoundError:
+            return ""
+
+    def get_calls(self, wait=0):
+        # The sampler is started in the background, give it `wait` seconds to show up
+        deadline = time.monotonic() + wait
+        while not self.read_log().endswith("\n") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        calls = self.read_log().splitlines()
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        return calls
+
+
+def source_snippet(shell, fake_starship, **env):
+    result = subprocess.run(SNIPPETS[shell], env={**fake_starship.env, **env}, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+@pytest.fixture(params=sorted(SNIPPETS))
+def shell(request):
+    if not shutil.which(request.param):
+        pytest.skip(f"{request.param} is not installed")
+    return request.param
+
+
+@pytest.fixture
+def fake_starship(tmp_path):
+    return FakeStarship(str(tmp_path))
+
+
+def test_init_is_cached(shell, fake_starship):
+    assert source_snippet(shell, fake_starship) == "cockpit"
+    assert fake_starship.get_calls() == [f"starship init {shell} --print-full-init"]
+
+    # Later shells start without running starship
+    assert source_snippet(shell, fake_starship) == "cockpit"
+    assert fake_starship.get_calls() == []
+
+    # A changed starship binary regenerates the cache, an older build as well as a newer one
+    starship_path = os.path.join(fake_starship.bin_dir, "starship")
+    for offset in (60, -120):
+        stat = os.stat(starship_path)
+        os.utime(starship_path, (stat.st_atime + offset, stat.st_mtime + offset))
+        assert source_snippet(shell, fake_starship) == "cockpit"
+        assert fake_starship.get_calls() == [f"starship init {shell} --print-full-init"]
+        assert source_snippet(shell, fake_starship) == "cockpit"
+        assert fake_starship.get_calls() == []
+
+    # So does another starship binary on PATH, whatever its mtime
+    other_bin_dir = os.path.join(os.path.dirname(fake_starship.bin_dir), "other-bin")
+    os.makedirs(other_bin_dir)
+    shutil.copy2(starship_path, other_bin_dir)
+    assert (
+        source_snippet(shell, fake_starship, PATH=other_bin_dir + os.pathsep + fake_starship.env["PATH"]) == "cockpit"
+    )
+    assert fake_starship.get_calls() == [f"starship init {shell} --print-full-init"]
+
+
+def test_sampler_is_started_once(shell, fake_starship):
+    sampler_dir = fake_starship.env["STARSHIP_COCKPIT_SAMPLER_DIR"]
+    source_snippet(shell, fake_starship)
+    fake_starship.get_calls()
+
+    # Off by default
+    source_snippet(shell, fake_starship)
+    assert fake_starship.get_calls(wait=0.5) == []
+
+    source_snippet(shell, fake_starship, STARSHIP_COCKPIT_SAMPLER_ENABLED="true")
+    calls = fake_starship.get_calls(wait=5)
+    assert len(calls) == 1 and calls[0].endswith("tools/cockpit_sampler.py")
+
+    # Not again while a sampler publishes its values
+    os.makedirs(sampler_dir)
+    with open(os.path.join(sampler_dir, "memory_usage"), "w") as file:
+        file.write(f"{os.getpid()} 8GiB/16GiB\n")
+    source_snippet(shell, fake_starship, STARSHIP_COCKPIT_SAMPLER_ENABLED="true")
+    assert fake_starship.get_calls(wait=0.5) == []
+
+    # Pid files in a directory that is not this user's own are not trusted
+    link = os.path.join(os.path.dirname(sampler_dir), "link")
+    os.symlink(sampler_dir, link)
+    source_snippet(shell, fake_starship, STARSHIP_COCKPIT_SAMPLER_ENABLED="true", STARSHIP_COCKPIT_SAMPLER_DIR=link)
+    assert len(fake_starship.get_calls(wait=5)) == 1
+
+
+def test_large_repo_config(shell, fake_starship, tmp_path):
+    config_path = str(tmp_path / "starship.toml")
+    shutil.copy(os.path.join(BASE_DIR, "starship.toml"), config_path)
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    (repo / "README.md").write_text("# Repo\n")
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    subprocess.run(["git", "add", "README.md"], cwd=repo, check=True)
+
+    def get_config(**env):
+        command = LARGE_REPO_SNIPPETS[shell] + [str(repo)]
+        env = {**fake_starship.env, "STARSHIP_CONFIG": config_path, **env}
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        return result.stdout.strip()
+
+    assert get_config() == config_path
+    assert get_config(STARSHIP_COCKPIT_LARGE_REPO="false", STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="0") == config_path
+
+    # The repo tracks one file, above the threshold the prompt uses a config without the git metrics
+    variant = get_config(STARSHIP_COCKPIT_LARGE_REPO_THRESHOLD="0")
+    assert variant.startswith(fake_starship.env["XDG_CACHE_HOME"])
+    assert load_config(variant)["git_metrics"]["disabled"] is True
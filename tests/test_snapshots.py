@@ -0,0 +1,165 @@
+import itertools
+import json
+import os
+import re
+import tempfile
+
+import pytest
+
+from fixtures import GIT_REPO_STATES, git_repo_cache, git_repo_state, prompt_helper
+from helpers import BASE_DIR, get_custom_module_env, get_custom_modules, get_palettes, read_config, write_palette_config
+
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "tests", "snapshots", "prompt_matrix.json")
+
+SNAPSHOT_SHELLS = ["bash", "zsh", "fish", "pwsh"]
+
+# Segments whose values depend on the machine are only checked for their shape, see normalize_prompt
+SNAPSHOT_TOGGLES = {
+    "none": {},
+    "memory_usage": get_custom_module_env("memory_usage"),
+}
+
+# Variables of the developer's shell that show or change segments, left out of the renders
+SCRUBBED_PREFIXES = ("STARSHIP_", "KUBE", "DOCKER", "VIRTUAL_ENV")
+SNAPSHOT_USER = "cockpit"
+
+TIME_PATTERN = r"\d{1,2}:\d{2}(?:\s*[AP]M)?"
+NUMBER_PATTERN = r"\d+(?:\.\d+)?"
+
+
+def get_render_env(home):
+    # The test process environment without what the developer's shell exports, and an empty home directory so no
+    # kube or docker config is found there
+    env = {key: value for key, value in os.environ.items() if not key.startswith(SCRUBBED_PREFIXES)}
+    env.update({"HOME": home, "USER": SNAPSHOT_USER, "LOGNAME": SNAPSHOT_USER})
+    return env
+
+
+def get_base_env():
+    # Every cockpit segment off unless a toggle turns it on
+    env = {}
+    for module in get_custom_modules(read_config()):
+        env.update(get_custom_module_env(module, enabled=False))
+    return env
+
+
+def normalize_segment(segment):
+    # Text with the SGR style of each span, so palette changes show up in the snapshot
+    return "".join(
+        f"<{span.style}>{segment.text[span.start:span.end]}" if span.style else segment.text[span.start : span.end]
+        for span in segment.spans
+    )
+
+
+def normalize_prompt(prompt, cwd):
+    lines = []
+    for line in prompt.lines:
+        segments = []
+        for segment in line.segments:
+            text = normalize_segment(segment)
+            if segment.module == "main":
+                # OS symbol and the temporary repo directory differ between machines
+                text = re.sub(r"^(<[^>]*>)?\S+", r"\1<os>", text)
+                text = text.replace(os.path.basename(cwd), "<repo>")
+                text = text.replace(SNAPSHOT_USER, "<user>")
+            elif segment.module == "time":
+                text = re.sub(TIME_PATTERN, "<time>", text)
+            elif segment.module == "memory_usage":
+                text = re.sub(NUMBER_PATTERN, "<n>", text)
+            segments.append(f"{segment.module or '-'}={text}")
+        lines.append(" | ".join(segments))
+    return "\n".join(lines)
+
+
+def get_request_key(request):
+    return (tuple(sorted(request["env"].items())), request["cwd"])
+
+
+def render_matrix(prompt_helper, combinations, render_env):
+    """Render every combination, each distinct (env, cwd) only once, and return {name: normalized prompt}."""
+    unique = {}
+    for request in combinations.values():
+        unique.setdefault(get_request_key(request), request)
+
+    requests = list(unique.values())
+    results = dict(zip(unique, prompt_helper.render_many(requests, render_env)))
+
+    rendered = {}
+    for name, request in combinations.items():
+        result = results[get_request_key(request)]
+        assert result.returncode == 0, f"{name}: {result.stderr}"
+        rendered[name] = normalize_prompt(prompt_helper.parse_prompt(result), request["cwd"])
+    return rendered
+
+
+def pack_snapshot(rendered):
+    # Most combinations render the same prompt, store each distinct prompt once
+    prompts = []
+    matrix = {}
+    for name in sorted(rendered):
+        if rendered[name] not in prompts:
+            prompts.append(rendered[name])
+        matrix[name] = prompts.index(rendered[name])
+    return {"prompts": prompts, "matrix": matrix}
+
+
+def unpack_snapshot(snapshot):
+    return {name: snapshot["prompts"][index] for name, index in snapshot["matrix"].items()}
+
+
+def test_render_env_is_scrubbed(monkeypatch):
+    for name in ("KUBECONFIG", "DOCKER_CONTEXT", "VIRTUAL_ENV", "STARSHIP_COCKPIT_BATTERY_ENABLED"):
+        monkeypatch.setenv(name, "developer")
+    monkeypatch.setenv("USER", "developer")
+
+    env = get_render_env("/snapshot/home")
+
+    assert "developer" not in env.values()
+    assert env["HOME"] == "/snapshot/home"
+    assert env["USER"] == env["LOGNAME"] == SNAPSHOT_USER
+
+
+def test_prompt_snapshot_matrix(prompt_helper, git_repo_state, request, tmp_path):
+    update = request.config.getoption("--update-snapshots")
+    if not update and not os.path.exists(SNAPSHOT_PATH):
+        # A missing golden file is a failure, a skip would let every prompt change through unnoticed
+        pytest.fail(f"{SNAPSHOT_PATH} does not exist, create it with `pytest tests --update-snapshots` and commit it")
+
+    config = read_config()
+    base_env = get_base_env()
+    states = {name: git_repo_state(name) for name in GIT_REPO_STATES}
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        palettes = {
+            palette: write_palette_config(config, palette, os.path.join(config_dir, f"{palette}.toml"))
+            for palette in get_palettes(config)
+        }
+
+        combinations = {}
+        for shell, palette, toggle, state in itertools.product(SNAPSHOT_SHELLS, palettes, SNAPSHOT_TOGGLES, states):
+            env = {**base_env, **SNAPSHOT_TOGGLES[toggle]}
+            env.update({"STARSHIP_SHELL": shell, "STARSHIP_CONFIG": palettes[palette]})
+            combinations[f"{shell}/{palette}/{toggle}/{state}"] = {"env": env, "cwd": states[state]}
+
+        home = tmp_path / "home"
+        home.mkdir()
+        rendered = render_matrix(prompt_helper, combinations, get_render_env(str(home)))
+
+    if update:
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        with open(SNAPSHOT_PATH, "w") as file:
+            json.dump(pack_snapshot(rendered), file, indent=1, ensure_ascii=False)
+            file.write("\n")
+        return
+
+    with open(SNAPSHOT_PATH) as file:
+        expected = unpack_snapshot(json.load(file))
+
+    mismatches = [name for name in sorted(rendered) if rendered[name] != expected.get(name)]
+    missing = sorted(set(expected) - set(rendered))
+    details = [f"{name}:\n  expected: {expected.get(name)!r}\n  actual:   {rendered[name]!r}" for name in mismatches]
+    assert not mismatches and not missing, (
+        f"{len(mismatches)} combinations differ from {SNAPSHOT_PATH} (run with --update-snapshots to accept):\n"
+        + "\n".join(details[:10])
+        + (f"\nno longer rendered: {', '.join(missing)}" if missing else "")
+    )
@@ -0,0 +1,71 @@
+import os
+import sys
+
+from helpers import BENCHMARKS_DIR, load_config, read_config
+
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import trim_prompt  # noqa: E402
+
+# Stand-in for `starship timings`, the rows the parser reads
+FAKE_STARSHIP = """#!/bin/sh
+cat <<'TIMINGS'
+ Here are the timings of modules in your prompt (>=1ms or output):
+ python     -  14ms  -  "\U0001f40d 3.12"
+ nodejs     -   3ms  -  ""
+ directory  -  <1ms  -  "~/src"
+TIMINGS
+"""
+
+
+def make_profile(**modules):
+    # module=(ms per directory, shown)
+    return {name: {"ms": dict(enumerate(ms)), "shown": shown} for name, (ms, shown) in modules.items()}
+
+
+def test_get_module_timings(tmp_path):
+    (tmp_path / "starship").write_text(FAKE_STARSHIP)
+    (tmp_path / "starship").chmod(0o755)
+    env = {**os.environ, "PATH": str(tmp_path) + os.pathsep + os.environ.get("PATH", "")}
+
+    assert trim_prompt.get_module_timings(env, str(tmp_path)) == {
+        "python": (14.0, "\U0001f40d 3.12"),
+        "nodejs": (3.0, ""),
+        "directory": (0.0, "~/src"),
+    }
+
+
+def test_removable_modules_by_cost():
+    profile = make_profile(
+        python=([0.5, 2.0], False),
+        nodejs=([9.0, 1.0], False),
+        rust=([0.0, 0.5], False),
+        golang=([30.0], True),
+        directory=([50.0], False),
+    )
+
+    # Hidden probing modules that cost at least min_ms, most expensive first. Shown ones and the rest of the
+    # format are kept whatever they cost.
+    assert trim_prompt.get_removable_modules(profile, "minimal", 1.0) == ["nodejs", "python"]
+    assert trim_prompt.get_removable_modules(profile, "minimal", 5.0) == ["nodejs"]
+    # The workload keeps its own modules
+    assert trim_prompt.get_removable_modules(profile, "node", 1.0) == ["python"]
+
+
+def test_removable_modules_not_reported():
+    # Modules missing from the timings were empty and took at most 1ms
+    removable = trim_prompt.get_removable_modules({}, "python", 0.0)
+
+    assert removable == [module for module in trim_prompt.PROBING_MODULES if module not in ("python", "package")]
+    assert trim_prompt.get_removable_modules({}, "python", 0.1) == []
+
+
+def test_trim_format(tmp_path):
+    config = load_config()
+    (tmp_path / "starship.toml").write_text(trim_prompt.trim_format(read_config(), ["nodejs", "kubernetes"]))
+
+    assert "$nodejs" in config["format"] and "$kubernetes" in config["format"]
+    trimmed_config = load_config(str(tmp_path / "starship.toml"))
+    assert trimmed_config["format"] == config["format"].replace("$nodejs", "").replace("$kubernetes", "")
+    # Only the format changes, the module sections stay
+    assert trimmed_config["nodejs"] == config["nodejs"]
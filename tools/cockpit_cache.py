@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""cockpit-cache: serve slow segments from a cache and refresh them in the background.
+
+A custom command wraps its slow part in `cockpit_cache.py get <module> -- <command>`. The value cached for the module
+in the current directory is printed right away and, once it is older than --ttl, the command runs again in a detached
+process that updates the cache for the next prompt. Without a cached value, get waits up to --wait seconds for the
+first result and prints nothing when it is not there yet, so the prompt never waits longer than that.
+
+Entries live under $XDG_CACHE_HOME/starship-cockpit, one file per directory and module holding "<fetched at>\\n<value>".
+Reads touch the file, and refreshes remove the least recently used entries once there are more than --max-entries.
+
+Usage:
+    python3 tools/cockpit_cache.py get kubernetes --ttl 30 -- starship module kubernetes
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import time
+
+CACHE_DIR_ENV = "STARSHIP_COCKPIT_CACHE_DIR"
+
+POLL_INTERVAL = 0.01
+
+DEFAULT_TTL = 10.0
+DEFAULT_WAIT = 0.1
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_ENTRIES = 256
+
+
+def get_cache_dir(env=os.environ):
+    if env.get(CACHE_DIR_ENV):
+        return env[CACHE_DIR_ENV]
+    cache_home = env.get("XDG_CACHE_HOME") or os.path.join(env.get("HOME") or "/tmp", ".cache")
+    return os.path.join(cache_home, "starship-cockpit")
+
+
+def get_entry_path(cache_dir, cwd, module):
+    digest = hashlib.sha256(f"{cwd}\0{module}".encode()).hexdigest()[:32]
+    name = re.sub(r"[^\w.-]", "_", module)
+    return os.path.join(cache_dir, f"{name}-{digest}")
+
+
+def read_entry(path):
+    """Return (fetched_at, value) of a cache entry, None if there is no usable entry."""
+    try:
+        with open(path) as file:
+            fetched_at, _, value = file.read().partition("\n")
+        return float(fetched_at), value
+    except (OSError, ValueError):
+        return None
+
+
+def write_entry(path, value, fetched_at):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(f"{fetched_at}\n{value}")
+    os.replace(temp_path, path)
+
+
+def evict(cache_dir, max_entries):
+    """Remove the least recently used entries above max_entries."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.endswith((".tmp", ".lock")):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+    entries.sort(reverse=True)
+    for _, path in entries[max_entries:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def acquire_lock(path, timeout):
+    # One refresh per entry at a time; a lock older than the refresh timeout was left behind by a crash
+    lock_path = f"{path}.lock"
+    try:
+        if time.time() - os.stat(lock_path).st_mtime > timeout:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+    except FileExistsError:
+        return False
+    return True
+
+
+def release_lock(path):
+    try:
+        os.remove(f"{path}.lock")
+    except OSError:
+        pass
+
+
+def run_command(command, timeout):
+    """Output of the command, empty when it failed and None when it timed out."""
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    except OSError:
+        return ""
+    return result.stdout.rstrip("\n") if result.returncode == 0 else ""
+
+
+def refresh(path, command, timeout, max_entries):
+    # A timed out command keeps the previous value, the next stale read tries again
+    try:
+        value = run_command(command, timeout)
+        if value is not None:
+            write_entry(path, value, time.time())
+            evict(os.path.dirname(path), max_entries)
+    finally:
+        release_lock(path)
+
+
+def start_refresh(path, command, timeout, max_entries):
+    """Refresh the entry in a detached process, unless a refresh of it is already running."""
+    if not acquire_lock(path, timeout):
+        return
+    args = ["refresh", path, "--timeout", str(timeout), "--max-entries", str(max_entries), "--", *command]
+    try:
+        # Detached and without the prompt's pipes, so starship does not wait for it
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), *args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        release_lock(path)
+
+
+def get(cache_dir, module, command, ttl, wait, timeout, max_entries, cwd=None):
+    """Return the cached value of the module in cwd, starting a refresh when it is missing or stale."""
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    path = get_entry_path(cache_dir, cwd or os.getcwd(), module)
+    entry = read_entry(path)
+    if entry is not None:
+        os.utime(path)
+        if time.time() - entry[0] >= ttl:
+            start_refresh(path, command, timeout, max_entries)
+        return entry[1]
+
+    start_refresh(path, command, timeout, max_entries)
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = read_entry(path)
+        if entry is not None:
+            return entry[1]
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cockpit-cache", description=__doc__.splitlines()[0].split(": ")[1])
+    commands = parser.add_subparsers(dest="action", required=True)
+
+    get_parser = commands.add_parser(
+        "get", usage="%(prog)s module [options] -- command", help="print the cached value, refresh it when stale"
+    )
+    get_parser.add_argument("module", help="name of the segment, part of the cache key with the current directory")
+    get_parser.add_argument("--dir", default=get_cache_dir(), help="where to keep the cache entries")
+    get_parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="seconds before a value is refreshed")
+    get_parser.add_argument("--wait", type=float, default=DEFAULT_WAIT, help="seconds to wait without a value")
+
+    refresh_parser = commands.add_parser(
+        "refresh", usage="%(prog)s path [options] -- command", help="run the command and cache its output"
+    )
+    refresh_parser.add_argument("path", help="cache entry to write")
+
+    for subparser in (get_parser, refresh_parser):
+        subparser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds the command may run")
+        subparser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES, help="entries to keep")
+
+    # Everything after -- is the command, whatever options it takes
+    argv = sys.argv[1:]
+    separator = argv.index("--") if "--" in argv else len(argv)
+    args = parser.parse_args(argv[:separator])
+    command = argv[separator + 1 :]
+    if not command:
+        parser.error("a command is required after --")
+
+    if args.action == "refresh":
+        refresh(args.path, command, args.timeout, args.max_entries)
+        return
+
+    value = get(args.dir, args.module, command, args.ttl, args.wait, args.timeout, args.max_entries)
+    if value:
+        print(value)
+
+
+if __name__ == "__main__":
+    main()
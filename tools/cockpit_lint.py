@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""cockpit-lint: check that every style in starship.toml resolves in every palette.
+
+Compiles the config once into a small model (palettes, format variables, custom modules and the color references of
+every style) and caches it next to the user's cache files, keyed by the config's mtime and content hash, so checking
+an unchanged config does not parse the TOML again.
+
+Usage:
+    python3 tools/cockpit_lint.py [starship.toml]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import tomllib
+except ModuleNotFoundError:
+    import tomli as tomllib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bumped when the model changes, so old cache files are recompiled
+MODEL_VERSION = 1
+
+STYLE_KEYWORDS = {"bold", "italic", "underline", "dimmed", "inverted", "blink", "hidden", "strikethrough", "none"}
+NAMED_COLORS = {"black", "red", "green", "blue", "yellow", "purple", "cyan", "white"}
+NAMED_COLORS |= {f"bright-{color}" for color in NAMED_COLORS}
+SPECIAL_COLORS = {"prev_fg", "prev_bg"}
+
+# Keys of custom modules that hold shell code rather than format strings
+CODE_KEYS = {"command", "when", "shell"}
+
+HEX_COLOR_PATTERN = re.compile(r"^#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})$")
+# Style of a text group in a format string: [text](style)
+FORMAT_STYLE_PATTERN = re.compile(r"\]\(([^()]*)\)")
+FORMAT_VARIABLE_PATTERN = re.compile(r"\$\{([\w.]+)\}|\$([\w]+)")
+
+
+def get_cache_path(config_path, env=os.environ):
+    cache_home = env.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    key = hashlib.sha256(os.path.abspath(config_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_home, "starship-cockpit", f"lint-{key}.json")
+
+
+def is_style_key(key):
+    return key == "style" or key.startswith("style_") or key.endswith("_style")
+
+
+def is_literal_color(color):
+    return color in NAMED_COLORS or color in SPECIAL_COLORS or HEX_COLOR_PATTERN.match(color) or color.isdigit()
+
+
+def get_style_colors(style):
+    # "bold fg:color_ok bg:#282828" -> ["color_ok", "#282828"]; $variables are filled in by starship at render time
+    colors = []
+    for token in style.split():
+        if token.startswith("$") or token.lower() in STYLE_KEYWORDS:
+            continue
+        colors.append(token.split(":", 1)[1] if token.startswith(("fg:", "bg:")) else token)
+    return [color for color in colors if color]
+
+
+def get_format_variables(format_string):
+    return [braced or plain for braced, plain in FORMAT_VARIABLE_PATTERN.findall(format_string)]
+
+
+def collect_styles(value, path, styles):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in CODE_KEYS:
+                continue
+            if isinstance(item, str) and is_style_key(key):
+                styles.append({"path": f"{path}.{key}", "style": item})
+            else:
+                collect_styles(item, f"{path}.{key}", styles)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            collect_styles(item, f"{path}[{index}]", styles)
+    elif isinstance(value, str):
+        for style in FORMAT_STYLE_PATTERN.findall(value):
+            styles.append({"path": path, "style": style})
+
+
+def compile_config(config):
+    """Index a parsed starship.toml into the parts the checks need."""
+    modules = {key: value for key, value in config.items() if isinstance(value, dict) and key != "palettes"}
+    custom_modules = sorted(modules.pop("custom", {}))
+
+    styles = []
+    for name, module in modules.items():
+        collect_styles(module, name, styles)
+    for name in custom_modules:
+        collect_styles(config["custom"][name], f"custom.{name}", styles)
+
+    color_references = {}
+    for style in styles:
+        for color in get_style_colors(style["style"]):
+            if not is_literal_color(color):
+                color_references.setdefault(color, []).append(style["path"])
+
+    return {
+        "version": MODEL_VERSION,
+        "palette": config.get("palette"),
+        "palettes": config.get("palettes", {}),
+        "format_variables": get_format_variables(config.get("format", "")),
+        "modules": sorted(modules),
+        "custom_modules": custom_modules,
+        "styles": styles,
+        "color_references": color_references,
+    }
+
+
+def load_model(config_path, cache_path=None):
+    """Compile the config, reusing the cached model while the file's mtime or content hash are unchanged."""
+    cache_path = cache_path or get_cache_path(config_path)
+    stat = os.stat(config_path)
+
+    cached = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            cached = None
+    if cached and cached["model"].get("version") != MODEL_VERSION:
+        cached = None
+    if cached and (cached["mtime_ns"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+        return cached["model"]
+
+    with open(config_path, "rb") as file:
+        content = file.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    if cached and cached["sha256"] == digest:
+        model = cached["model"]
+    else:
+        model = compile_config(tomllib.loads(content.decode()))
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest, "model": model}, file)
+    os.replace(temp_path, cache_path)
+    return model
+
+
+def check_model(model):
+    """Return the problems of a compiled config as "<where>: <what>" strings."""
+    problems = []
+    palettes = model["palettes"]
+
+    if model["palette"] and model["palette"] not in palettes:
+        problems.append(f"palette: '{model['palette']}' is not defined in [palettes]")
+
+    for color, paths in sorted(model["color_references"].items()):
+        missing = [name for name in palettes if color not in palettes[name]]
+        if not palettes:
+            missing = ["(no palettes)"]
+        if missing:
+            for path in paths:
+                problems.append(f"{path}: color '{color}' is not defined in palettes: {', '.join(missing)}")
+
+    for name, palette in palettes.items():
+        for key, color in palette.items():
+            if color and not is_literal_color(color):
+                problems.append(f"palettes.{name}.{key}: '{color}' is not a color")
+
+    for variable in model["format_variables"]:
+        if variable.startswith("custom.") and variable.split(".", 1)[1] not in model["custom_modules"]:
+            problems.append(f"format: ${{{variable}}} has no [{variable}] section")
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cockpit-lint", description=__doc__.splitlines()[0].split(": ")[1])
+    parser.add_argument("config", nargs="?", default=os.path.join(BASE_DIR, "starship.toml"), help="config to check")
+    parser.add_argument("--no-cache", action="store_true", help="always compile the config")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        with open(args.config, "rb") as file:
+            model = compile_config(tomllib.load(file))
+    else:
+        model = load_model(args.config)
+
+    problems = check_model(model)
+    for problem in problems:
+        print(f"{args.config}: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
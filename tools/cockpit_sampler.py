@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""cockpit-sampler: refresh the expensive cockpit segments in the background.
+
+Samples memory usage, battery and keyboard layout on its own schedule and publishes each value to a small file in
+the sampler directory. The `custom.*` commands in starship.toml read those files with a single shell `read` and fall
+back to computing the value themselves when the sampler is not running.
+
+Each file holds one line, "<sampler pid> <value>", so readers can check that the value is still maintained with
+`kill -0 <pid>` (a shell builtin) before using it.
+
+Usage:
+    python3 tools/cockpit_sampler.py &
+"""
+
+import argparse
+import os
+import platform
+import re
+import shutil
+import signal
+import stat
+import subprocess
+import sys
+import time
+
+SAMPLER_DIR_ENV = "STARSHIP_COCKPIT_SAMPLER_DIR"
+
+CONSOLE_KEYMAP_FILES = ["/etc/vconsole.conf", "/etc/default/keyboard"]
+
+# Same rounding and units as the memory_usage module
+MEMORY_UNITS = [(1 << 30, "TiB"), (1 << 20, "GiB"), (1 << 10, "MiB")]
+
+
+def get_sampler_dir(env=os.environ):
+    # Keep in sync with `sampler_dir` in the custom commands of starship.toml
+    if env.get(SAMPLER_DIR_ENV):
+        return env[SAMPLER_DIR_ENV]
+    runtime_dir = env.get("XDG_RUNTIME_DIR") or env.get("TMPDIR") or "/tmp"
+    return os.path.join(runtime_dir, f"starship-cockpit-{env.get('USER') or 'cockpit'}")
+
+
+def check_sampler_dir(sampler_dir):
+    """Return why the sampler directory can not be trusted, None if it is private to this user.
+
+    The default directory under /tmp can be created by any local user first, who could then fake the published values.
+    """
+    st = os.lstat(sampler_dir)
+    if not stat.S_ISDIR(st.st_mode):
+        return f"{sampler_dir} is not a directory"
+    if st.st_uid != os.getuid():
+        return f"{sampler_dir} is owned by another user"
+    if st.st_mode & 0o077:
+        return f"{sampler_dir} is accessible by other users, run: chmod 700 {sampler_dir}"
+    return None
+
+
+def format_kib(kib):
+    for size, unit in MEMORY_UNITS:
+        if kib >= size:
+            return f"{(kib + size // 2) // size}{unit}"
+    return f"{kib}KiB"
+
+
+def run_starship_module(name):
+    result = subprocess.run(["starship", "module", name], capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def sample_memory_usage():
+    if not os.path.exists("/proc/meminfo"):
+        for word in run_starship_module("memory_usage").split():
+            if "/" in word:
+                return re.match(r"[0-9A-Za-z./]*", word).group()
+        return None
+
+    meminfo = {}
+    with open("/proc/meminfo") as file:
+        for line in file:
+            key, value, *_ = line.split()
+            meminfo[key] = int(value)
+    total = meminfo["MemTotal:"]
+    return f"{format_kib(total - meminfo['MemAvailable:'])}/{format_kib(total)}"
+
+
+def sample_battery():
+    battery_info = run_starship_module("battery")
+    match = re.search(r"(\d+)%", battery_info)
+    if not match:
+        return None
+    return f"{match.group(1)} {battery_info}"
+
+
+def read_macos_layout():
+    result = subprocess.run(
+        [
+            "defaults",
+            "read",
+            os.path.expanduser("~/Library/Preferences/com.apple.HIToolbox.plist"),
+            "AppleCurrentKeyboardLayoutInputSourceID",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    input_source = result.stdout.strip().split(".")
+    return input_source[3] if len(input_source) > 3 else None
+
+
+def read_xkb_layout():
+    result = subprocess.run(["setxkbmap", "-query"], capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        name, _, value = line.partition(":")
+        if name.strip() == "layout":
+            return value.strip().split(",")[0] or None
+    return None
+
+
+def read_console_layout(files=CONSOLE_KEYMAP_FILES):
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        with open(path) as file:
+            for line in file:
+                name, _, value = line.strip().partition("=")
+                if name in ("KEYMAP", "XKBLAYOUT"):
+                    return value.strip('"').split(",")[0] or None
+        return None
+    return None
+
+
+def sample_keyboard_layout():
+    # Same backends and order as the keyboard_layout custom command
+    if platform.system() == "Darwin":
+        return read_macos_layout()
+    if os.environ.get("DISPLAY") and shutil.which("setxkbmap"):
+        return read_xkb_layout()
+    return read_console_layout()
+
+
+# name: (sampler, refresh interval in seconds)
+SAMPLERS = {
+    "memory_usage": (sample_memory_usage, 2.0),
+    "battery": (sample_battery, 30.0),
+    "keyboard_layout": (sample_keyboard_layout, 1.0),
+}
+
+
+def publish(sampler_dir, name, value, pid):
+    # A line with only the pid means there is nothing to show, e.g. a machine without a battery
+    path = os.path.join(sampler_dir, name)
+    temp_path = f"{path}.{pid}.tmp"
+    with open(temp_path, "w") as file:
+        file.write(f"{pid} {value}\n" if value else f"{pid}\n")
+    os.replace(temp_path, path)
+
+
+def unpublish(sampler_dir, names):
+    for name in names:
+        path = os.path.join(sampler_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def sample(sampler_dir, names, pid):
+    for name in names:
+        sampler, _ = SAMPLERS[name]
+        try:
+            value = sampler()
+        except (OSError, subprocess.SubprocessError, KeyError, ValueError) as e:
+            print(f"Failed to sample {name}: {e}", file=sys.stderr)
+            value = None
+        publish(sampler_dir, name, value, pid)
+
+
+def run(sampler_dir, names):
+    pid = os.getpid()
+    os.makedirs(sampler_dir, mode=0o700, exist_ok=True)
+    problem = check_sampler_dir(sampler_dir)
+    if problem:
+        sys.exit(f"cockpit-sampler: {problem}")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    due = {name: 0.0 for name in names}
+    try:
+        while True:
+            now = time.monotonic()
+            ready = [name for name in names if due[name] <= now]
+            sample(sampler_dir, ready, pid)
+            for name in ready:
+                due[name] = now + SAMPLERS[name][1]
+            time.sleep(max(0.0, min(due.values()) - time.monotonic()))
+    finally:
+        unpublish(sampler_dir, names)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cockpit-sampler", description=__doc__.splitlines()[0].split(": ")[1])
+    parser.add_argument("--dir", default=get_sampler_dir(), help="where to publish the sampled values")
+    parser.add_argument("--only", action="append", choices=sorted(SAMPLERS), help="sample only these segments")
+    args = parser.parse_args()
+
+    try:
+        run(args.dir, args.only or list(SAMPLERS))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()